@@ -4,4 +4,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+# アプリ読み込み前にDjangoを初期化する（todos.sse がモデル・設定を参照するため）
+django_application = get_asgi_application()
+
+from todos.sse import with_todo_events  # noqa: E402
+
+# GET /api/v1/todos/events/ はSSEとしてイベントループ上で直接処理する
+application = with_todo_events(django_application)
@@ -0,0 +1,99 @@
+import asyncio
+import pickle
+import weakref
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+
+class DjangoAsyncCache:
+    """
+    Djangoキャッシュの非同期API（aget_many など）をそのまま使う
+
+    Django 4.2 のキャッシュバックエンドはスレッド経由の非同期APIしか持たないため、
+    テスト（LocMemCache）やRedis以外のキャッシュを使う環境向け。
+    """
+
+    async def get(self, key):
+        return await cache.aget(key)
+
+    async def set(self, key, value, timeout):
+        await cache.aset(key, value, timeout)
+
+    async def get_many(self, keys):
+        return await cache.aget_many(keys)
+
+    async def set_many(self, mapping, timeout):
+        await cache.aset_many(mapping, timeout)
+
+
+class RedisAsyncCache:
+    """
+    redis.asyncio で django-redis と同じキー・値の形式を直接読み書きする（本番用）
+
+    イベントループ上で待機するため、問い合わせ中もスレッドを占有しない。
+    django-redis（DefaultClient・PickleSerializer・圧縮なし）と同じく、
+    整数はそのまま、それ以外は pickle で保存する。同期側の cache.incr と共存できる。
+    """
+
+    def __init__(self, url=None):
+        self._url = url or settings.REDIS_URL
+        # redis.asyncio のクライアントは作成したイベントループでしか使えないため、ループごとに持つ
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _connection_kwargs(self):
+        # UpstashはSSL必須。キャッシュ設定と同様に証明書検証を無効化する
+        if self._url and self._url.startswith("rediss://"):
+            return {"ssl_cert_reqs": None}
+        return {}
+
+    def _client(self):
+        import redis.asyncio as aioredis
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = aioredis.Redis.from_url(self._url, **self._connection_kwargs())
+            self._clients[loop] = client
+        return client
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return pickle.loads(value)
+
+    async def get(self, key):
+        value = await self._client().get(cache.make_key(key))
+        return None if value is None else self._decode(value)
+
+    async def set(self, key, value, timeout):
+        await self._client().set(cache.make_key(key), self._encode(value), ex=timeout)
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self._client().mget([cache.make_key(key) for key in keys])
+        return {key: self._decode(value) for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, mapping, timeout):
+        async with self._client().pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(cache.make_key(key), self._encode(value), ex=timeout)
+            await pipe.execute()
+
+
+@lru_cache(maxsize=None)
+def get_async_cache():
+    """settings.ASYNC_CACHE_BACKEND で指定された非同期キャッシュ（プロセス内で共有）"""
+    return import_string(settings.ASYNC_CACHE_BACKEND)()
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class DbConfig(AppConfig):
+    """DBの運用ツール（オンラインのマイグレーション・バックフィル）。特定のアプリに依存しない"""
+
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "config.db"
+    label = "db"
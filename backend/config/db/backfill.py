@@ -0,0 +1,225 @@
+"""
+大きなテーブル（custom_user・todos_todo 等）の既存の行を少しずつ埋め直すバックフィル
+
+新しく追加した列・集計テーブルなどの値を、プライマリに負荷をかけすぎずに全行へ反映する。
+- 主キーの順にキーセットで batch_size 件ずつ取り出し、バッチごとにコミットする
+- バッチのコミットごとに進捗（BackfillCheckpoint）を記録し、中断後は続きから再開する
+- バッチの処理時間が目標を超えれば件数を減らして間隔を空け、レプリカの遅延が上限を超えれば待つ
+- IDの範囲を分割し、重ならない範囲を複数のワーカー（スレッド）で並行して処理する
+
+バックフィルは各アプリの backfills.py で Backfill を継承して register で登録し、
+run_backfill コマンドで実行する。クラッシュ直後のバッチは再実行されることがあるため、
+process は同じ行を2回処理しても結果が変わらないように書く。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import BackfillCheckpoint
+from .replicas import max_replication_lag
+
+logger = logging.getLogger(__name__)
+
+# 名前 -> バックフィル
+BACKFILLS = {}
+
+
+def register(cls):
+    """バックフィルを登録するクラスデコレーター"""
+    BACKFILLS[cls.name] = cls()
+    return cls
+
+
+def get_backfills():
+    """登録済みのバックフィル（各アプリの backfills.py を読み込んでから返す）"""
+    autodiscover_modules("backfills")
+    return BACKFILLS
+
+
+class Backfill:
+    """
+    バックフィルの定義
+
+    name: 進捗の記録に使う名前（実行後に変えると最初からやり直しになる）
+    model: 対象のモデル（主キーは整数であること）
+    """
+
+    name = None
+    model = None
+
+    def get_queryset(self, database):
+        """対象の行（論理削除済みなども含める場合は _base_manager のまま）"""
+        return self.model._base_manager.using(database)
+
+    def databases(self):
+        """対象のDB（シャーディングされたモデルはシャードごとに実行するよう上書きする）"""
+        return [router.db_for_write(self.model)]
+
+    def process(self, queryset):
+        """
+        1バッチ分（queryset）を処理し、更新した行数を返す
+
+        バッチごとのトランザクション内で呼ばれる。
+        """
+        raise NotImplementedError
+
+
+class AdaptiveThrottle:
+    """
+    バッチの件数と間隔の調整
+
+    処理時間が target_seconds を超えたバッチの後は件数を半分にし、かかった時間と同じだけ休む
+    （プライマリが他のクエリに使える時間を残す）。目標内なら件数を 1/4 ずつ増やす。
+    次のバッチの前にレプリカの遅延が max_lag 秒を超えていれば、下回るまで間隔を延ばしながら待つ。
+    """
+
+    def __init__(self, batch_size=None, lag=max_replication_lag):
+        self.batch_size = batch_size or settings.BACKFILL_BATCH_SIZE
+        self.max_batch_size = max(self.batch_size, settings.BACKFILL_MAX_BATCH_SIZE)
+        self.target_seconds = settings.BACKFILL_TARGET_BATCH_SECONDS
+        self.interval = settings.BACKFILL_BATCH_INTERVAL
+        self.max_lag = settings.BACKFILL_MAX_REPLICATION_LAG
+        self.max_sleep = settings.BACKFILL_MAX_SLEEP
+        self.lag = lag
+
+    def after_batch(self, elapsed):
+        pause = self.interval
+        if elapsed > self.target_seconds:
+            self.batch_size = max(1, self.batch_size // 2)
+            pause = max(pause, min(elapsed, self.max_sleep))
+        else:
+            self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 4))
+        if pause:
+            time.sleep(pause)
+
+    def wait_for_replicas(self, stop=None):
+        delay = max(self.interval, 1)
+        while stop is None or not stop.is_set():
+            lag = self.lag()
+            if lag is None or lag <= self.max_lag:
+                return
+            logger.info("Replication lag %.1fs exceeds %ss, pausing backfill for %ss", lag, self.max_lag, delay)
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_sleep)
+
+
+def plan(backfill, database, workers=1):
+    """
+    database のIDの範囲を workers 個に分けた進捗を作る（作成済みならそれを返す）
+
+    再開時は最初の実行の分割をそのまま使う。最後の範囲は上限なしにし、
+    実行中に追加された行も対象にする。
+    """
+    checkpoints = BackfillCheckpoint.objects.filter(name=backfill.name, database=database).order_by("start_id")
+    if checkpoints.exists():
+        return list(checkpoints)
+
+    bounds = backfill.get_queryset(database).aggregate(low=Min("pk"), high=Max("pk"))
+    low, high = bounds["low"], bounds["high"]
+    if low is None:
+        low = high = 0
+    step = max(1, -(-(high - low + 1) // workers))
+    starts = list(range(low, high + 1, step))[:workers]
+    # 同時に開始した別のプロセスが同じ範囲を作成済みなら、そちらを使う
+    BackfillCheckpoint.objects.bulk_create(
+        [
+            BackfillCheckpoint(
+                name=backfill.name,
+                database=database,
+                start_id=start,
+                end_id=starts[i + 1] - 1 if i + 1 < len(starts) else None,
+            )
+            for i, start in enumerate(starts)
+        ],
+        ignore_conflicts=True,
+    )
+    return list(checkpoints)
+
+
+def run_range(backfill, checkpoint, batch_size=None, stop=None, log=logger.info):
+    """
+    1つの範囲（checkpoint）を最後まで、または stop が設定されるまで処理する
+
+    Returns:
+        この実行で処理した行数
+    """
+    throttle = AdaptiveThrottle(batch_size)
+    base = backfill.get_queryset(checkpoint.database)
+    processed = 0
+    while stop is None or not stop.is_set():
+        throttle.wait_for_replicas(stop)
+        pending = base.filter(pk__gt=checkpoint.last_id) if checkpoint.last_id is not None else (
+            base.filter(pk__gte=checkpoint.start_id)
+        )
+        if checkpoint.end_id is not None:
+            pending = pending.filter(pk__lte=checkpoint.end_id)
+        ids = list(pending.order_by("pk").values_list("pk", flat=True)[:throttle.batch_size])
+        if not ids:
+            checkpoint.completed_at = timezone.now()
+            checkpoint.save(update_fields=["completed_at", "updated_at"])
+            log(f"{checkpoint}: completed ({checkpoint.rows} rows)")
+            break
+
+        started = time.monotonic()
+        with transaction.atomic(using=checkpoint.database):
+            rows = backfill.process(base.filter(pk__gte=ids[0], pk__lte=ids[-1]))
+        elapsed = time.monotonic() - started
+
+        checkpoint.last_id = ids[-1]
+        checkpoint.rows += rows
+        checkpoint.save(update_fields=["last_id", "rows", "updated_at"])
+        processed += rows
+        log(f"{checkpoint}: up to id {ids[-1]}, {rows} rows in {elapsed:.2f}s (batch {len(ids)})")
+        throttle.after_batch(elapsed)
+    return processed
+
+
+def run_backfill(backfill, workers=1, batch_size=None, databases=None, stop=None, log=logger.info):
+    """
+    バックフィルを全DB・全範囲について実行する（完了済みの範囲は飛ばす）
+
+    workers が2以上なら範囲ごとにスレッドで並行して処理する。
+
+    Returns:
+        {database: この実行で処理した行数}
+    """
+    stop = stop or threading.Event()
+    results = {}
+    for database in databases or backfill.databases():
+        pending = [checkpoint for checkpoint in plan(backfill, database, workers) if checkpoint.completed_at is None]
+        if workers <= 1 or len(pending) <= 1:
+            results[database] = sum(
+                run_range(backfill, checkpoint, batch_size, stop, log) for checkpoint in pending
+            )
+            continue
+
+        def worker(checkpoint):
+            try:
+                return run_range(backfill, checkpoint, batch_size, stop, log)
+            except BaseException:
+                # 1つのワーカーが失敗したら他も止める（進捗は各範囲に記録済み）
+                stop.set()
+                raise
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(worker, checkpoint) for checkpoint in pending]
+            try:
+                results[database] = sum(future.result() for future in futures)
+            except BaseException:
+                stop.set()
+                raise
+    return results
+
+
+def reset(name):
+    """進捗を削除する（次の実行は最初から）"""
+    return BackfillCheckpoint.objects.filter(name=name).delete()[0]
@@ -0,0 +1,80 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.exceptions import AmbiguityError
+from django.db.migrations.executor import MigrationExecutor
+
+from config.db.online_schema import blocking_operations, run_with_lock_timeout
+
+
+class Command(BaseCommand):
+    help = (
+        "大きなテーブルの書き込みを長く止める操作がないか確認してから、"
+        "lock_timeout 付きで migrate を実行します（ロックを取れなければ再試行）。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("app_label", nargs="?", help="対象のアプリ")
+        parser.add_argument("migration_name", nargs="?", help="適用する（戻す）マイグレーション")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="対象のDB")
+        parser.add_argument(
+            "--allow-blocking",
+            action="store_true",
+            help="大きなテーブルに通常の AddIndex・AlterField 等があっても実行する（メンテナンス時間中など）",
+        )
+        parser.add_argument("--check", action="store_true", help="確認のみ行い、マイグレーションは実行しない")
+
+    def handle(self, *args, **options):
+        database = options["database"]
+        connection = connections[database]
+        app_label, migration_name = options["app_label"], options["migration_name"]
+
+        executor = MigrationExecutor(connection)
+        plan = self._plan(executor, app_label, migration_name)
+        # 適用済みのマイグレーションの状態（計画の実行前の状態）
+        state = executor.loader.project_state(list(executor.loader.applied_migrations))
+        blocking = blocking_operations(plan, state)
+        for migration, operation, online in blocking:
+            self.stdout.write(
+                self.style.WARNING(f"{migration.app_label}.{migration.name}: {operation.describe()} -> use {online}")
+            )
+        if options["check"]:
+            self.stdout.write(f"{len(plan)} migrations to apply, {len(blocking)} blocking operations.")
+            return
+        if blocking and not options["allow_blocking"]:
+            raise CommandError(
+                f"{len(blocking)} operations may block writes on large tables; "
+                "rewrite them with config.db.online_schema or pass --allow-blocking."
+            )
+        if not plan:
+            self.stdout.write("No migrations to apply.")
+            return
+
+        migrate_args = [arg for arg in (app_label, migration_name) if arg]
+        # 通常の操作（atomic なマイグレーション）のロック待ちもセッションの lock_timeout で打ち切り、
+        # 打ち切られた場合は適用済みのマイグレーションの続きから migrate をやり直す
+        run_with_lock_timeout(
+            connection,
+            lambda: call_command("migrate", *migrate_args, database=database, stdout=self.stdout),
+            atomic=False,
+            log=self.stdout.write,
+        )
+
+    def _plan(self, executor, app_label, migration_name):
+        loader = executor.loader
+        if app_label and migration_name:
+            if migration_name == "zero":
+                targets = [(app_label, None)]
+            else:
+                try:
+                    migration = loader.get_migration_by_prefix(app_label, migration_name)
+                except (AmbiguityError, KeyError) as e:
+                    raise CommandError(str(e))
+                targets = [(app_label, migration.name)]
+        elif app_label:
+            if app_label not in loader.migrated_apps:
+                raise CommandError(f"App '{app_label}' does not have migrations.")
+            targets = [key for key in loader.graph.leaf_nodes() if key[0] == app_label]
+        else:
+            targets = loader.graph.leaf_nodes()
+        return executor.migration_plan(targets)
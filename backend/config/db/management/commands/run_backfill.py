@@ -0,0 +1,59 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from config.db.backfill import get_backfills, reset, run_backfill
+from config.db.models import BackfillCheckpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "登録済みのバックフィル（各アプリの backfills.py）を実行します。"
+        "バッチごとに進捗を記録し、中断後に同じコマンドで続きから再開します。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?", help="バックフィルの名前（省略時は一覧を表示）")
+        parser.add_argument("--workers", type=int, default=1, help="並行して処理する範囲の数（初回の実行時のみ有効）")
+        parser.add_argument("--batch-size", type=int, help="最初のバッチの件数（以降は処理時間に応じて調整）")
+        parser.add_argument("--database", action="append", help="対象のDB（既定はバックフィルの全DB）")
+        parser.add_argument("--status", action="store_true", help="進捗を表示するだけで実行しない")
+        parser.add_argument("--restart", action="store_true", help="記録済みの進捗を削除して最初からやり直す")
+
+    def handle(self, *args, **options):
+        if not options["name"]:
+            for name in sorted(get_backfills()):
+                self.stdout.write(name)
+            return
+        try:
+            backfill = get_backfills()[options["name"]]
+        except KeyError:
+            raise CommandError(f"Unknown backfill '{options['name']}'.")
+
+        if options["status"]:
+            self._write_status(backfill)
+            return
+        if options["restart"]:
+            self.stdout.write(f"{reset(backfill.name)} checkpoints deleted.")
+
+        stop = threading.Event()
+        try:
+            results = run_backfill(
+                backfill,
+                workers=options["workers"],
+                batch_size=options["batch_size"],
+                databases=options["database"],
+                stop=stop,
+                log=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            stop.set()
+            self.stdout.write(self.style.WARNING("Interrupted; run the same command again to resume."))
+            return
+        for database, rows in results.items():
+            self.stdout.write(self.style.SUCCESS(f"{backfill.name}@{database}: {rows} rows updated"))
+
+    def _write_status(self, backfill):
+        for checkpoint in BackfillCheckpoint.objects.filter(name=backfill.name).order_by("database", "start_id"):
+            state = "done" if checkpoint.completed_at else f"at id {checkpoint.last_id}"
+            self.stdout.write(f"{checkpoint}: {state}, {checkpoint.rows} rows")
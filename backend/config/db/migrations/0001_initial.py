@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('database', models.CharField(max_length=100)),
+                ('start_id', models.BigIntegerField()),
+                ('end_id', models.BigIntegerField(null=True)),
+                ('last_id', models.BigIntegerField(null=True)),
+                ('rows', models.PositiveBigIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='backfillcheckpoint',
+            constraint=models.UniqueConstraint(fields=('name', 'database', 'start_id'), name='backfill_checkpoint_range_uniq'),
+        ),
+    ]
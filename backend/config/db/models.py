@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    バックフィル（config/db/backfill.py）の進捗
+
+    バックフィル・DBごとにIDの範囲を分割し、範囲ごとに1行（ワーカー1つが担当）。
+    バッチのコミットごとに last_id を進め、中断後はその次のIDから再開する。
+    """
+
+    name = models.CharField(max_length=100)
+    database = models.CharField(max_length=100)
+    start_id = models.BigIntegerField()
+    end_id = models.BigIntegerField(null=True)  # NULL は上限なし（最後の範囲。実行中に追加された行も含める）
+    last_id = models.BigIntegerField(null=True)  # 処理済みの最後のID（NULL は未着手）
+    rows = models.PositiveBigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'database', 'start_id'], name='backfill_checkpoint_range_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}@{self.database}[{self.start_id}, {self.end_id}]"
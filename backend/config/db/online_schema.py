@@ -0,0 +1,596 @@
+"""
+大きなテーブル（todos_todo・custom_user 等）のスキーマ変更を書き込みを止めずに行うためのマイグレーション操作
+
+PostgreSQLでは次のように実行し、その他のDB（SQLiteのテスト等）では通常の操作として実行する。
+- AddIndexOnline / RemoveIndexOnline: CREATE / DROP INDEX CONCURRENTLY
+- AddFieldOnline: NULL 可の列として追加し、既存の行を主キーの範囲ごとに埋めてから NOT NULL にする
+- AddCheckConstraintOnline: NOT VALID で追加してから VALIDATE する
+- AddUniqueConstraintOnline: CREATE UNIQUE INDEX CONCURRENTLY（列の一意制約はその索引から付ける）
+- RetryOnLockTimeout: 任意の操作を lock_timeout 付きで実行し、ロックを取れなければ間隔を空けて再試行する
+
+ALTER TABLE は一瞬でも ACCESS EXCLUSIVE ロックを待つ間、後続の読み書きをすべて待たせる。
+そのためロックの取得は settings.ONLINE_SCHEMA_CHANGE["lock_timeout"] で打ち切り、再試行する。
+CONCURRENTLY・チャンクごとのコミットはトランザクション内で実行できないため、
+これらを使うマイグレーションは atomic = False にする（migrate_online コマンドで実行する）。
+"""
+import copy
+import logging
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.migrations import AddConstraint, AddField, AddIndex, AlterField, CreateModel, RemoveIndex
+from django.db.migrations.operations.base import Operation
+from django.db.models import NOT_PROVIDED, CheckConstraint, Deferrable, UniqueConstraint
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQLのエラーコード lock_not_available（lock_timeout で打ち切られた）
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+def is_lock_timeout(error):
+    """lock_timeout でロックの取得が打ち切られたエラーか"""
+    return getattr(error.__cause__, "pgcode", None) == LOCK_NOT_AVAILABLE
+
+
+def run_with_lock_timeout(connection, func, atomic=True, log=logger.info):
+    """
+    func() をロックの待ち時間の上限付きで実行し、打ち切られた場合は再試行する
+
+    atomic=True では1トランザクションで実行する（打ち切られた場合はロールバックしてやり直す）。
+    CONCURRENTLY など トランザクション外で実行するものは atomic=False にする。
+    PostgreSQL以外では func() をそのまま実行する。
+    """
+    if connection.vendor != "postgresql":
+        return func()
+    options = settings.ONLINE_SCHEMA_CHANGE
+    attempts = options["attempts"]
+    for attempt in range(1, attempts + 1):
+        try:
+            if atomic:
+                with transaction.atomic(using=connection.alias):
+                    _set_lock_timeout(connection, options["lock_timeout"], local=True)
+                    return func()
+            previous = _set_lock_timeout(connection, options["lock_timeout"], local=False)
+            try:
+                return func()
+            finally:
+                _set_lock_timeout(connection, previous, local=False)
+        except OperationalError as e:
+            if not is_lock_timeout(e) or attempt == attempts:
+                raise
+            delay = options["retry_delay"] * attempt
+            log(f"Lock not available (attempt {attempt}/{attempts}), retrying in {delay}s")
+            time.sleep(delay)
+
+
+def _set_lock_timeout(connection, value, local):
+    """lock_timeout を設定し、設定前の値を返す"""
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW lock_timeout")
+        previous = cursor.fetchone()[0]
+        cursor.execute("SELECT set_config('lock_timeout', %s, %s)", [value, local])
+    return previous
+
+
+def backfill(connection, table, assignments, params=(), where=None, chunk_size=None, pk="id", log=logger.info):
+    """
+    UPDATE table SET assignments を主キーの範囲ごとに実行する（チャンクごとにコミット）
+
+    1回の UPDATE で書き換える行数を抑え、行ロックの保持時間とレプリケーションの遅延を小さくする。
+    where には未処理の行だけを対象にする条件を指定し、中断後の再実行で同じ行を書き換えないようにする。
+
+    Returns:
+        更新した行数
+    """
+    qn = connection.ops.quote_name
+    chunk_size = chunk_size or settings.ONLINE_SCHEMA_CHANGE["batch_size"]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({qn(pk)}), MAX({qn(pk)}) FROM {qn(table)}")
+        min_pk, max_pk = cursor.fetchone()
+
+    sql = f"UPDATE {qn(table)} SET {assignments} WHERE {qn(pk)} > %s AND {qn(pk)} <= %s"
+    if where:
+        sql += f" AND ({where})"
+    updated, lower = 0, (min_pk or 1) - 1
+    while max_pk is not None and lower < max_pk:
+        upper = min(lower + chunk_size, max_pk)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(sql, [*params, lower, upper])
+            updated += cursor.rowcount
+        lower = upper
+        log(f"{table}: backfilled up to {pk} {upper} / {max_pk}")
+    return updated
+
+
+def _require_non_atomic(schema_editor, operation):
+    if schema_editor.connection.in_atomic_block:
+        raise ValueError(
+            f"{operation.__class__.__name__} cannot run inside a transaction; "
+            "set atomic = False on the migration."
+        )
+
+
+def _index_state(connection, name):
+    """インデックスの状態（None: なし、True: 有効、False: CONCURRENTLY の失敗で無効のまま残ったもの）"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", [name]
+        )
+        row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+
+def _drop_index_concurrently(connection, name):
+    def drop():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {connection.ops.quote_name(name)}")
+
+    run_with_lock_timeout(connection, drop, atomic=False)
+
+
+def create_index_concurrently(schema_editor, model, index):
+    """
+    インデックスを CREATE INDEX CONCURRENTLY で作成する（作成済みなら何もしない。PostgreSQLのみ）
+
+    作成に失敗して無効のまま残ったインデックスは削除してから作り直す。
+    パーティションテーブルは CONCURRENTLY で作れないため、通常の CREATE INDEX にする。
+    """
+    connection = schema_editor.connection
+    state = _index_state(connection, index.name)
+    if state:
+        return
+    if state is False:
+        _drop_index_concurrently(connection, index.name)
+    concurrently = not is_partitioned(connection, model._meta.db_table)
+    run_with_lock_timeout(
+        connection,
+        lambda: schema_editor.add_index(model, index, concurrently=concurrently),
+        atomic=not concurrently,
+    )
+
+
+class AddIndexOnline(AddIndex):
+    """
+    インデックスを CREATE INDEX CONCURRENTLY で作成する AddIndex（PostgreSQL以外は通常の AddIndex）
+
+    作成に失敗して無効のまま残ったインデックスは削除してから作り直す。
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+        _require_non_atomic(schema_editor, self)
+        create_index_concurrently(schema_editor, model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(connection.alias, model):
+            _require_non_atomic(schema_editor, self)
+            _drop_index_concurrently(connection, self.index.name)
+
+    def describe(self):
+        return f"Concurrently create index {self.index.name} on field(s) {', '.join(self.index.fields)} of model {self.model_name}"
+
+
+class RemoveIndexOnline(RemoveIndex):
+    """インデックスを DROP INDEX CONCURRENTLY で削除する RemoveIndex（PostgreSQL以外は通常の RemoveIndex）"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(connection.alias, model):
+            _require_non_atomic(schema_editor, self)
+            _drop_index_concurrently(connection, self.name)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+        _require_non_atomic(schema_editor, self)
+        index = to_state.models[app_label, self.model_name_lower].get_index_by_name(self.name)
+        create_index_concurrently(schema_editor, model, index)
+
+    def describe(self):
+        return f"Concurrently remove index {self.name} from {self.model_name}"
+
+
+class AddFieldOnline(AddField):
+    """
+    列を追加してから既存の行を埋める AddField（PostgreSQL以外は通常の AddField の後に埋める）
+
+    PostgreSQLでは次の順で行い、ACCESS EXCLUSIVE ロックはそれぞれ一瞬だけ取る。
+    1. NULL 可・既定値なしの列として追加（テーブルは書き換えない）
+    2. 既定値が定数ならDBの既定値にも設定（追加後に旧バージョンのコードが挿入する行にも入る）
+    3. 既存の行を using のSQL式（なければ既定値）でチャンクごとに埋める
+    4. NOT NULL の列は NOT VALID のCHECK制約を VALIDATE してから SET NOT NULL にする
+
+    インデックス・一意制約・外部キー制約を伴う列は対象外（AddIndexOnline を別に使う）。
+
+    Args:
+        using: 既存の行の値を計算するSQL式（他の列から求める場合など）
+        batch_size: 埋める際の1トランザクションの行数
+    """
+
+    def __init__(self, model_name, name, field, using=None, batch_size=None, preserve_default=True):
+        if field.db_index or field.unique or getattr(field, "db_constraint", False):
+            raise ValueError("AddFieldOnline does not support indexed, unique or foreign key fields")
+        self.using = using
+        self.batch_size = batch_size
+        super().__init__(model_name, name, field, preserve_default)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        if self.using is not None:
+            kwargs["using"] = self.using
+        if self.batch_size is not None:
+            kwargs["batch_size"] = self.batch_size
+        return name, args, kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        to_model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, to_model):
+            return
+        from_model = from_state.apps.get_model(app_label, self.model_name)
+        field = to_model._meta.get_field(self.name)
+        table, column = to_model._meta.db_table, field.column
+        qn = connection.ops.quote_name
+
+        if connection.vendor != "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+            if self.using:
+                schema_editor.execute(f"UPDATE {qn(table)} SET {qn(column)} = {self.using}")
+            return
+
+        _require_non_atomic(schema_editor, self)
+        nullable = copy.copy(field)
+        nullable.null, nullable.default = True, NOT_PROVIDED
+        if column not in _columns(connection, table):
+            run_with_lock_timeout(connection, lambda: schema_editor.add_field(from_model, nullable))
+
+        has_constant_default = field.has_default() and not callable(field.default)
+        if has_constant_default:
+            default = schema_editor.effective_default(field)
+            run_with_lock_timeout(connection, lambda: schema_editor.execute(
+                f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(column)} SET DEFAULT %s", [default]
+            ))
+        if self.using:
+            backfill(connection, table, f"{qn(column)} = {self.using}",
+                     where=f"{qn(column)} IS NULL", chunk_size=self.batch_size)
+        elif field.has_default():
+            backfill(connection, table, f"{qn(column)} = %s", [schema_editor.effective_default(field)],
+                     where=f"{qn(column)} IS NULL", chunk_size=self.batch_size)
+
+        if not field.null:
+            set_not_null(schema_editor, table, column)
+        if has_constant_default and not self.preserve_default:
+            run_with_lock_timeout(connection, lambda: schema_editor.execute(
+                f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(column)} DROP DEFAULT"
+            ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        run_with_lock_timeout(
+            schema_editor.connection,
+            lambda: super(AddFieldOnline, self).database_backwards(app_label, schema_editor, from_state, to_state),
+        )
+
+    def describe(self):
+        return f"Add field {self.name} to {self.model_name} and backfill in batches"
+
+
+def _columns(connection, table):
+    with connection.cursor() as cursor:
+        return [info.name for info in connection.introspection.get_table_description(cursor, table)]
+
+
+def is_partitioned(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def _constraint_exists(connection, table, name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint WHERE conrelid = %s::regclass AND conname = %s", [table, name]
+        )
+        return cursor.fetchone() is not None
+
+
+def add_constraint_not_valid(schema_editor, table, name, sql):
+    """
+    CHECK制約を NOT VALID で追加してから VALIDATE する（PostgreSQLのみ）
+
+    VALIDATE は SHARE UPDATE EXCLUSIVE ロックのため、既存の行の検証中も読み書きできる。
+    パーティションテーブルは NOT VALID の制約を付けられないため検証を伴って追加する。
+    """
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    partitioned = is_partitioned(connection, table)
+    if not _constraint_exists(connection, table, name):
+        run_with_lock_timeout(connection, lambda: schema_editor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {sql}" + ("" if partitioned else " NOT VALID")
+        ))
+    if not partitioned:
+        run_with_lock_timeout(connection, lambda: schema_editor.execute(
+            f"ALTER TABLE {qn(table)} VALIDATE CONSTRAINT {qn(name)}"
+        ))
+
+
+def set_not_null(schema_editor, table, column):
+    """
+    列を走査のためのロックを長く取らずに NOT NULL にする（PostgreSQLのみ）
+
+    検証済みの IS NOT NULL のCHECK制約があれば、SET NOT NULL はテーブルを走査しない（PostgreSQL 12以降）。
+    """
+    qn = schema_editor.connection.ops.quote_name
+    name = f"{table}_{column}_not_null"
+    add_constraint_not_valid(schema_editor, table, name, f"CHECK ({qn(column)} IS NOT NULL)")
+
+    def swap():
+        schema_editor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(column)} SET NOT NULL")
+        schema_editor.execute(f"ALTER TABLE {qn(table)} DROP CONSTRAINT IF EXISTS {qn(name)}")
+
+    run_with_lock_timeout(schema_editor.connection, swap)
+
+
+class AddCheckConstraintOnline(AddConstraint):
+    """CHECK制約を NOT VALID + VALIDATE で追加する AddConstraint（PostgreSQL以外は通常の AddConstraint）"""
+
+    def __init__(self, model_name, constraint):
+        if not isinstance(constraint, CheckConstraint):
+            raise ValueError("AddCheckConstraintOnline only supports CheckConstraint")
+        super().__init__(model_name, constraint)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+        _require_non_atomic(schema_editor, self)
+        check = self.constraint._get_check_sql(model, schema_editor)
+        add_constraint_not_valid(schema_editor, model._meta.db_table, self.constraint.name, f"CHECK ({check})")
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        run_with_lock_timeout(
+            schema_editor.connection,
+            lambda: super(AddCheckConstraintOnline, self).database_backwards(
+                app_label, schema_editor, from_state, to_state
+            ),
+        )
+
+    def describe(self):
+        return f"Create constraint {self.constraint.name} on model {self.model_name} without blocking writes"
+
+
+class AddUniqueConstraintOnline(AddConstraint):
+    """
+    一意制約を CREATE UNIQUE INDEX CONCURRENTLY で作成する AddConstraint（PostgreSQL以外は通常の AddConstraint）
+
+    式・条件付きなどの一意制約は Django でも一意インデックスとして作られるため、同じ名前の
+    インデックスを作成する。列だけの一意制約はインデックスの作成後に
+    ADD CONSTRAINT ... UNIQUE USING INDEX で制約にする（既存の行の検証は不要で、ロックは一瞬）。
+    作成に失敗して無効のまま残ったインデックスは削除してから作り直す。
+    """
+
+    def __init__(self, model_name, constraint):
+        if not isinstance(constraint, UniqueConstraint):
+            raise ValueError("AddUniqueConstraintOnline only supports UniqueConstraint")
+        super().__init__(model_name, constraint)
+
+    @staticmethod
+    def _is_index(constraint):
+        """Django が制約ではなく一意インデックスとして作成する一意制約か"""
+        return bool(constraint.condition or constraint.include or constraint.opclasses or constraint.expressions)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+        _require_non_atomic(schema_editor, self)
+        constraint = self.constraint
+        table = model._meta.db_table
+        qn = connection.ops.quote_name
+        if _constraint_exists(connection, table, constraint.name):
+            return
+
+        index_form = self._is_index(constraint)
+        if index_form:
+            create_sql = str(constraint.create_sql(model, schema_editor))
+        else:
+            create_sql = str(schema_editor._create_index_sql(
+                model,
+                fields=[model._meta.get_field(name) for name in constraint.fields],
+                name=constraint.name,
+                sql="CREATE UNIQUE INDEX %(name)s ON %(table)s (%(columns)s)%(include)s%(condition)s",
+            ))
+        concurrently = not is_partitioned(connection, table)
+        if concurrently:
+            create_sql = create_sql.replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1)
+
+        state = _index_state(connection, constraint.name)
+        if state is False:
+            _drop_index_concurrently(connection, constraint.name)
+        if not state:
+            run_with_lock_timeout(connection, lambda: schema_editor.execute(create_sql), atomic=not concurrently)
+        if not index_form:
+            deferrable = {
+                None: "",
+                Deferrable.DEFERRED: " DEFERRABLE INITIALLY DEFERRED",
+                Deferrable.IMMEDIATE: " DEFERRABLE INITIALLY IMMEDIATE",
+            }[constraint.deferrable]
+            run_with_lock_timeout(connection, lambda: schema_editor.execute(
+                f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(constraint.name)} "
+                f"UNIQUE USING INDEX {qn(constraint.name)}{deferrable}"
+            ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        constraint = self.constraint
+        if connection.vendor == "postgresql" and self._is_index(constraint):
+            # インデックスとして作られる一意制約は CONCURRENTLY で削除できる
+            model = from_state.apps.get_model(app_label, self.model_name)
+            if self.allow_migrate_model(connection.alias, model):
+                _require_non_atomic(schema_editor, self)
+                _drop_index_concurrently(connection, constraint.name)
+            return
+        run_with_lock_timeout(
+            connection,
+            lambda: super(AddUniqueConstraintOnline, self).database_backwards(
+                app_label, schema_editor, from_state, to_state
+            ),
+        )
+
+    def describe(self):
+        return f"Concurrently create unique constraint {self.constraint.name} on model {self.model_name}"
+
+
+class RetryOnLockTimeout(Operation):
+    """
+    operation のDB操作を lock_timeout 付きの1トランザクションで実行し、打ち切られた場合は再試行する
+
+    列名の変更・NULL 可への変更など、ロックは必要だが一瞬で終わる操作に使う。
+    """
+
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def deconstruct(self):
+        return self.__class__.__qualname__, [self.operation], {}
+
+    def state_forwards(self, app_label, state):
+        self.operation.state_forwards(app_label, state)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        run_with_lock_timeout(
+            schema_editor.connection,
+            lambda: self.operation.database_forwards(app_label, schema_editor, from_state, to_state),
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        run_with_lock_timeout(
+            schema_editor.connection,
+            lambda: self.operation.database_backwards(app_label, schema_editor, from_state, to_state),
+        )
+
+    def describe(self):
+        return f"{self.operation.describe()} (retry on lock timeout)"
+
+    @property
+    def migration_name_fragment(self):
+        return self.operation.migration_name_fragment
+
+    def references_model(self, name, app_label):
+        return self.operation.references_model(name, app_label)
+
+    def references_field(self, model_name, name, app_label):
+        return self.operation.references_field(model_name, name, app_label)
+
+
+def _only_drops_constraint(old_field, new_field):
+    """
+    外部キー制約を外すだけ（db_constraint True→False）の変更か
+
+    DBに影響しない属性（related_name 等）の違いは無視する。制約の削除はロックが一瞬で済む。
+    """
+    if old_field is None or not getattr(old_field, "db_constraint", False) or getattr(new_field, "db_constraint", True):
+        return False
+    ignored = {"db_constraint", *(set(new_field.non_db_attrs) - {"db_column"})}
+
+    def significant(field):
+        path, args, kwargs = field.deconstruct()[1:]
+        return path, args, {key: value for key, value in kwargs.items() if key not in ignored}
+
+    return significant(old_field) == significant(new_field)
+
+
+def _online_alternative(operation, old_field=None):
+    """
+    大きなテーブルの書き込みを長く止める操作なら代わりに使う操作の説明（問題なければ None）
+
+    NULL 可・インデックスなしの列の追加・外部キー制約の削除などロックが一瞬で済む操作は、
+    lock_timeout の再試行（migrate_online）だけで足りるため対象にしない。
+    old_field は AlterField の変更前のフィールド（不明なら None で、変更の内容によらず対象にする）。
+    """
+    operation_type = type(operation)
+    if operation_type is AddIndex:
+        return "AddIndexOnline"
+    if operation_type is RemoveIndex:
+        return "RemoveIndexOnline"
+    if operation_type is AddConstraint:
+        if isinstance(operation.constraint, CheckConstraint):
+            return "AddCheckConstraintOnline"
+        return "AddUniqueConstraintOnline"
+    if operation_type is AddField:
+        field = operation.field
+        if field.db_index or field.unique or getattr(field, "db_constraint", False):
+            return "AddFieldOnline + AddIndexOnline"
+    if operation_type is AlterField and not _only_drops_constraint(old_field, operation.field):
+        return "a new column with AddFieldOnline (or AlterColumnsOnline in todos.compact_schema)"
+    return None
+
+
+def blocking_operations(plan, state=None):
+    """
+    マイグレーションの実行計画のうち、大きなテーブル（ONLINE_SCHEMA_CHANGE["large_tables"]）の
+    書き込みを長く止めるおそれのある操作を (migration, operation, 代わりに使う操作) で返す
+
+    同じ計画の中で作成するテーブル（新しい環境での migrate 等）は空のため対象にしない。
+    state には計画の実行前のプロジェクトの状態を渡す（AlterField の変更前のフィールドを調べるため）。
+    """
+    large_tables = set(settings.ONLINE_SCHEMA_CHANGE["large_tables"])
+    created = set()
+    found = []
+    for migration, backwards in plan:
+        if backwards:
+            continue
+        for operation in migration.operations:
+            old_field = None
+            if state is not None:
+                if isinstance(operation, AlterField):
+                    model_state = state.models.get((migration.app_label, operation.model_name_lower))
+                    if model_state is not None:
+                        old_field = model_state.fields.get(operation.name)
+                operation.state_forwards(migration.app_label, state)
+            if isinstance(operation, CreateModel):
+                created.add(_table_name(migration.app_label, operation.name))
+                continue
+            online = _online_alternative(operation, old_field)
+            if online is None:
+                continue
+            table = _table_name(migration.app_label, getattr(operation, "model_name", None))
+            if table in large_tables and table not in created:
+                found.append((migration, operation, online))
+    return found
+
+
+def _table_name(app_label, model_name):
+    from django.apps import apps
+
+    try:
+        return apps.get_model(app_label, model_name)._meta.db_table
+    except LookupError:
+        return None
@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from collections import deque
+
+from config.metrics import get_metrics
+
+
+class PoolTimeout(Exception):
+    """timeout 秒待っても接続を取得できなかった"""
+
+
+class ConnectionPool:
+    """
+    プロセス内で共有するDB接続プール（スレッドセーフ）
+
+    リクエストごとにTLS接続を張り直す代わりに、返却された接続を使い回す。
+
+    - max_size: プール内の接続数の上限（貸出中を含む）。超える取得は空きが出るまで待つ
+    - timeout: 取得を待つ最大秒数（超えると PoolTimeout）
+    - max_lifetime: 接続を使い続ける最大秒数。全接続が同時に張り直されないよう少し揺らす
+    - max_idle: これより長く未使用だった接続は捨てる（サーバー・プロキシ側で切られている可能性があるため）
+    - health_check_interval: 最後の返却からこの秒数を超えた接続は、貸し出す前に check で確認する
+
+    DB固有の処理は関数で受け取る。
+    - connect(): 新しい接続を返す
+    - check(conn): 使える接続なら True
+    - reset(conn): 返却時に呼ぶ。未完了のトランザクションを片付け、使い回せるなら True
+    """
+
+    def __init__(
+        self, name, connect, check, reset, max_size=10, timeout=5.0,
+        max_lifetime=1800.0, max_idle=300.0, health_check_interval=30.0,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.metrics = get_metrics(f"db_pool.{name}")
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+        self._cond = threading.Condition()
+        # (接続, 返却時刻)。直近に返却されたものから貸し出す
+        self._idle = deque()
+        # id(接続) -> 寿命の期限
+        self._expires_at = {}
+        self._size = 0
+
+    def getconn(self):
+        """
+        接続を貸し出す
+
+        Raises:
+            PoolTimeout: timeout 秒以内に空きが出なかった場合
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # 接続枠を先に確保し、接続の確立はロックの外で行う
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics.incr("timeouts")
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a connection from pool '{self.name}'"
+                    )
+                self._cond.wait(remaining)
+        self.metrics.observe("checkout_wait_ms", (time.monotonic() - start) * 1000)
+
+        if conn is not None and not self._is_reusable(conn, returned_at):
+            self._discard(conn, release_slot=False)
+            conn = None
+        if conn is None:
+            conn = self._open()
+        self._update_gauges()
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """接続を返却する（discard=True、または使い回せない接続は閉じる）"""
+        if not discard:
+            try:
+                discard = not self._reset(conn)
+            except Exception:
+                discard = True
+        if not discard and self._expires_at.get(id(conn), 0) <= time.monotonic():
+            self.metrics.incr("expired")
+            discard = True
+
+        if discard:
+            self._discard(conn)
+        else:
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        self._update_gauges()
+
+    def close_all(self):
+        """未使用の接続をすべて閉じる（貸出中の接続は返却時に通常どおり扱う）"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._discard(conn)
+        self._update_gauges()
+
+    def _is_reusable(self, conn, returned_at):
+        now = time.monotonic()
+        if self._expires_at.get(id(conn), 0) <= now:
+            self.metrics.incr("expired")
+            return False
+        idle_for = now - returned_at
+        if idle_for >= self.max_idle:
+            self.metrics.incr("expired")
+            return False
+        if idle_for >= self.health_check_interval:
+            try:
+                healthy = self._check(conn)
+            except Exception:
+                healthy = False
+            if not healthy:
+                self.metrics.incr("health_check_failures")
+                return False
+        return True
+
+    def _open(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._expires_at[id(conn)] = time.monotonic() + self.max_lifetime * random.uniform(0.9, 1.0)
+        self.metrics.incr("opened")
+        return conn
+
+    def _discard(self, conn, release_slot=True):
+        """接続を閉じる。release_slot=False の場合は接続枠をそのまま呼び出し元が使う"""
+        self._expires_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self.metrics.incr("closed")
+        if release_slot:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    def _update_gauges(self):
+        with self._cond:
+            size, idle = self._size, len(self._idle)
+        self.metrics.set_gauge("size", size)
+        self.metrics.set_gauge("idle", idle)
+        self.metrics.set_gauge("in_use", size - idle)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """接続先（key）ごとのプール。初回のみ factory() で作成する"""
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = factory()
+    return pool
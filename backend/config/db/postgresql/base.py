@@ -0,0 +1,89 @@
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from config.db.pool import ConnectionPool, PoolTimeout, get_pool
+
+
+def _check(conn):
+    """貸し出す前の死活確認（SELECT 1）"""
+    if conn.closed:
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    if not conn.autocommit:
+        conn.rollback()
+    return True
+
+
+def _reset(conn):
+    """
+    返却時の後始末
+
+    未完了のトランザクションはロールバックし、SET で変えた設定（statement_timeout等）は
+    RESET ALL で戻して、次の利用者へ持ち越さない。タイムゾーン等のDjangoが使う設定は
+    次の貸出時に init_connection_state で設定し直される。
+    通信エラーなどで状態が分からない接続は使い回さない。
+    """
+    if conn.closed:
+        return False
+    status = conn.info.transaction_status
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    with conn.cursor() as cursor:
+        cursor.execute("RESET ALL")
+    if not conn.autocommit:
+        conn.commit()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    接続をプロセス内のプール（config/db/pool.py）から取得・返却するPostgreSQLバックエンド
+
+    Djangoは CONN_MAX_AGE=0 のときリクエストの終わりに接続を閉じるが、
+    このバックエンドでは閉じる代わりにプールへ返却する。プールの設定は OPTIONS["pool"]。
+
+    トランザクション単位のプーリングプロキシ（PgBouncer等）の手前でも使えるよう、
+    接続にセッション単位の状態を残さない（返却時にトランザクションを片付ける。
+    サーバーサイドカーソルは DISABLE_SERVER_SIDE_CURSORS で無効にしておくこと）。
+    """
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    def _get_pool(self):
+        def create():
+            conn_params = self.get_connection_params()
+            return ConnectionPool(
+                self.alias,
+                connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                check=_check,
+                reset=_reset,
+                **self.settings_dict["OPTIONS"].get("pool", {}),
+            )
+
+        # テスト用DBへの切り替えなどで接続先が変わった場合は別のプールにする
+        return get_pool((self.alias, self.settings_dict["NAME"]), create)
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self._get_pool().getconn()
+        except PoolTimeout as e:
+            # Djangoの OperationalError として扱われるようにする
+            raise self.Database.OperationalError(str(e)) from e
+        # 接続を作成した DatabaseWrapper 以外でも、作成時と同じ分離レベルを持たせる
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = (
+            base.IsolationLevel(isolation_level) if isolation_level is not None
+            else base.IsolationLevel.READ_COMMITTED
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._get_pool().putconn(self.connection)
@@ -0,0 +1,157 @@
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+STICKY_KEY = "db_primary_sticky:{user_id}"
+
+
+class _ReadState:
+    """replica_reads のブロック内での読み取り先"""
+
+    def __init__(self, alias, user_id):
+        self.alias = alias
+        self.user_id = user_id
+
+
+_read_state = ContextVar("replica_read_state", default=None)
+
+
+class PrimaryReplicaRouter:
+    """
+    replica_reads のブロック内の読み取りだけをレプリカへ振り分けるルーター
+
+    それ以外の読み取りと書き込みはすべてプライマリ（default）。
+    レプリカから読み込んだインスタンスを保存しても、プライマリへ書き込む。
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _read_state.get()
+        if state is not None and state.alias is not None:
+            return state.alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # プライマリとレプリカは同じデータを持つ
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    """
+    ブロック内の読み取りをレプリカ（settings.DATABASE_REPLICAS）から行う
+
+    user_id を指定すると read-your-writes を保証する。そのユーザーが直近
+    REPLICA_STICKY_SECONDS 秒以内に書き込んでいれば、レプリカがその書き込みの
+    LSNまで反映済みと確認できない限りプライマリから読む。
+    ブロック内で書き込んだ場合も、以降の読み取りはプライマリから行う。
+    """
+    token = _read_state.set(_ReadState(_choose_replica(user_id), user_id))
+    try:
+        yield
+    finally:
+        _read_state.reset(token)
+
+
+def mark_written(*user_ids):
+    """
+    ユーザーの書き込みを記録し、しばらくの間の読み取りをプライマリへ固定する
+
+    コミット後のプライマリのLSN（PostgreSQLのみ）を記録し、レプリカが
+    そこまで追いついた時点で固定を解除できるようにする。
+    """
+    if not settings.DATABASE_REPLICAS or not user_ids:
+        return
+
+    state = _read_state.get()
+    if state is not None and state.user_id in user_ids:
+        state.alias = None
+
+    def record():
+        lsn = _current_lsn()
+        cache.set_many(
+            {STICKY_KEY.format(user_id=user_id): lsn or "" for user_id in user_ids},
+            settings.REPLICA_STICKY_SECONDS,
+        )
+
+    transaction.on_commit(record)
+
+
+def _choose_replica(user_id):
+    """読み取りに使うレプリカのエイリアス（プライマリから読むべき場合は None）"""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    alias = random.choice(settings.DATABASE_REPLICAS)
+    if user_id is None:
+        return alias
+
+    lsn = cache.get(STICKY_KEY.format(user_id=user_id))
+    if lsn is None:
+        return alias
+    if lsn and _replica_caught_up(alias, lsn):
+        return alias
+    return None
+
+
+def _current_lsn():
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_current_wal_lsn()::text")
+        return cursor.fetchone()[0]
+
+
+def _replica_caught_up(alias, lsn):
+    """レプリカが lsn まで反映済みか（確認できない場合は False）"""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn", [lsn])
+            return bool(cursor.fetchone()[0])
+    except DatabaseError:
+        logger.warning("Failed to check replication lag on %s", alias, exc_info=True)
+        return False
+
+
+def replication_lag(alias):
+    """
+    レプリカの反映の遅延（秒。PostgreSQL以外・確認できない場合は None）
+
+    受信済みのWALをすべて反映済みなら 0 とする（プライマリへの書き込みが途絶えている間に
+    最後の反映からの経過時間を遅延と誤認しないように）。
+    """
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        logger.warning("Failed to check replication lag on %s", alias, exc_info=True)
+        return None
+    return float(lag) if lag is not None else None
+
+
+def max_replication_lag():
+    """全レプリカ（settings.DATABASE_REPLICAS）のうち最大の遅延（秒。確認できなければ None）"""
+    lags = [lag for lag in map(replication_lag, settings.DATABASE_REPLICAS) if lag is not None]
+    return max(lags, default=None)
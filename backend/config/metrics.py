@@ -0,0 +1,70 @@
+import threading
+from collections import Counter
+
+
+class Metrics:
+    """
+    プロセス内のカウンタ・計測値の集計（スレッドセーフ）
+
+    外部の監視基盤に依存せず、/api/v1/metrics/ からスナップショットを取得できる。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._gauges = {}
+        # key -> [件数, 合計, 最大]
+        self._observations = {}
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._counters[key] += amount
+
+    def set_gauge(self, key, value):
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, key, value):
+        """処理時間などの計測値を記録"""
+        with self._lock:
+            stats = self._observations.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+    def get(self, key):
+        with self._lock:
+            return self._counters[key]
+
+    def snapshot(self):
+        with self._lock:
+            observations = {
+                key: {"count": count, "avg": total / count if count else 0.0, "max": maximum}
+                for key, (count, total, maximum) in self._observations.items()
+            }
+            return {**self._counters, **self._gauges, **observations}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._observations.clear()
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_metrics(name):
+    """名前ごとに共有される Metrics を取得"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Metrics(name)
+        return _registry[name]
+
+
+def snapshot_all():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {m.name: m.snapshot() for m in metrics}
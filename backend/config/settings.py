@@ -2,6 +2,7 @@ from datetime import timedelta
 from os import getenv
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
 from decouple import config
 from dotenv import load_dotenv
 
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
     "allauth",
     "allauth.account",
     "allauth.socialaccount",
+    "config.db",
     "users",
     "todos",
 ]
@@ -82,9 +84,24 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 
 # Database
+# 接続プール（config/db/pool.py）の設定（ワーカープロセスごと）
+DB_POOL_OPTIONS = {
+    # プロセス内の接続数の上限（スレッド数・同時リクエスト数に合わせる）
+    "max_size": int(getenv("DB_POOL_MAX_SIZE", 10)),
+    # 空きを待つ最大秒数（超えるとOperationalError）
+    "timeout": float(getenv("DB_POOL_TIMEOUT", 5)),
+    # 接続を使い続ける最大秒数（フェイルオーバー後の接続先の切り替えなど）
+    "max_lifetime": float(getenv("DB_POOL_MAX_LIFETIME", 1800)),
+    # これより長く未使用だった接続は捨てる
+    "max_idle": float(getenv("DB_POOL_MAX_IDLE", 300)),
+    # 最後の利用からこの秒数を超えた接続は、貸し出す前に SELECT 1 で確認する
+    "health_check_interval": float(getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+}
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # 接続をリクエストごとに張り直さず、プールから取得・返却する
+        "ENGINE": "config.db.postgresql",
         "NAME": getenv("PGDATABASE"),
         "USER": getenv("PGUSER"),
         "PASSWORD": getenv("PGPASSWORD"),
@@ -92,11 +109,51 @@ DATABASES = {
         "PORT": getenv("PGPORT", 5432),
         "OPTIONS": {
             "sslmode": "require",
+            "pool": DB_POOL_OPTIONS,
         },
+        # リクエストの終わりに接続を「閉じる」（プールへ返却する）。永続化はプールが担う
+        "CONN_MAX_AGE": 0,
+        # トランザクション単位のプーリングプロキシではサーバーサイドカーソルを使えない
         "DISABLE_SERVER_SIDE_CURSORS": True,
     }
 }
 
+# リードレプリカ（PGREPLICA_HOSTS にカンマ区切りで指定。接続設定はプライマリと同じ）
+for _i, _host in enumerate(filter(None, getenv("PGREPLICA_HOSTS", "").split(",")), start=1):
+    DATABASES[f"replica_{_i}"] = {
+        **DATABASES["default"],
+        "HOST": _host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+
+# replica_reads()（config/db/replicas.py）のブロック内の読み取りに使うエイリアス
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith("replica_")]
+DATABASE_ROUTERS = [
+    "todos.sharding.TodoShardRouter",
+    "config.db.replicas.PrimaryReplicaRouter",
+]
+# 書き込んだユーザーの読み取りをプライマリに固定する秒数（レプリカがLSNまで追いつけば早めに解除）
+REPLICA_STICKY_SECONDS = 5
+
+# Todoのユーザー単位のシャーディング（todos/sharding.py）
+# シャードとして使うDBエイリアス（TODOSHARD_HOSTS にカンマ区切りで指定すると shard_N を追加。
+# 各シャードには migrate --database shard_N でテーブルを作成しておく）
+for _i, _host in enumerate(filter(None, getenv("TODOSHARD_HOSTS", "").split(",")), start=2):
+    DATABASES[f"shard_{_i}"] = {**DATABASES["default"], "HOST": _host.strip()}
+TODO_SHARDS = ["default", *(alias for alias in DATABASES if alias.startswith("shard_"))]
+TODO_SHARD_VNODES = 64  # コンシステントハッシュのシャードあたりの仮想ノード数
+TODO_SHARD_CACHE_TIMEOUT = 300  # ユーザーの配置のキャッシュ期間（秒）
+TODO_ID_BLOCK_SIZE = 100  # プロセスごとにまとめて予約するTodoのIDの数
+
+# todos_todo のPostgreSQL宣言的パーティショニング（todos/partitioning.py）
+# "hash"（user_id）/ "range"（created_at の月ごと）/ 未指定で分割しない
+TODO_PARTITIONING = {
+    "method": getenv("TODO_PARTITION_METHOD") or None,
+    "partitions": int(getenv("TODO_PARTITION_COUNT", 16)),  # hash のパーティション数
+    "months_ahead": 3,  # range で先に作っておく月数（partition_todos --ensure を定期実行）
+    "chunk_size": 5000,  # 既存行のコピーで1回にコピーする件数
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -153,6 +210,10 @@ CORS_ALLOWED_ORIGINS = [
 # 本番環境では False に設定し、CORS_ALLOWED_ORIGINS または CORS_ALLOWED_HOSTS を厳密に定義すべき
 CORS_ALLOW_CREDENTIALS = True  # クッキーや認証ヘッダーを含める場合に必要
 
+# 楽観的同時実行制御（ETag / If-Match）をフロントエンドから利用できるようにする
+CORS_ALLOW_HEADERS = (*default_headers, "if-match")
+CORS_EXPOSE_HEADERS = ["ETag"]
+
 # CSRFトークンもCookieで送る
 CSRF_COOKIE_SAMESITE = "None"
 CSRF_COOKIE_HTTPONLY = False  # フロントエンドから読み取り可能にする
@@ -163,8 +224,9 @@ CSRF_TRUSTED_ORIGINS = CORS_ALLOWED_ORIGINS
 # REST FrameWorkの設定
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "dj_rest_auth.jwt_auth.JWTCookieAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # トークンからのユーザー取得を2段キャッシュ経由にする（users/user_cache.py）
+        "users.authentication.CachedJWTCookieAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         # 'rest_framework.permissions.IsAuthenticated',
@@ -188,6 +250,8 @@ REST_AUTH = {
     # カスタムシリアライザ
     "USER_DETAILS_SERIALIZER": "users.serializers.CustomUserSerializer",  # ユーザー情報取得用
     "REGISTER_SERIALIZER": "users.serializers.CustomRegisterSerializer",  # ユーザー登録用
+    "PASSWORD_CHANGE_SERIALIZER": "users.serializers.CustomPasswordChangeSerializer",  # パスワード変更用
+    "JWT_TOKEN_CLAIMS_SERIALIZER": "users.serializers.CustomTokenObtainPairSerializer",  # トークン発行用
 }
 
 # Simple JWT の設定
@@ -204,6 +268,27 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# リフレッシュトークンの失効管理（users/token_blacklist.py）
+# token_blacklistアプリのSQLテーブルは使わず、失効したJTIを残り有効期間のTTL付きでRedisに保存する
+# （既存テーブルは prune_token_blacklist コマンドで削除する）
+TOKEN_BLACKLIST_BACKEND = "users.token_blacklist.RedisTokenBlacklist"
+# Bloomフィルタのビット数（None で無効）。有効にすると失効していないトークンの判定でRedisを参照しないが、
+# 他プロセスでの失効が最大 TOKEN_BLACKLIST_BLOOM_REFRESH_INTERVAL 秒遅れて反映される
+TOKEN_BLACKLIST_BLOOM_BITS = None  # 例: 2**23（1MB）
+TOKEN_BLACKLIST_BLOOM_HASHES = 7
+TOKEN_BLACKLIST_BLOOM_REFRESH_INTERVAL = 5
+
+# パスワードのハッシュ計算（users/hashing.py）
+# 同時に計算する数と空きを待つ数の上限。超えた分は503で断り、Todo APIのCPUを確保する
+PASSWORD_HASHING_MAX_WORKERS = 2
+PASSWORD_HASHING_MAX_PENDING = 16
+
+# 認証ユーザーのキャッシュ（秒）
+# プロセス内（L1）は他プロセスでの無効化が届かないため短くする
+AUTH_USER_LOCAL_CACHE_TTL = 5
+AUTH_USER_LOCAL_CACHE_MAX_SIZE = 10000
+AUTH_USER_CACHE_TTL = 60
+
 # カスタムユーザーモデルのフルパスを設定
 AUTH_USER_MODEL = "users.CustomUser"
 
@@ -262,11 +347,14 @@ else:
     MEDIA_URL = "/media/"
     MEDIA_ROOT = BASE_DIR / "media"
 
+# Redis接続先（キャッシュ・イベント配信で共有）
+REDIS_URL = getenv("REDIS_URL")
+
 # キャッシュ設定
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": getenv("REDIS_URL"),
+        "LOCATION": REDIS_URL,
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
             # UpstashはSSL必須。証明書検証でエラーが出る場合は以下を指定
@@ -277,6 +365,10 @@ CACHES = {
     }
 }
 
+# 非同期ビュー用のキャッシュクライアント（config/async_cache.py）
+# CACHES と同じRedisを redis.asyncio で直接読み書きする
+ASYNC_CACHE_BACKEND = "config.async_cache.RedisAsyncCache"
+
 # セッション設定
 # セッションの保存先をキャッシュ（Redis）に指定
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
@@ -290,14 +382,83 @@ SESSION_SAVE_EVERY_REQUEST = (
     False  # リクエストごとに保存するとRedisへの負荷が増えるため通常はFalse
 )
 
+# Todo変更イベント（SSE）設定
+# 複数プロセスへ配信するため本番はRedis Pub/Subを使用
+TODO_EVENTS_CHANNEL = "todos.events.RedisEventChannel"
+# アイドル接続を維持するためのハートビート間隔（秒）
+TODO_EVENTS_HEARTBEAT_INTERVAL = 15
+
+# 進捗率更新のまとめ書き設定
+# スライダー操作などの進捗率のみの連続更新をバッファし、一定間隔でまとめてDBへ反映する。
+# None で無効。複数プロセス構成では "todos.coalescing.RedisProgressBuffer" を指定する
+TODO_PROGRESS_BUFFER = None
+TODO_PROGRESS_FLUSH_INTERVAL = 0.5  # 反映間隔（秒）
+TODO_PROGRESS_FLUSH_BATCH_SIZE = 500  # 1回の UPDATE で反映する最大件数
+
+# 完了したTodoのアーカイブ（todos/archive.py。archive_todos コマンドを定期実行）
+TODO_ARCHIVE_AFTER_DAYS = 30  # 進捗率100のままこの日数が過ぎたTodoをアーカイブへ移す
+TODO_ARCHIVE_BATCH_SIZE = 500  # 1トランザクションで移す件数
+
+# Todoの論理削除（削除は deleted_at の設定のみ。purge_deleted_todos コマンドを定期実行して物理削除）
+TODO_SOFT_DELETE = True
+TODO_PURGE_AFTER_DAYS = 7  # 削除からこの日数が過ぎたTodoを物理削除する（同期クライアントが削除を取得できる期間）
+TODO_PURGE_BATCH_SIZE = 500  # 1回の DELETE で削除する件数
+TODO_PURGE_BATCH_INTERVAL = 0.5  # バッチ間の待ち時間（秒）。VACUUM・レプリケーションが追いつく余裕を残す
+
+# 大きなテーブルのオンラインのスキーマ変更（config/db/online_schema.py。migrate_online コマンドで実行）
+ONLINE_SCHEMA_CHANGE = {
+    "lock_timeout": "2s",  # ALTER TABLE 等がロックを待つ上限（待つ間は後続の読み書きも止まる）
+    "attempts": 10,  # ロックを取れなかった場合の試行回数
+    "retry_delay": 5,  # 再試行までの待ち時間（秒。試行ごとに増やす）
+    "batch_size": 5000,  # 既存の行を埋める1トランザクションの行数
+    # 通常の AddIndex・AlterField 等を migrate_online が拒否するテーブル
+    "large_tables": ["todos_todo", "todos_archivedtodo", "custom_user"],
+}
+
+# アウトボックス（users/outbox.py）
+# 登録時に書き込んだ送信待ちメッセージを dispatch_outbox コマンドが送信する
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_BACKOFF_BASE = 2  # 秒（失敗ごとに倍）
+OUTBOX_BACKOFF_MAX = 3600  # 秒
+OUTBOX_LEASE_SECONDS = 60  # 送信中のメッセージを他のワーカーが取らない時間
+OUTBOX_POLL_INTERVAL = 1  # 秒（送信待ちがない場合の待機）
+
+# 削除要求されたユーザーの関連データを削除する際の1回の件数（UserCommandService.purge_user）
+USER_PURGE_BATCH_SIZE = 1000
+
+# 既存の行のバックフィル（config/db/backfill.py。run_backfill コマンドで実行）
+BACKFILL_BATCH_SIZE = 1000  # 最初のバッチの件数（以降は処理時間に応じて増減）
+BACKFILL_MAX_BATCH_SIZE = 10000
+BACKFILL_TARGET_BATCH_SECONDS = 0.5  # これを超えたバッチの後は件数を半分にし、同じ時間だけ休む
+BACKFILL_BATCH_INTERVAL = 0.1  # バッチ間の最小の待ち時間（秒）
+BACKFILL_MAX_REPLICATION_LAG = 5  # レプリカの遅延（秒）がこれを超えている間は待つ
+BACKFILL_MAX_SLEEP = 60  # 1回の待ち時間の上限（秒）
+
 # qstash設定
 QSTASH_TOKEN = getenv("QSTASH_TOKEN")
 QSTASH_CURRENT_SIGNING_KEY = getenv("QSTASH_CURRENT_SIGNING_KEY")
 QSTASH_NEXT_SIGNING_KEY = getenv("QSTASH_NEXT_SIGNING_KEY")
+QSTASH_URL = getenv("QSTASH_URL", "https://qstash.upstash.io")
+QSTASH_POOL_MAXSIZE = 10  # 共有セッションで保持する接続数（同時送信数）
+QSTASH_BATCH_SIZE = 100  # /v2/batch 1回あたりのメッセージ数
+QSTASH_WEBHOOK_IDEMPOTENCY_TTL = 60 * 60 * 24  # 処理済みメッセージIDを覚えておく秒数（再配信の期間より長く）
+QSTASH_WEBHOOK_PROCESSING_TTL = 60  # 処理中の印の有効秒数（送信のタイムアウトより長く。過ぎれば再配信で送り直す）
 
 # resend設定
 RESEND_API_KEY = getenv("RESEND_API_KEY")
+EMAIL_TRANSPORT = "users.email_service.ResendTransport"  # ローカル開発では FakeTransport も可
+EMAIL_BATCH_SIZE = 100  # Resendのバッチ送信1回あたりの上限
 WEBHOOK_BASE_URL = getenv("WEBHOOK_BASE_URL", "http://localhost:8000")
 
+# 外部サービス呼び出しのサーキットブレーカー・バルクヘッド（プロセスごと）
+# failure_threshold: 連続失敗でサーキットを開く回数
+# reset_timeout: 開いてから試行（half_open）までの秒数
+# max_concurrent: 同時呼び出し数の上限（超えた呼び出しは待たずに失敗）
+OUTBOUND_CALL_GUARDS = {
+    "qstash": {"failure_threshold": 5, "reset_timeout": 30, "max_concurrent": QSTASH_POOL_MAXSIZE},
+    "resend": {"failure_threshold": 5, "reset_timeout": 30, "max_concurrent": 4},
+}
+
 # フロントエンドURL
 FRONTEND_URL = config('FRONT_URL', default='http://localhost:3000')
\ No newline at end of file
@@ -10,8 +10,20 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
-    }
+    },
+    # レプリカ振り分けのテスト用（プライマリとは別のDB。databases で指定したテストのみ作成される）
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    # シャーディングのテスト用（TODO_SHARDS は既定の ["default"] のまま、テストで上書きする）
+    'shard_2': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
 }
+DATABASE_REPLICAS = []
+TODO_SHARDS = ['default']
 
 # テスト高速化
 PASSWORD_HASHERS = [
@@ -40,5 +52,14 @@ CACHES = {
     }
 }
 
+# 非同期ビュー用のキャッシュ（テスト用：Djangoキャッシュ経由）
+ASYNC_CACHE_BACKEND = 'config.async_cache.DjangoAsyncCache'
+
+# Todo変更イベント（テスト用：プロセス内配信）
+TODO_EVENTS_CHANNEL = 'todos.events.InMemoryEventChannel'
+
+# リフレッシュトークンの失効管理（テスト用：プロセス内）
+TOKEN_BLACKLIST_BACKEND = 'users.token_blacklist.InMemoryTokenBlacklist'
+
 # テスト環境フラグ
 TESTING = True
\ No newline at end of file
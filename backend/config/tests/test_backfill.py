@@ -0,0 +1,121 @@
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from config.db.backfill import AdaptiveThrottle, Backfill, plan, run_backfill
+from config.db.models import BackfillCheckpoint
+from users.models import CustomUser
+
+
+class RecordingBackfill(Backfill):
+    """処理したIDを記録するバックフィル（stop_after 件目のバッチの後に停止する）"""
+
+    name = 'recording'
+    model = CustomUser
+
+    def __init__(self, stop=None, stop_after=None):
+        self.batches = []
+        self.stop = stop
+        self.stop_after = stop_after
+        self.lock = threading.Lock()
+
+    def process(self, queryset):
+        ids = list(queryset.order_by('id').values_list('id', flat=True))
+        with self.lock:
+            self.batches.append(ids)
+            if self.stop is not None and len(self.batches) == self.stop_after:
+                self.stop.set()
+        return len(ids)
+
+
+@override_settings(BACKFILL_BATCH_INTERVAL=0)
+class BackfillTest(TestCase):
+    """バックフィルの実行と再開のテスト"""
+
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(email=f'user{i}@example.com', password='testpass123') for i in range(5)
+        ]
+        self.ids = [user.id for user in self.users]
+
+    def test_processes_in_keyset_batches_and_resumes(self):
+        """IDの順にバッチで処理し、中断後は記録した続きのIDから再開する"""
+        stop = threading.Event()
+        backfill = RecordingBackfill(stop=stop, stop_after=1)
+
+        self.assertEqual(run_backfill(backfill, batch_size=2, stop=stop), {'default': 2})
+        checkpoint = BackfillCheckpoint.objects.get(name='recording')
+        self.assertEqual((checkpoint.last_id, checkpoint.completed_at), (self.ids[1], None))
+
+        resumed = RecordingBackfill()
+        self.assertEqual(run_backfill(resumed, batch_size=2), {'default': 3})
+        self.assertEqual(sum(resumed.batches, []), self.ids[2:])
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.rows, 5)
+        self.assertIsNotNone(checkpoint.completed_at)
+
+        # 完了済みの範囲は再実行しない
+        self.assertEqual(run_backfill(RecordingBackfill()), {'default': 0})
+
+    def test_plan_splits_ids_into_disjoint_ranges(self):
+        """workers 個の重ならない範囲に分け、最後の範囲は上限なしにする"""
+        checkpoints = plan(RecordingBackfill(), 'default', workers=2)
+
+        self.assertEqual(
+            [(c.start_id, c.end_id) for c in checkpoints],
+            [(self.ids[0], self.ids[2]), (self.ids[3], None)],
+        )
+        # 再開時は最初の分割を使う
+        self.assertEqual(len(plan(RecordingBackfill(), 'default', workers=4)), 2)
+
+
+@override_settings(BACKFILL_BATCH_INTERVAL=0)
+class ParallelBackfillTest(TransactionTestCase):
+    """複数のワーカーでのバックフィルのテスト"""
+
+    def test_workers_process_disjoint_ranges(self):
+        """各ワーカーは自分の範囲だけを処理し、全体で各行をちょうど1回処理する"""
+        ids = [
+            CustomUser.objects.create_user(email=f'user{i}@example.com', password='testpass123').id
+            for i in range(6)
+        ]
+        backfill = RecordingBackfill()
+
+        self.assertEqual(run_backfill(backfill, workers=3, batch_size=1), {'default': 6})
+        self.assertEqual(sorted(sum(backfill.batches, [])), ids)
+        self.assertEqual(BackfillCheckpoint.objects.filter(completed_at__isnull=False).count(), 3)
+
+
+@override_settings(
+    BACKFILL_BATCH_SIZE=100,
+    BACKFILL_MAX_BATCH_SIZE=200,
+    BACKFILL_TARGET_BATCH_SECONDS=0.5,
+    BACKFILL_BATCH_INTERVAL=0,
+    BACKFILL_MAX_REPLICATION_LAG=5,
+    BACKFILL_MAX_SLEEP=4,
+)
+@patch('config.db.backfill.time.sleep')
+class AdaptiveThrottleTest(SimpleTestCase):
+    """バッチの件数と間隔の調整のテスト"""
+
+    def test_shrinks_slow_batches_and_grows_fast_ones(self, sleep):
+        """目標より遅いバッチの後は件数を半分にして休み、速ければ件数を増やす"""
+        throttle = AdaptiveThrottle()
+
+        throttle.after_batch(2.0)
+        self.assertEqual(throttle.batch_size, 50)
+        sleep.assert_called_once_with(2.0)
+
+        for _ in range(10):
+            throttle.after_batch(0.1)
+        self.assertEqual(throttle.batch_size, 200)
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_waits_while_replicas_lag(self, sleep):
+        """レプリカの遅延が上限を下回るまで間隔を延ばしながら待つ"""
+        lags = iter([10.0, 8.0, 6.0, 1.0])
+        throttle = AdaptiveThrottle(lag=lambda: next(lags))
+
+        throttle.wait_for_replicas()
+
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2, 4])
@@ -0,0 +1,229 @@
+import threading
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+from config.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+def reset(conn):
+    conn.in_transaction = False
+    return not conn.closed
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """
+    DB接続プールのテスト（DBに依存しない偽の接続を使用）
+    """
+
+    def _pool(self, **options):
+        self.opened = []
+
+        def connect():
+            conn = FakeConnection()
+            self.opened.append(conn)
+            return conn
+
+        pool = ConnectionPool(
+            "test", connect=connect, check=lambda conn: conn.healthy, reset=reset, **options
+        )
+        pool.metrics.reset()
+        return pool
+
+    def test_connections_are_reused(self):
+        """返却された接続は次の取得で使い回される"""
+        pool = self._pool()
+
+        for _ in range(5):
+            pool.putconn(pool.getconn())
+
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.metrics.get("opened"), 1)
+        self.assertEqual(pool.metrics.get("closed"), 0)
+        self.assertEqual(pool.metrics.snapshot()["checkout_wait_ms"]["count"], 5)
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        """返却時に未完了のトランザクションを片付ける"""
+        pool = self._pool()
+        conn = pool.getconn()
+        conn.in_transaction = True
+
+        pool.putconn(conn)
+
+        self.assertFalse(pool.getconn().in_transaction)
+
+    def test_unusable_connections_are_discarded(self):
+        """返却時に使えない接続は閉じて、次は新しく接続する"""
+        pool = self._pool()
+        conn = pool.getconn()
+        conn.closed = True
+
+        pool.putconn(conn)
+
+        self.assertIsNot(pool.getconn(), conn)
+        self.assertEqual(pool.metrics.get("closed"), 1)
+
+    def test_health_check_on_checkout(self):
+        """しばらく使われていなかった接続は貸し出す前に確認し、失敗すれば張り直す"""
+        pool = self._pool(health_check_interval=0)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.healthy = False
+
+        new_conn = pool.getconn()
+
+        self.assertIsNot(new_conn, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.metrics.get("health_check_failures"), 1)
+
+    def test_max_lifetime(self):
+        """寿命を過ぎた接続は使い回さない"""
+        pool = self._pool(max_lifetime=60)
+        conn = pool.getconn()
+
+        with patch("config.db.pool.time.monotonic", return_value=10 ** 9):
+            pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.metrics.get("expired"), 1)
+        self.assertIsNot(pool.getconn(), conn)
+
+    def test_max_idle(self):
+        """長く未使用だった接続は捨てる"""
+        pool = self._pool(max_idle=60, max_lifetime=10 ** 10)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        with patch("config.db.pool.time.monotonic", return_value=10 ** 9):
+            new_conn = pool.getconn()
+
+        self.assertIsNot(new_conn, conn)
+        self.assertTrue(conn.closed)
+
+    def test_checkout_waits_for_free_connection(self):
+        """上限に達している間は返却を待つ"""
+        pool = self._pool(max_size=1, timeout=5)
+        conn = pool.getconn()
+        timer = threading.Timer(0.05, pool.putconn, args=(conn,))
+        timer.start()
+
+        self.assertIs(pool.getconn(), conn)
+        timer.join()
+        self.assertGreater(pool.metrics.snapshot()["checkout_wait_ms"]["max"], 0)
+
+    def test_checkout_timeout(self):
+        """timeout 秒以内に空かなければ PoolTimeout"""
+        pool = self._pool(max_size=1, timeout=0.01)
+        pool.getconn()
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+        self.assertEqual(pool.metrics.get("timeouts"), 1)
+
+    def test_failed_connect_releases_slot(self):
+        """接続に失敗しても接続枠は戻る"""
+        pool = ConnectionPool(
+            "test", connect=self._refuse, check=lambda conn: True, reset=reset, max_size=1, timeout=0.01
+        )
+        for _ in range(2):
+            with self.assertRaises(ConnectionRefusedError):
+                pool.getconn()
+
+    @staticmethod
+    def _refuse():
+        raise ConnectionRefusedError()
+
+    def test_gauges(self):
+        """貸出中・未使用の接続数をメトリクスに出す"""
+        pool = self._pool()
+        first = pool.getconn()
+        pool.getconn()
+        pool.putconn(first)
+
+        snapshot = pool.metrics.snapshot()
+        self.assertEqual((snapshot["size"], snapshot["idle"], snapshot["in_use"]), (2, 1, 1))
+
+
+class FakePostgresConnection:
+    """SET・RESET ALL だけを解釈する psycopg2 の接続の代わり"""
+
+    def __init__(self):
+        self.closed = False
+        self.autocommit = True
+        self.info = self
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+        self.settings = {}
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql):
+        if sql.startswith("SET "):
+            name, value = sql[len("SET "):].split(" = ")
+            self.settings[name] = value
+        elif sql == "RESET ALL":
+            self.settings.clear()
+
+    def rollback(self):
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class PooledPostgresBackendTest(SimpleTestCase):
+    """
+    プールを使うPostgreSQLバックエンドの設定のテスト
+    """
+
+    def test_session_settings_are_reset_on_return(self):
+        """返却時に SET で変えた設定を戻し、次の貸出に持ち越さない"""
+        from config.db.postgresql.base import _check, _reset
+
+        pool = ConnectionPool("test", connect=FakePostgresConnection, check=_check, reset=_reset)
+        conn = pool.getconn()
+        conn.execute("SET statement_timeout = 5")
+        conn.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+
+        pool.putconn(conn)
+        reused = pool.getconn()
+
+        self.assertIs(reused, conn)
+        self.assertEqual(reused.settings, {})
+        self.assertEqual(reused.transaction_status, extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_pool_options_are_not_passed_to_driver(self):
+        """OPTIONS["pool"] は接続パラメータに含めない"""
+        from config.db.postgresql.base import DatabaseWrapper
+
+        settings_dict = {
+            **connection.settings_dict,
+            "ENGINE": "config.db.postgresql",
+            "NAME": "app",
+            "USER": "app",
+            "PASSWORD": "",
+            "HOST": "localhost",
+            "PORT": 5432,
+            "OPTIONS": {"sslmode": "require", "pool": {"max_size": 3}},
+        }
+        wrapper = DatabaseWrapper(settings_dict, alias="pooled")
+
+        params = wrapper.get_connection_params()
+
+        self.assertNotIn("pool", params)
+        self.assertEqual(params["sslmode"], "require")
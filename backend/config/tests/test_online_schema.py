@@ -0,0 +1,246 @@
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, migrations, models
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.state import ProjectState
+from django.db.models.functions import Upper
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from config.db import online_schema
+from todos.models import Todo
+
+User = get_user_model()
+
+ONLINE_SCHEMA_CHANGE = {
+    'lock_timeout': '2s',
+    'attempts': 3,
+    'retry_delay': 5,
+    'batch_size': 2,
+    'large_tables': ['todos_todo'],
+}
+
+
+def lock_timeout_error():
+    error = OperationalError('canceling statement due to lock timeout')
+    error.__cause__ = Exception()
+    error.__cause__.pgcode = online_schema.LOCK_NOT_AVAILABLE
+    return error
+
+
+@override_settings(ONLINE_SCHEMA_CHANGE=ONLINE_SCHEMA_CHANGE)
+@patch('config.db.online_schema.time.sleep')
+@patch('config.db.online_schema._set_lock_timeout', return_value='0')
+class LockTimeoutRetryTest(SimpleTestCase):
+    """lock_timeout で打ち切られた操作の再試行のテスト"""
+
+    connection = SimpleNamespace(vendor='postgresql', alias='default')
+
+    def test_retries_until_lock_is_acquired(self, set_lock_timeout, sleep):
+        """ロックを取れなかった場合は待ち時間を延ばしながら再試行し、ロックの設定を元に戻す"""
+        results = iter([lock_timeout_error(), lock_timeout_error(), 'done'])
+
+        def func():
+            result = next(results)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.assertEqual(online_schema.run_with_lock_timeout(self.connection, func, atomic=False), 'done')
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [5, 10])
+        set_lock_timeout.assert_called_with(self.connection, '0', local=False)
+
+    def test_gives_up_after_attempts(self, set_lock_timeout, sleep):
+        """試行回数を超えた場合とロック以外のエラーはそのまま送出する"""
+        def locked():
+            raise lock_timeout_error()
+
+        with self.assertRaises(OperationalError):
+            online_schema.run_with_lock_timeout(self.connection, locked, atomic=False)
+        self.assertEqual(sleep.call_count, 2)
+
+        def broken():
+            raise OperationalError('syntax error')
+
+        with self.assertRaises(OperationalError):
+            online_schema.run_with_lock_timeout(self.connection, broken, atomic=False)
+        self.assertEqual(sleep.call_count, 2)
+
+
+@override_settings(ONLINE_SCHEMA_CHANGE=ONLINE_SCHEMA_CHANGE)
+class BlockingOperationsTest(SimpleTestCase):
+    """大きなテーブルを長くロックする操作の検出のテスト"""
+
+    def migration(self, name, operations, app_label='todos'):
+        migration = migrations.Migration(name, app_label)
+        migration.operations = operations
+        return migration
+
+    def test_detects_blocking_operations_on_large_tables(self):
+        """大きなテーブルへの通常の AddIndex・AlterField 等だけを検出する"""
+        index = models.Index(fields=['updated_at'], name='todo_updated_idx')
+        blocking = [
+            migrations.AddIndex('todo', index),
+            migrations.AlterField('todo', 'todo_title', models.CharField(max_length=500)),
+            migrations.AddField('todo', 'code', models.CharField(max_length=10, unique=True, null=True)),
+        ]
+        online = [
+            online_schema.AddIndexOnline('todo', index),
+            migrations.AddField('todo', 'note', models.TextField(null=True)),
+            online_schema.AddFieldOnline('todo', 'weight', models.IntegerField(default=0)),
+        ]
+        plan = [
+            (self.migration('0100_blocking', blocking + online), False),
+            (self.migration('0101_other_table', [migrations.AddIndex('archivedtodo', index)]), False),
+            (self.migration('0102_backwards', blocking), True),
+        ]
+
+        found = online_schema.blocking_operations(plan)
+
+        self.assertEqual([operation for _, operation, _ in found], blocking)
+        self.assertEqual(found[0][2], 'AddIndexOnline')
+
+    def test_ignores_tables_created_in_the_same_plan(self):
+        """同じ計画の中で作成するテーブル（空のテーブル）は対象にしない"""
+        plan = [
+            (self.migration('0100_create', [migrations.CreateModel('Todo', fields=[])]), False),
+            (self.migration('0101_index', [
+                migrations.AddIndex('todo', models.Index(fields=['updated_at'], name='todo_updated_idx')),
+            ]), False),
+        ]
+
+        self.assertEqual(online_schema.blocking_operations(plan), [])
+
+    def test_suggests_online_unique_constraint(self):
+        """一意制約の AddConstraint には AddUniqueConstraintOnline を勧め、それ自体は検出しない"""
+        constraint = models.UniqueConstraint(Upper('todo_title'), name='todo_title_upper_uniq')
+        plan = [(self.migration('0100_unique', [
+            migrations.AddConstraint('todo', constraint),
+            online_schema.AddUniqueConstraintOnline('todo', constraint),
+        ]), False)]
+
+        found = online_schema.blocking_operations(plan)
+
+        self.assertEqual([online for _, _, online in found], ['AddUniqueConstraintOnline'])
+
+    def test_ignores_alter_field_that_only_drops_foreign_key_constraint(self):
+        """変更前の状態が分かる場合、外部キー制約を外すだけの AlterField は対象にしない"""
+        user = models.ForeignKey('users.customuser', on_delete=models.CASCADE, related_name='todos')
+        create = migrations.CreateModel('Todo', fields=[('id', models.AutoField(primary_key=True)), ('user', user)])
+        state = ProjectState()
+        create.state_forwards('todos', state)
+        drop_constraint = migrations.AlterField('todo', 'user', models.ForeignKey(
+            'users.customuser', on_delete=models.CASCADE, related_name='todos', db_constraint=False,
+        ))
+        nullable = migrations.AlterField('todo', 'user', models.ForeignKey(
+            'users.customuser', on_delete=models.CASCADE, related_name='todos', db_constraint=False, null=True,
+        ))
+        plan = [(self.migration('0100_alter', [drop_constraint, nullable]), False)]
+
+        self.assertEqual([op for _, op, _ in online_schema.blocking_operations(plan, state.clone())], [nullable])
+        # 変更前の状態が分からなければ AlterField はすべて対象にする
+        self.assertEqual(len(online_schema.blocking_operations(plan)), 2)
+
+    def test_project_migrations_are_online(self):
+        """既存のDBに対して、このプロジェクトのマイグレーションはどれも大きなテーブルを長くロックしない"""
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        nodes = []
+        for leaf in loader.graph.leaf_nodes():
+            nodes += [node for node in loader.graph.forwards_plan(leaf) if node not in nodes]
+        # 最初のマイグレーション（テーブルの作成）まで適用済みの状態から残りを検査する
+        initial = [node for node in nodes if loader.graph.nodes[node].initial]
+        rest = [(loader.graph.nodes[node], False) for node in nodes if node not in initial]
+        state = loader.project_state(initial)
+
+        with override_settings(ONLINE_SCHEMA_CHANGE={
+            **ONLINE_SCHEMA_CHANGE, 'large_tables': ['custom_user', 'todos_todo'],
+        }):
+            self.assertEqual(online_schema.blocking_operations(rest, state), [])
+
+    def test_rejects_fields_that_need_an_index(self):
+        """AddFieldOnline はインデックス・外部キー制約を伴う列を受け付けない"""
+        with self.assertRaises(ValueError):
+            online_schema.AddFieldOnline('todo', 'code', models.CharField(max_length=10, db_index=True))
+
+
+class OnlineOperationsFallbackTest(TransactionTestCase):
+    """PostgreSQL以外のDB（SQLite）でのオンラインの操作のテスト"""
+
+    def setUp(self):
+        user = User.objects.create_user(email='user@example.com', password='testpass123')
+        Todo.objects.bulk_create([Todo(user=user, todo_title='a' * length) for length in (1, 2, 3)])
+        self.state = MigrationExecutor(connection).loader.project_state()
+
+    def apply(self, operation, backwards=False):
+        before = self.state.clone()
+        after = before.clone()
+        operation.state_forwards('todos', after)
+        with connection.schema_editor(atomic=True) as schema_editor:
+            if backwards:
+                operation.database_backwards('todos', schema_editor, after, before)
+            else:
+                operation.database_forwards('todos', schema_editor, before, after)
+
+    def test_add_field_fills_existing_rows(self):
+        """AddFieldOnline は通常の AddField の後に using の式で既存の行を埋める"""
+        operation = online_schema.AddFieldOnline(
+            'todo', 'title_length', models.IntegerField(default=0), using='LENGTH("todo_title")'
+        )
+        self.apply(operation)
+        self.addCleanup(self.apply, operation, backwards=True)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT title_length FROM todos_todo ORDER BY title_length')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [1, 2, 3])
+
+    def test_index_operations_use_plain_ddl(self):
+        """AddIndexOnline・RemoveIndexOnline は通常の CREATE / DROP INDEX になる"""
+        index = models.Index(fields=['todo_title'], name='todo_title_online_idx')
+        operation = online_schema.AddIndexOnline('todo', index)
+
+        self.apply(operation)
+        with connection.cursor() as cursor:
+            self.assertIn('todo_title_online_idx', connection.introspection.get_constraints(cursor, 'todos_todo'))
+        self.apply(operation, backwards=True)
+        with connection.cursor() as cursor:
+            self.assertNotIn('todo_title_online_idx', connection.introspection.get_constraints(cursor, 'todos_todo'))
+
+
+    def test_unique_constraint_uses_plain_ddl(self):
+        """AddUniqueConstraintOnline は通常の AddConstraint / RemoveConstraint になる"""
+        constraint = models.UniqueConstraint(Upper('todo_title'), name='todo_title_upper_uniq')
+        operation = online_schema.AddUniqueConstraintOnline('todo', constraint)
+
+        self.apply(operation)
+        with connection.cursor() as cursor:
+            self.assertIn('todo_title_upper_uniq', connection.introspection.get_constraints(cursor, 'todos_todo'))
+        self.apply(operation, backwards=True)
+        with connection.cursor() as cursor:
+            self.assertNotIn('todo_title_upper_uniq', connection.introspection.get_constraints(cursor, 'todos_todo'))
+
+
+class MigrateOnlineCommandTest(TestCase):
+    """migrate_online コマンドのテスト"""
+
+    def test_check_reports_pending_migrations(self):
+        """--check は未適用のマイグレーションと検出した操作の件数を表示する"""
+        out = StringIO()
+        call_command('migrate_online', check=True, stdout=out)
+
+        self.assertIn('0 migrations to apply, 0 blocking operations.', out.getvalue())
+
+    @patch('config.db.management.commands.migrate_online.blocking_operations')
+    def test_refuses_blocking_operations(self, blocking_operations):
+        """大きなテーブルを長くロックする操作がある場合は --allow-blocking なしでは実行しない"""
+        migration = migrations.Migration('0100_blocking', 'todos')
+        operation = migrations.AddIndex('todo', models.Index(fields=['updated_at'], name='todo_updated_idx'))
+        blocking_operations.return_value = [(migration, operation, 'AddIndexOnline')]
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('migrate_online', stdout=out)
+        self.assertIn('todos.0100_blocking', out.getvalue())
@@ -0,0 +1,99 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from config.db.replicas import mark_written, replica_reads
+from todos.models import Todo
+from todos.service import TodoService
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TestCase):
+    """
+    リードレプリカへの振り分けのテスト
+
+    プライマリ（default）とレプリカ（replica）は別のSQLiteのため、
+    レプリカから読んだ場合はプライマリに書き込んだデータが見えない。
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        Todo.objects.create(user=self.user, todo_title='タスク')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_reads_go_to_replica_only_inside_block(self):
+        """replica_reads のブロック内の読み取りだけがレプリカへ行く"""
+        with replica_reads():
+            self.assertEqual(Todo.objects.count(), 0)
+            self.assertEqual(router.db_for_read(Todo), 'replica')
+        self.assertEqual(Todo.objects.count(), 1)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_reads_primary(self):
+        """レプリカ未設定ならプライマリから読む"""
+        with replica_reads(self.user.id):
+            self.assertEqual(Todo.objects.count(), 1)
+
+    def test_writes_always_go_to_primary(self):
+        """レプリカから読み込んだインスタンスの保存もプライマリへ"""
+        todo = Todo.objects.first()
+        todo._state.db = 'replica'
+
+        self.assertEqual(router.db_for_write(Todo, instance=todo), 'default')
+
+    def test_read_your_writes_after_todo_service_write(self):
+        """TodoServiceで書き込んだユーザーは、しばらくプライマリから読む"""
+        with self.captureOnCommitCallbacks(execute=True):
+            TodoService.create_todo(self.user, {'todo_title': '新しいタスク'})
+
+        with replica_reads(self.user.id):
+            self.assertEqual(Todo.objects.filter(user=self.user).count(), 2)
+        # 他のユーザーはレプリカから読む
+        with replica_reads(self.user.id + 1):
+            self.assertEqual(router.db_for_read(Todo), 'replica')
+
+        # 固定期間が過ぎればレプリカから読む
+        cache.clear()
+        with replica_reads(self.user.id):
+            self.assertEqual(router.db_for_read(Todo), 'replica')
+
+    def test_write_inside_block_switches_to_primary(self):
+        """ブロック内で書き込んだ後の読み取りはプライマリから"""
+        with replica_reads(self.user.id):
+            self.assertEqual(router.db_for_read(Todo), 'replica')
+            mark_written(self.user.id)
+            self.assertEqual(router.db_for_read(Todo), 'default')
+
+    def test_sticky_released_when_replica_caught_up(self):
+        """レプリカが書き込みのLSNまで追いついていればレプリカから読む"""
+        cache.set(f'db_primary_sticky:{self.user.id}', '0/16B3748')
+
+        with patch('config.db.replicas._replica_caught_up', return_value=True) as mock_check:
+            with replica_reads(self.user.id):
+                self.assertEqual(router.db_for_read(Todo), 'replica')
+        mock_check.assert_called_once_with('replica', '0/16B3748')
+
+        with patch('config.db.replicas._replica_caught_up', return_value=False):
+            with replica_reads(self.user.id):
+                self.assertEqual(router.db_for_read(Todo), 'default')
+
+    def test_todo_list_uses_replica(self):
+        """一覧APIはレプリカから読み、書き込んだ直後はプライマリから読む"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        self.assertEqual(client.get('/api/v1/todos/').json(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/v1/todos/', {'todo_title': '新しいタスク'}, format='json')
+        self.assertEqual(len(client.get('/api/v1/todos/').json()), 2)
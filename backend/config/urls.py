@@ -1,12 +1,22 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.http import JsonResponse
-from users.views import CustomRegisterView
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from config.metrics import snapshot_all
+from users.views import CustomLogoutView, CustomRegisterView, CustomTokenRefreshView
 
 def health_check(request):
     # status=200 を明示的に返す（curl -f は 200番台を成功とみなすため）
     return JsonResponse({'status': 'healthy', 'service': 'backend'}, status=200)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    # プロセス内の計測値（キャッシュのヒット率など）。値はワーカープロセスごと
+    return Response(snapshot_all())
+
 urlpatterns = [
     path("admin/", admin.site.urls),
 
@@ -15,6 +25,10 @@ urlpatterns = [
     # - POST /api/v1/auth/logout/         → ログアウト
     # - POST /api/v1/auth/token/refresh/  → トークンリフレッシュ
     # - GET  /api/v1/auth/user/           → 現在のユーザー情報取得
+    # ログアウト・トークンリフレッシュは、リフレッシュトークンの失効をRedisで管理する独自ビューで上書き
+    # （dj-rest-auth と同じく末尾のスラッシュは省略可）
+    re_path(r'^api/v1/auth/logout/?$', CustomLogoutView.as_view(), name='rest_logout'),
+    re_path(r'^api/v1/auth/token/refresh/?$', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('api/v1/auth/', include('dj_rest_auth.urls')),
     
     # ユーザー登録
@@ -29,11 +43,21 @@ urlpatterns = [
     # POST /api/v1/todos/: 新規作成
     # PUT/PATCH /api/v1/todos/{id}/: 更新
     # DELETE /api/v1/todos/{id}/: 削除
+    # GET /api/v1/todos/events/: 変更イベントのSSE配信（config/asgi.py で処理）
     path('api/v1/todos/', include('todos.urls')),
 
+    # TODOアプリの読み取りの非同期版（非同期ORM・redis.asyncio。レスポンスは上と同じ）
+    # GET /api/v1/async/todos/: 一覧取得
+    # GET /api/v1/async/todos/{id}/: 詳細取得
+    # GET /api/v1/async/todos/stats/: 優先度別統計
+    path('api/v1/async/todos/', include('todos.async_urls')),
+
     # CIでのhealth-checkエンドポイント
     path('api/v1/health/', health_check, name='health_check'),
 
+    # 計測値の確認（スタッフのみ）
+    path('api/v1/metrics/', metrics, name='metrics'),
+
     # mail送信　Webhookエンドポイント
     path('api/v1/webhooks/', include('users.urls')),
 ]
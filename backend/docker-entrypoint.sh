@@ -0,0 +1,17 @@
+#!/bin/sh
+# アウトボックスの送信ワーカー（dispatch_outbox --loop）をWebサーバーと同じコンテナで起動する
+# ウェルカムメールの送信・退会したユーザーのデータの削除はこのワーカーが行う
+# （Renderの無料プランはバックグラウンドワーカーを作れないため。別のサービスで動かす場合は RUN_OUTBOX_WORKER=0）
+set -e
+
+if [ "${RUN_OUTBOX_WORKER:-1}" = "1" ]; then
+  # 異常終了しても少し待って再起動する
+  (
+    while true; do
+      python manage.py dispatch_outbox --loop || echo "dispatch_outbox exited with $?, restarting" >&2
+      sleep 5
+    done
+  ) &
+fi
+
+exec "$@"
@@ -0,0 +1,92 @@
+"""
+完了したTodoのアーカイブ（ArchivedTodo）への移動
+
+進捗率100のまま一定期間更新されていないTodoを、同じシャードの ArchivedTodo へ
+バッチ単位で移す。移したTodoは通常の一覧・統計には含まれず、
+include_archived を指定した場合のみ読み取る。
+"""
+import logging
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from config.db.replicas import mark_written
+
+from .coalescing import get_progress_coalescer
+from .models import ArchivedTodo, Todo, TodoShardPlacement
+from .sharding import get_shard_directory
+
+logger = logging.getLogger(__name__)
+
+
+def archive_completed_todos(older_than_days, batch_size=500):
+    """
+    完了から older_than_days 日以上経ったTodoを全シャードでアーカイブする
+
+    Returns:
+        {shard: アーカイブした件数}
+    """
+    from .service import TodoService
+
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    coalescer = get_progress_coalescer()
+    if coalescer is not None:
+        # まとめ書き待ちの進捗率（100未満への変更）を反映してから対象を選ぶ
+        coalescer.flush_all()
+
+    directory = get_shard_directory()
+    # シャード移動中のユーザーは移動が終わるまで対象外
+    frozen = set()
+    if directory.sharded:
+        frozen = set(
+            TodoShardPlacement.objects.using(DEFAULT_DB_ALIAS)
+            .filter(frozen=True)
+            .values_list("user_id", flat=True)
+        )
+
+    results = {}
+    for shard in directory.shards:
+        archived = 0
+        while True:
+            user_ids, count = _archive_batch(shard, cutoff, batch_size, frozen)
+            if not count:
+                break
+            archived += count
+            for user_id in user_ids:
+                TodoService._invalidate_stats_cache(user_id)
+        results[shard] = archived
+        logger.info("Archived %d todos on %s", archived, shard)
+    return results
+
+
+def _archive_batch(shard, cutoff, batch_size, frozen):
+    """1バッチ分を1トランザクションでアーカイブへ移す"""
+    with transaction.atomic(using=shard):
+        todos = list(
+            Todo.objects.using(shard)
+            .select_for_update(skip_locked=True)
+            .filter(progress=100, updated_at__lt=cutoff)
+            .exclude(user_id__in=frozen)
+            .order_by("updated_at")[:batch_size]
+        )
+        if not todos:
+            return set(), 0
+        ArchivedTodo.objects.using(shard).bulk_create(
+            [
+                ArchivedTodo(
+                    id=todo.id,
+                    user_id=todo.user_id,
+                    todo_title=todo.todo_title,
+                    priority=todo.priority,
+                    created_at=todo.created_at,
+                    completed_at=todo.updated_at,
+                )
+                for todo in todos
+            ],
+            ignore_conflicts=True,
+        )
+        Todo.objects.using(shard).filter(id__in=[todo.id for todo in todos]).delete()
+        user_ids = {todo.user_id for todo in todos}
+        mark_written(*user_ids)
+    return user_ids, len(todos)
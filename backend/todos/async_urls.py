@@ -0,0 +1,8 @@
+from django.urls import path
+from .async_views import todo_detail, todo_list, todo_stats
+
+urlpatterns = [
+    path('', todo_list, name='async-todo-list'),
+    path('stats/', todo_stats, name='async-todo-stats'),
+    path('<int:pk>/', todo_detail, name='async-todo-detail'),
+]
@@ -0,0 +1,90 @@
+"""
+TodoViewSet の読み取り（一覧・詳細・優先度別統計）の非同期版
+
+DRFのビューは同期のため、ASGI（Uvicornワーカー）上ではリクエストごとに
+スレッドへ切り替えて実行され、DB・Redisの応答を待つ間スレッドを占有する。
+ここでは非同期ORMと redis.asyncio を使い、待ち時間をイベントループ上で過ごす。
+レスポンスの形式は TodoViewSet と同じ。
+"""
+
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.utils.encoders import JSONEncoder
+
+from users.authentication import CachedJWTCookieAuthentication
+
+from .serializers import TodoSerializer
+from .service import TodoService
+
+
+def _json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    # DRFと同じエンコーダで日時などを変換する
+    return JsonResponse(data, status=status_code, headers=headers, safe=False, encoder=JSONEncoder)
+
+
+def _error_response(exc, authenticator=None):
+    """DRFの例外ハンドラと同じ形式のエラーレスポンス"""
+    data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    headers = None
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED and authenticator is not None:
+        headers = {'WWW-Authenticate': authenticator.authenticate_header(None)}
+    return _json_response(data, status_code=exc.status_code, headers=headers)
+
+
+def async_api_view(view):
+    """
+    GETのみを受け付け、JWT（ヘッダーまたはCookie）で認証した非同期ビューにする
+
+    認証済みのユーザーを request.user に設定する（IsAuthenticated 相当）。
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return _json_response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
+                headers={'Allow': 'GET'},
+            )
+
+        authenticator = CachedJWTCookieAuthentication()
+        try:
+            result = await authenticator.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated()
+            request.user = result[0]
+            return await view(request, *args, **kwargs)
+        except Http404:
+            return _json_response(
+                {'detail': 'Not found.'}, status_code=status.HTTP_404_NOT_FOUND
+            )
+        except APIException as exc:
+            return _error_response(exc, authenticator)
+
+    return wrapper
+
+
+@async_api_view
+async def todo_list(request):
+    """一覧取得: GET /api/v1/async/todos/"""
+    todos = await TodoService.aget_user_todos(request.user)
+    pending_progress = await TodoService.aget_pending_progress(request.user)
+    serializer = TodoSerializer(todos, many=True, context={'pending_progress': pending_progress})
+    return _json_response(serializer.data)
+
+
+@async_api_view
+async def todo_detail(request, pk):
+    """詳細取得: GET /api/v1/async/todos/{id}/"""
+    todo = await TodoService.aget_todo(pk, request.user)
+    pending_progress = await TodoService.aget_pending_progress(request.user)
+    data = TodoSerializer(todo, context={'pending_progress': pending_progress}).data
+    return _json_response(data, headers={'ETag': f'"{data["version"]}"'})
+
+
+@async_api_view
+async def todo_stats(request):
+    """統計データの取得: GET /api/v1/async/todos/stats/"""
+    return _json_response(await TodoService.aget_priority_stats(request.user))
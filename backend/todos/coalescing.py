@@ -0,0 +1,364 @@
+import atexit
+import logging
+import threading
+import time
+import uuid
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from config.db.replicas import mark_written
+
+from .models import Todo
+from .sharding import get_shard_directory
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryProgressBuffer:
+    """
+    未反映の進捗率をプロセス内に保持するバッファ（テスト・単一プロセス用）
+
+    複数プロセス構成では他プロセスからの読み取りに未反映の値が見えないため、
+    RedisProgressBuffer を使うこと。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user_id -> {todo_id: progress}
+        self._pending = {}
+        # user_id -> 反映中の flush のトークン
+        self._claims = {}
+
+    def put(self, user_id, todo_id, progress):
+        with self._lock:
+            self._pending.setdefault(user_id, {})[todo_id] = progress
+
+    def pending_for_user(self, user_id):
+        with self._lock:
+            return dict(self._pending.get(user_id, {}))
+
+    def dirty_users(self, max_users=None):
+        """未反映の値があり、他の flush が反映中でないユーザーID"""
+        with self._lock:
+            return [uid for uid in self._pending if uid not in self._claims][:max_users]
+
+    def claim(self, user_ids, token):
+        """反映するユーザーを確保し、確保できたユーザーIDを返す（他の flush が反映中のものは除く）"""
+        with self._lock:
+            claimed = [uid for uid in user_ids if uid not in self._claims]
+            for uid in claimed:
+                self._claims[uid] = token
+            return claimed
+
+    def release(self, user_ids, token):
+        with self._lock:
+            for uid in user_ids:
+                if self._claims.get(uid) == token:
+                    del self._claims[uid]
+
+    def snapshot(self, user_ids=None):
+        """反映対象の (user_id, todo_id, progress) を取得（バッファからは削除しない）"""
+        with self._lock:
+            user_ids = list(self._pending) if user_ids is None else user_ids
+            return [
+                (uid, todo_id, progress)
+                for uid in user_ids
+                for todo_id, progress in self._pending.get(uid, {}).items()
+            ]
+
+    def ack(self, entries):
+        """DBへ反映済みのエントリを削除（反映中に新しい値が入ったものは残す）"""
+        with self._lock:
+            for user_id, todo_id, progress in entries:
+                pending = self._pending.get(user_id)
+                if pending is not None and pending.get(todo_id) == progress:
+                    del pending[todo_id]
+                    if not pending:
+                        del self._pending[user_id]
+
+
+class RedisProgressBuffer:
+    """
+    未反映の進捗率をRedisに保持するバッファ（本番用）
+
+    ユーザーごとのハッシュ（todo_id -> progress）と、未反映のユーザーIDの集合で
+    管理する。どのプロセスからでも読み取り・反映できる。
+    """
+
+    PENDING_KEY = "todo_progress:pending:{user_id}"
+    DIRTY_KEY = "todo_progress:dirty"
+    CLAIM_KEY = "todo_progress:claim:{user_id}"
+    # 反映中にプロセスが落ちた場合も、この時間が経てば他の flush が反映できる
+    CLAIM_TTL_MS = 60_000
+
+    # 値が変わっていないフィールドだけを削除し、空になったユーザーを集合から外す
+    ACK_SCRIPT = """
+    for i = 2, #ARGV, 2 do
+        if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+    end
+    if redis.call('HLEN', KEYS[1]) == 0 then
+        redis.call('SREM', KEYS[2], ARGV[1])
+    end
+    return 1
+    """
+
+    # 自分が確保したユーザーだけを解放する（期限切れ後に他の flush が確保したものは消さない）
+    RELEASE_SCRIPT = """
+    for i = 1, #KEYS do
+        if redis.call('GET', KEYS[i]) == ARGV[1] then
+            redis.call('DEL', KEYS[i])
+        end
+    end
+    return 1
+    """
+
+    def __init__(self, url=None):
+        import redis
+
+        url = url or settings.REDIS_URL
+        # UpstashはSSL必須。キャッシュ設定と同様に証明書検証を無効化する
+        kwargs = {"ssl_cert_reqs": None} if url.startswith("rediss://") else {}
+        self._client = redis.Redis.from_url(url, **kwargs)
+        self._ack = self._client.register_script(self.ACK_SCRIPT)
+        self._release = self._client.register_script(self.RELEASE_SCRIPT)
+
+    def put(self, user_id, todo_id, progress):
+        pipe = self._client.pipeline(transaction=True)
+        pipe.hset(self.PENDING_KEY.format(user_id=user_id), todo_id, progress)
+        pipe.sadd(self.DIRTY_KEY, user_id)
+        pipe.execute()
+
+    def pending_for_user(self, user_id):
+        pending = self._client.hgetall(self.PENDING_KEY.format(user_id=user_id))
+        return {int(todo_id): int(progress) for todo_id, progress in pending.items()}
+
+    def dirty_users(self, max_users=None):
+        return [int(uid) for uid in self._client.srandmember(self.DIRTY_KEY, max_users or 1000)]
+
+    def claim(self, user_ids, token):
+        pipe = self._client.pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.set(self.CLAIM_KEY.format(user_id=uid), token, nx=True, px=self.CLAIM_TTL_MS)
+        return [uid for uid, claimed in zip(user_ids, pipe.execute()) if claimed]
+
+    def release(self, user_ids, token):
+        if user_ids:
+            self._release(keys=[self.CLAIM_KEY.format(user_id=uid) for uid in user_ids], args=[token])
+
+    def snapshot(self, user_ids=None):
+        if user_ids is None:
+            user_ids = self.dirty_users()
+
+        pipe = self._client.pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.hgetall(self.PENDING_KEY.format(user_id=uid))
+        return [
+            (uid, int(todo_id), int(progress))
+            for uid, pending in zip(user_ids, pipe.execute())
+            for todo_id, progress in pending.items()
+        ]
+
+    def ack(self, entries):
+        by_user = {}
+        for user_id, todo_id, progress in entries:
+            by_user.setdefault(user_id, []).extend([todo_id, progress])
+        for user_id, fields in by_user.items():
+            self._ack(
+                keys=[self.PENDING_KEY.format(user_id=user_id), self.DIRTY_KEY],
+                args=[user_id, *fields],
+            )
+
+
+class ProgressWriteCoalescer:
+    """
+    進捗率のみの更新をまとめてDBへ反映する
+
+    スライダー操作のように同じTodoへ短時間に連続する更新は、最新値だけを
+    バッファに残して即座に応答し、一定間隔でまとめて1回の UPDATE で反映する。
+    バッファからの削除は反映後に行うため、反映中も読み取りには未反映の値が見える。
+    同じユーザーを複数の flush（定期反映・リクエスト中の反映・他プロセス）が同時に
+    反映しないよう、反映前にユーザー単位でバッファ上の確保（claim）を取る。
+    """
+
+    # flush(user_id) が他の flush の反映完了を待つ上限（秒）
+    CLAIM_WAIT_SECONDS = 5
+    CLAIM_POLL_SECONDS = 0.05
+
+    def __init__(self, buffer, interval, batch_size):
+        self.buffer = buffer
+        self.interval = interval
+        self.batch_size = batch_size
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def submit(self, user_id, todo_id, progress):
+        """進捗率の更新をバッファに積む"""
+        self.buffer.put(user_id, todo_id, progress)
+        self._ensure_flusher()
+
+    def pending_for_user(self, user_id):
+        """ユーザーの未反映の進捗率 {todo_id: progress}"""
+        return self.buffer.pending_for_user(user_id)
+
+    def flush(self, user_id=None):
+        """
+        バッファの内容をDBへ反映
+
+        Args:
+            user_id: 指定時はそのユーザー分のみ反映
+
+        Returns:
+            反映したエントリ数
+
+        シャード移動中（frozen）のユーザーの分はバッファに残し、移動後に反映する。
+        他の flush が反映中のユーザーは、user_id 指定時はその完了を待ち、未指定時は飛ばす。
+        """
+        token = uuid.uuid4().hex
+        if user_id is not None:
+            claimed = self._claim_waiting(user_id, token)
+        else:
+            claimed = self.buffer.claim(self.buffer.dirty_users(max_users=self.batch_size), token)
+        try:
+            return self._flush_claimed(claimed)
+        finally:
+            self.buffer.release(claimed, token)
+
+    def _claim_waiting(self, user_id, token):
+        """他の flush が反映中なら完了（確保の解放）を待ってから確保する"""
+        deadline = time.monotonic() + self.CLAIM_WAIT_SECONDS
+        while True:
+            claimed = self.buffer.claim([user_id], token)
+            if claimed:
+                return claimed
+            if time.monotonic() >= deadline:
+                logger.warning("Timed out waiting for another flush of user %s", user_id)
+                return []
+            time.sleep(self.CLAIM_POLL_SECONDS)
+
+    def _flush_claimed(self, user_ids):
+        """確保したユーザーの分を反映（確保後に読み直すため、他の flush が反映済みの値は含まない）"""
+        from .service import TodoService
+
+        if not user_ids:
+            return 0
+        directory = get_shard_directory()
+        by_shard = {}
+        for entry in self.buffer.snapshot(user_ids=user_ids):
+            placement = directory.placement(entry[0])
+            if not placement.frozen:
+                by_shard.setdefault(placement.shard, []).append(entry)
+
+        flushed = 0
+        for shard, entries in by_shard.items():
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start:start + self.batch_size]
+                self._write(shard, batch)
+                self.buffer.ack(batch)
+                user_ids = {entry[0] for entry in batch}
+                # バッファから消えた進捗率を、反映前のレプリカから読まないようにする
+                mark_written(*user_ids)
+                # 旧値が分からないため差分更新はできず、統計キャッシュは破棄する
+                for uid in user_ids:
+                    TodoService._invalidate_stats_cache(uid)
+                flushed += len(batch)
+        return flushed
+
+    @staticmethod
+    def _write(alias, entries):
+        """
+        1バッチ分（同じシャードのユーザーのみ）を1回の UPDATE で反映
+
+        バージョンはエントリ（Todo）ごとにちょうど1つ進める。まとめ書きの応答・読み取りは
+        この反映後のバージョンを返している（TodoService.update_todo・TodoSerializer）。
+        """
+        connection = connections[alias]
+        updated_at = timezone.now()
+
+        if connection.vendor == "postgresql":
+            table = connection.ops.quote_name(Todo._meta.db_table)
+            values = ", ".join(["(%s, %s, %s)"] * len(entries))
+            params = [updated_at]
+            for user_id, todo_id, progress in entries:
+                params.extend([todo_id, user_id, progress])
+            sql = (
+                f"UPDATE {table} AS t "
+                "SET progress = v.progress, version = t.version + 1, updated_at = %s "
+                f"FROM (VALUES {values}) AS v(id, user_id, progress) "
+                "WHERE t.id = v.id AND t.user_id = v.user_id AND t.deleted_at IS NULL"
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+            return
+
+        # VALUES リストでの UPDATE ... FROM に対応しないDB（SQLite等）は CASE 式で1文にする
+        Todo.objects.using(alias).filter(
+            reduce(or_, (Q(id=todo_id, user_id=user_id) for user_id, todo_id, _ in entries))
+        ).update(
+            progress=Case(
+                *[When(id=todo_id, then=Value(progress)) for _, todo_id, progress in entries]
+            ),
+            version=F("version") + 1,
+            updated_at=updated_at,
+        )
+
+    def _ensure_flusher(self):
+        """初回の書き込み時に定期反映スレッドと終了時の反映を登録"""
+        if self._flusher is not None:
+            return
+        with self._flusher_lock:
+            if self._flusher is None:
+                # interval が None の場合は定期反映せず、読み取り時・コマンド・終了時のみ反映する
+                self._flusher = threading.Thread(
+                    target=self._run, name="todo-progress-flusher", daemon=True
+                )
+                if self.interval:
+                    self._flusher.start()
+                # プロセス終了時に未反映分を書き出す
+                atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered todo progress")
+            finally:
+                connections.close_all()
+
+    def flush_all(self):
+        """バッファが空になるまで反映を繰り返す"""
+        total = 0
+        while True:
+            flushed = self.flush()
+            if not flushed:
+                return total
+            total += flushed
+
+    def shutdown(self):
+        """定期反映を止め、残りを反映"""
+        self._stopped.set()
+        try:
+            self.flush_all()
+        except Exception:
+            logger.exception("Failed to flush buffered todo progress on shutdown")
+
+
+@lru_cache(maxsize=None)
+def get_progress_coalescer():
+    """settings.TODO_PROGRESS_BUFFER が未設定なら None（まとめ書きを行わない）"""
+    if not settings.TODO_PROGRESS_BUFFER:
+        return None
+    return ProgressWriteCoalescer(
+        buffer=import_string(settings.TODO_PROGRESS_BUFFER)(),
+        interval=settings.TODO_PROGRESS_FLUSH_INTERVAL,
+        batch_size=settings.TODO_PROGRESS_FLUSH_BATCH_SIZE,
+    )
@@ -0,0 +1,306 @@
+"""
+Todo・アーカイブの列の縮小（priority: varchar(10) → smallint、progress: integer → smallint）
+
+PostgreSQLの ALTER COLUMN ... TYPE はテーブル全体を書き換える間 ACCESS EXCLUSIVE ロックを
+取り続けるため、AlterColumnsOnline で次の手順でオンラインに変換する。
+1. 新しい型の列（<列名>__new）を追加し、書き込みのたびにトリガーで変換した値を写す
+2. 既存の行をIDの範囲ごとに埋め戻す（チャンクごとにコミット）
+3. NOT NULL のCHECK制約を NOT VALID で追加してから VALIDATE する（書き込みを止めない）
+4. 短い ACCESS EXCLUSIVE ロックの間に元の列を削除し、新しい列の名前を入れ替える
+5. 元の列を参照していた制約・インデックスを作り直す（NOT VALID + VALIDATE、CONCURRENTLY）
+その他のDBは値を変換してから通常の AlterField 等を実行する（SQLiteはテーブルの再作成）。
+
+元の列の領域は削除後も既存の行に残り、行が書き換えられるまで（更新・VACUUM FULL・
+pg_repack）回収されない。変換前後のサイズは table_sizes で確認する。
+"""
+import logging
+
+from django.db.migrations.operations.base import Operation
+from django.db.models import CheckConstraint, Q
+from django.db.models.constants import LOOKUP_SEP
+
+from config.db.online_schema import (
+    add_constraint_not_valid,
+    backfill,
+    create_index_concurrently,
+    run_with_lock_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+NEW_SUFFIX = "__new"
+SYNC_FUNCTION_SUFFIX = "_compact_sync"
+
+
+def new_column(column):
+    return f"{column}{NEW_SUFFIX}"
+
+
+def _sync_function(table):
+    return f"{table}{SYNC_FUNCTION_SUFFIX}"
+
+
+def _not_null_constraint(table, column):
+    return f"{table}_{column}_not_null"
+
+
+def add_columns_sql(connection, table, columns):
+    """新しい型の列を追加するSQL（既定値なしの NULL 可の列のため、テーブルは書き換えない）"""
+    qn = connection.ops.quote_name
+    additions = ", ".join(
+        f"ADD COLUMN IF NOT EXISTS {qn(new_column(column))} {db_type}"
+        for column, db_type, _ in columns
+    )
+    return [f"ALTER TABLE {qn(table)} {additions}"]
+
+
+def sync_trigger_sql(connection, table, columns):
+    """変換中の書き込みで新しい列にも変換した値を入れるトリガー"""
+    qn = connection.ops.quote_name
+    function = qn(_sync_function(table))
+    assignments = "\n".join(
+        f"            NEW.{qn(new_column(column))} := {using.format(column=f'NEW.{qn(column)}')};"
+        for column, _, using in columns
+    )
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+{assignments}
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"DROP TRIGGER IF EXISTS {function} ON {qn(table)}",
+        f"CREATE TRIGGER {function} BEFORE INSERT OR UPDATE ON {qn(table)} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function}()",
+    ]
+
+
+def backfill_sql(connection, columns):
+    """未変換の行の新しい列を埋める UPDATE の SET 句と条件"""
+    qn = connection.ops.quote_name
+    assignments = ", ".join(
+        f"{qn(new_column(column))} = {using.format(column=qn(column))}"
+        for column, _, using in columns
+    )
+    pending = " OR ".join(f"{qn(new_column(column))} IS NULL" for column, _, _ in columns)
+    return assignments, pending
+
+
+def swap_sql(connection, table, columns):
+    """元の列を削除して新しい列の名前を入れ替えるSQL（1トランザクションで実行する）"""
+    qn = connection.ops.quote_name
+    function = qn(_sync_function(table))
+    statements = [
+        f"LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE",
+        f"DROP TRIGGER {function} ON {qn(table)}",
+        f"DROP FUNCTION {function}()",
+    ]
+    for column, _, _ in columns:
+        statements += [
+            f"ALTER TABLE {qn(table)} DROP COLUMN {qn(column)}",
+            f"ALTER TABLE {qn(table)} RENAME COLUMN {qn(new_column(column))} TO {qn(column)}",
+            # 検証済みの NOT NULL のCHECK制約があればテーブルを走査しない（PostgreSQL 12以降）
+            f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(column)} SET NOT NULL",
+            f"ALTER TABLE {qn(table)} DROP CONSTRAINT IF EXISTS {qn(_not_null_constraint(table, column))}",
+        ]
+    return statements
+
+
+def table_sizes(connection, table):
+    """
+    テーブル・インデックスのサイズ（バイト。パーティションテーブルはパーティションの合計）
+
+    PostgreSQL以外は None。
+    """
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(pg_table_size(relid)), 0), COALESCE(SUM(pg_indexes_size(relid)), 0) "
+            "FROM pg_partition_tree(%s::regclass)",
+            [table],
+        )
+        table_size, index_size = cursor.fetchone()
+    return {"table": int(table_size), "indexes": int(index_size)}
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _column_exists(connection, table, column):
+    with connection.cursor() as cursor:
+        return column in [
+            info.name for info in connection.introspection.get_table_description(cursor, table)
+        ]
+
+
+def _column_type(connection, table, column):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = %s AND NOT attisdropped",
+            [table, column],
+        )
+        return cursor.fetchone()[0]
+
+
+def _q_fields(q):
+    for child in q.children:
+        if isinstance(child, Q):
+            yield from _q_fields(child)
+        else:
+            yield child[0].split(LOOKUP_SEP)[0]
+
+
+def _references(model, obj, columns):
+    """Meta の制約・インデックスが columns のいずれかの列を参照するか"""
+    names = set()
+    if isinstance(obj, CheckConstraint):
+        names.update(_q_fields(obj.check))
+    else:
+        names.update(field.lstrip("-") for field in getattr(obj, "fields", ()))
+        if getattr(obj, "condition", None) is not None:
+            names.update(_q_fields(obj.condition))
+    return any(model._meta.get_field(name).column in columns for name in names)
+
+
+def convert_online(schema_editor, model, columns, chunk_size=5000, log=logger.info):
+    """
+    model のテーブルの列 columns [(列名, 新しい型, 変換式)] をオンラインで変換する（PostgreSQLのみ）
+
+    model は変換後の状態のモデル（作り直す制約・インデックスを Meta から取る）。
+    各ステップは個別にコミットするため、途中で中断した場合は再実行すればよい。
+    ロックを取る各ステップは lock_timeout 付きで実行し、取れなければ再試行する。
+    """
+    connection = schema_editor.connection
+    table = model._meta.db_table
+    before = table_sizes(connection, table)
+
+    # 入れ替え済み（中断後の再実行）なら制約・インデックスの作り直しだけを行う
+    swapped = all(
+        not _column_exists(connection, table, new_column(column))
+        and _column_type(connection, table, column) == db_type
+        for column, db_type, _ in columns
+    )
+    if not swapped:
+        # トリガーを先に作るため、これ以降に書き込まれた行は埋め戻しを待たずに変換される
+        run_with_lock_timeout(connection, lambda: _execute(connection, [
+            *add_columns_sql(connection, table, columns),
+            *sync_trigger_sql(connection, table, columns),
+        ]))
+        assignments, pending = backfill_sql(connection, columns)
+        filled = backfill(connection, table, assignments, where=pending, chunk_size=chunk_size, log=log)
+
+        qn = connection.ops.quote_name
+        for column, _, _ in columns:
+            add_constraint_not_valid(
+                schema_editor, table, _not_null_constraint(table, column),
+                f"CHECK ({qn(new_column(column))} IS NOT NULL)",
+            )
+        run_with_lock_timeout(connection, lambda: _execute(connection, swap_sql(connection, table, columns)))
+        log(f"{table}: swapped {', '.join(column for column, _, _ in columns)} ({filled} rows converted)")
+
+    converted = {column for column, _, _ in columns}
+    for constraint in model._meta.constraints:
+        if _references(model, constraint, converted):
+            add_constraint_not_valid(
+                schema_editor, table, constraint.name,
+                f"CHECK ({constraint._get_check_sql(model, schema_editor)})",
+            )
+    for index in model._meta.indexes:
+        # 元の列とともに削除されたインデックス
+        if _references(model, index, converted):
+            create_index_concurrently(schema_editor, model, index)
+
+    after = table_sizes(connection, table)
+    log(f"{table}: table {before['table']} -> {after['table']} bytes, "
+        f"indexes {before['indexes']} -> {after['indexes']} bytes")
+
+
+class AlterColumnsOnline(Operation):
+    """
+    列の型の変更（AlterField・AddConstraint 等）をPostgreSQLではオンラインで行うマイグレーション操作
+
+    Args:
+        model_name: 対象のモデル
+        operations: 状態に適用する操作（PostgreSQL以外のDBではそのまま実行する）
+        using: {列名: 元の値から新しい値への変換式（{column} に元の列）}
+        reverse_using: {列名: 戻す際に新しい値から元の値への変換式}
+        chunk_size: 埋め戻しの1トランザクションの行数
+    """
+
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, model_name, operations, using, reverse_using=None, chunk_size=5000):
+        self.model_name = model_name
+        self.operations = operations
+        self.using = using
+        self.reverse_using = reverse_using or {}
+        self.chunk_size = chunk_size
+
+    def deconstruct(self):
+        kwargs = {
+            "model_name": self.model_name,
+            "operations": self.operations,
+            "using": self.using,
+        }
+        if self.reverse_using:
+            kwargs["reverse_using"] = self.reverse_using
+        if self.chunk_size != 5000:
+            kwargs["chunk_size"] = self.chunk_size
+        return self.__class__.__qualname__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        for operation in self.operations:
+            operation.state_forwards(app_label, state)
+
+    def _states(self, app_label, state):
+        states = [state]
+        for operation in self.operations:
+            state = state.clone()
+            operation.state_forwards(app_label, state)
+            states.append(state)
+        return states
+
+    def _update(self, schema_editor, model, using):
+        qn = schema_editor.connection.ops.quote_name
+        if using:
+            assignments = ", ".join(
+                f"{qn(column)} = {sql.format(column=qn(column))}" for column, sql in using.items()
+            )
+            schema_editor.execute(f"UPDATE {qn(model._meta.db_table)} SET {assignments}")
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            model = to_state.apps.get_model(app_label, self.model_name)
+            columns = [
+                (column, model._meta.get_field(column).db_type(schema_editor.connection), using)
+                for column, using in self.using.items()
+            ]
+            convert_online(schema_editor, model, columns, chunk_size=self.chunk_size)
+            return
+        # 変換後の値を元の型の列に入れてから型を変える（範囲外の値で制約の追加が失敗しないように）
+        self._update(schema_editor, from_state.apps.get_model(app_label, self.model_name), self.using)
+        states = self._states(app_label, from_state)
+        for operation, before, after in zip(self.operations, states, states[1:]):
+            operation.database_forwards(app_label, schema_editor, before, after)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        # 元に戻す場合はどのDBでも通常の ALTER で行う
+        states = self._states(app_label, to_state)
+        for operation, before, after in reversed(list(zip(self.operations, states, states[1:]))):
+            operation.database_backwards(app_label, schema_editor, after, before)
+        self._update(schema_editor, to_state.apps.get_model(app_label, self.model_name), self.reverse_using)
+
+    def describe(self):
+        return f"Alter columns {', '.join(self.using)} on {self.model_name} online"
+
+    @property
+    def migration_name_fragment(self):
+        return f"alter_{self.model_name.lower()}_{'_'.join(self.using)}_online"
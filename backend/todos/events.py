@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryEventChannel:
+    """
+    プロセス内でTodo変更イベントを配信するチャネル（テスト・単一プロセス用）
+
+    購読者ごとに asyncio.Queue を持ち、publish はどのスレッドからでも
+    呼び出せるよう call_soon_threadsafe でイベントループへ受け渡す。
+    接続1本あたりのコストはキュー1つだけなので、スレッドを消費しない。
+    """
+
+    # 読み出しが追いつかない購読者のためのバッファ上限
+    QUEUE_MAXSIZE = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user_id -> {(loop, queue), ...}
+        self._subscribers = {}
+
+    def publish(self, user_id, event):
+        """イベントを配信（同期コードから呼び出し可能）"""
+        self._dispatch(user_id, event)
+
+    def _dispatch(self, user_id, event):
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, ()))
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # ループが既に閉じている（切断済みの購読者）
+                pass
+
+    @staticmethod
+    def _offer(queue, event):
+        """キューが溢れた場合は最も古いイベントを捨てる"""
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    async def subscribe(self, user_id):
+        """指定ユーザーのイベントを非同期に受け取るイテレータ"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.QUEUE_MAXSIZE)
+        entry = (loop, queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(entry)
+        await self._on_subscribe()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(user_id)
+                if subscribers is not None:
+                    subscribers.discard(entry)
+                    if not subscribers:
+                        del self._subscribers[user_id]
+
+    async def _on_subscribe(self):
+        """購読開始時のフック（サブクラスで利用）"""
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._subscribers.values())
+
+
+class RedisEventChannel(InMemoryEventChannel):
+    """
+    Redis Pub/Sub を使ってプロセス間でイベントを配信するチャネル（本番用）
+
+    接続ごとにRedisを購読するとSSE接続数だけRedis接続が必要になるため、
+    プロセスごとに1本だけパターン購読し、受信したイベントを
+    InMemoryEventChannel の仕組みでローカルの購読者へ配る。
+    """
+
+    CHANNEL_PREFIX = "todo_events:"
+
+    def __init__(self, url=None):
+        super().__init__()
+        self._url = url or settings.REDIS_URL
+        self._client = None
+        self._listener = None
+
+    def _connection_kwargs(self):
+        # UpstashはSSL必須。キャッシュ設定と同様に証明書検証を無効化する
+        if self._url and self._url.startswith("rediss://"):
+            return {"ssl_cert_reqs": None}
+        return {}
+
+    def publish(self, user_id, event):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self._url, **self._connection_kwargs())
+        self._client.publish(f"{self.CHANNEL_PREFIX}{user_id}", json.dumps(event))
+
+    async def _on_subscribe(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        """プロセス共有の購読ループ（切断時は再接続）"""
+        import redis.asyncio as aioredis
+
+        while True:
+            try:
+                client = aioredis.Redis.from_url(self._url, **self._connection_kwargs())
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        channel = message["channel"].decode()
+                        user_id = int(channel[len(self.CHANNEL_PREFIX):])
+                        self._dispatch(user_id, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Todo event listener disconnected; reconnecting")
+                await asyncio.sleep(1)
+
+
+@lru_cache(maxsize=None)
+def get_event_channel():
+    """settings.TODO_EVENTS_CHANNEL で指定されたチャネルを返す（プロセス内で共有）"""
+    return import_string(settings.TODO_EVENTS_CHANNEL)()
+
+
+def todo_event_payload(todo):
+    """
+    イベントに載せるTodoの表現（TodoSerializerと同じ形式）
+
+    購読者は常に所有者本人のため user（email）は省き、関連の追加読み込みを避ける。
+    """
+    from .serializers import TodoSerializer
+
+    fields = TodoSerializer(todo).fields
+    return {
+        name: field.to_representation(getattr(todo, name))
+        for name, field in fields.items()
+        if name != "user" and not field.write_only
+    }
+
+
+def publish_todo_event(user_id, event_type, todo_id, data=None):
+    """
+    Todo変更イベントをコミット後に配信
+
+    ロールバックされた変更を配信しないよう transaction.on_commit を使う。
+    配信の失敗でAPIの書き込みを失敗させないよう、例外はログに留める。
+    """
+    event = {"type": event_type, "id": todo_id, "todo": data}
+
+    def _publish():
+        try:
+            get_event_channel().publish(user_id, event)
+        except Exception:
+            logger.exception("Failed to publish todo event")
+
+    transaction.on_commit(_publish)
@@ -0,0 +1,16 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    """If-Match で指定したバージョンが現在のバージョンと一致しない（更新の競合）"""
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "このタスクは他の操作で更新されています。最新の内容を取得してから再度お試しください。"
+    default_code = "precondition_failed"
+
+
+class TodoShardMoving(APIException):
+    """ユーザーのTodoを別のシャードへ移動している最中のため、一時的に書き込めない"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "タスクのデータを移行中です。しばらくしてから再度お試しください。"
+    default_code = "todo_shard_moving"
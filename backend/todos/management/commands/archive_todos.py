@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todos.archive import archive_completed_todos
+
+
+class Command(BaseCommand):
+    help = "完了（進捗率100）から一定期間が過ぎたTodoをアーカイブへ移動します（定期実行用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.TODO_ARCHIVE_AFTER_DAYS,
+            help="完了からこの日数が過ぎたTodoを対象にする",
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.TODO_ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        results = archive_completed_todos(options["days"], batch_size=options["batch_size"])
+        for shard, count in results.items():
+            self.stdout.write(f"{shard}: {count} todos archived")
+        self.stdout.write(self.style.SUCCESS(f"{sum(results.values())} todos archived."))
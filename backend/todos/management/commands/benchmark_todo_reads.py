@@ -0,0 +1,85 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from todos.service import TodoService
+
+
+class Command(BaseCommand):
+    help = (
+        "起動済みのサーバーに対して、Todoの読み取り（一覧・詳細・統計）の同期版（DRF）と"
+        "非同期版（/api/v1/async/todos/）の リクエスト/秒 と p99 を同じ並列数で計測します。"
+        "例: gunicorn config.asgi:application -w 4 -k uvicorn.workers.UvicornWorker で起動し、"
+        "同じワーカー数で両方を計測する（--sync-url に gunicorn config.wsgi の同期ワーカーも指定可）。"
+    )
+
+    ENDPOINTS = (
+        ("list", "{prefix}/"),
+        ("detail", "{prefix}/{todo_id}/"),
+        ("stats", "{prefix}/stats/"),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--email", required=True, help="計測に使うユーザー（アクセストークンをこの場で発行）")
+        parser.add_argument("--sync-url", default="http://localhost:8000")
+        parser.add_argument("--async-url", default=None, help="省略時は --sync-url と同じサーバー")
+        parser.add_argument("--requests", type=int, default=2000, help="エンドポイントごとのリクエスト数")
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist")
+        todo = TodoService.get_user_todos(user).first()
+        if todo is None:
+            raise CommandError("The user has no todos; create some first (e.g. seed_db)")
+
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        stacks = (
+            ("sync", f"{options['sync_url']}/api/v1/todos"),
+            ("async", f"{options['async_url'] or options['sync_url']}/api/v1/async/todos"),
+        )
+
+        self.stdout.write(f"{'endpoint':<8} {'stack':<6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, path in self.ENDPOINTS:
+            for stack, prefix in stacks:
+                url = path.format(prefix=prefix, todo_id=todo.id)
+                result = self._run(url, headers, options["requests"], options["concurrency"])
+                self.stdout.write(
+                    f"{name:<8} {stack:<6} {result['rps']:>9.1f} {result['p50']:>8.1f} "
+                    f"{result['p99']:>8.1f} {result['errors']:>7}"
+                )
+
+    def _run(self, url, headers, count, concurrency):
+        local = threading.local()
+
+        def fetch(_):
+            # スレッドごとにセッションを持ち、接続確立の時間を計測に含めない
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            start = time.perf_counter()
+            response = session.get(url, headers=headers, timeout=30)
+            return time.perf_counter() - start, response.status_code == 200
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # ウォームアップ（接続・サーバー側のキャッシュ）
+            list(pool.map(fetch, range(concurrency)))
+            start = time.perf_counter()
+            results = list(pool.map(fetch, range(count)))
+            elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency * 1000 for latency, _ in results)
+        return {
+            "rps": count / elapsed,
+            "p50": statistics.median(latencies),
+            "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            "errors": sum(1 for _, ok in results if not ok),
+        }
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from todos.coalescing import get_progress_coalescer
+
+
+class Command(BaseCommand):
+    help = "まとめ書き待ちの進捗率をすべてDBへ反映します（デプロイ前・障害復旧時用）"
+
+    def handle(self, *args, **options):
+        coalescer = get_progress_coalescer()
+        if coalescer is None:
+            self.stdout.write("TODO_PROGRESS_BUFFER が未設定のため、反映するものはありません。")
+            return
+
+        flushed = coalescer.flush_all()
+        self.stdout.write(self.style.SUCCESS(f"{flushed} 件の進捗率を反映しました。"))
@@ -0,0 +1,138 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from todos.models import ArchivedTodo, Todo
+from todos.partitioning import partition_key_fields
+from todos.service import TodoService
+from todos.sharding import SHARDED_MODELS, get_shard_directory
+
+
+class Command(BaseCommand):
+    help = (
+        "ユーザーのTodoを別のシャードへオンラインで移動します。"
+        "コピーと差分の追いつきの間も読み書きでき、書き込みを止めるのは最後の同期の間だけです。"
+        "途中で中断した場合は同じ引数で再実行すると続きから再開します。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, required=True)
+        parser.add_argument("--to", required=True, help="移動先のシャード（DBエイリアス）")
+        parser.add_argument("--chunk-size", type=int, default=500, help="1回にコピー・削除する件数")
+        parser.add_argument(
+            "--grace", type=float, default=2.0,
+            help="書き込みを止めてから最後の同期までの待ち時間（秒）。処理中のリクエストの完了を待つ",
+        )
+        parser.add_argument("--max-rounds", type=int, default=5, help="書き込みを止める前の追いつきの最大回数")
+
+    def handle(self, *args, **options):
+        user_id, target = options["user_id"], options["to"]
+        directory = get_shard_directory()
+        if target not in directory.shards:
+            raise CommandError(f"Unknown shard {target!r} (TODO_SHARDS: {', '.join(directory.shards)})")
+
+        self.chunk_size = options["chunk_size"]
+        # 更新日時での差分検出は、アプリケーションサーバー間の時計のずれ分を遡って行う
+        self.margin = timedelta(seconds=max(options["grace"], 1.0))
+        source = directory.placement(user_id).shard
+
+        if source == target:
+            # 切り替え後に中断した場合は、移動元に残った行の削除だけを行う
+            for shard in directory.shards:
+                if shard != target:
+                    self._delete_all(shard, user_id)
+            directory.set_placement(user_id, target)
+            self.stdout.write(f"User {user_id} is already on {target}.")
+            return
+
+        self.stdout.write(f"Moving todos of user {user_id}: {source} -> {target}")
+
+        # 1. 書き込みを止めずに全件コピーし、コピー中の変更に追いつく
+        since = timezone.now()
+        copied = self._copy(target, Todo._base_manager.using(source).filter(user_id=user_id))
+        self.stdout.write(f"  copied {copied} todos")
+        for _ in range(options["max_rounds"]):
+            changed, since = self._sync(source, target, user_id, since)
+            if not changed:
+                break
+
+        # 2. 書き込みを止め、処理中のリクエストの完了を待ってから最後の同期を行う
+        TodoService.flush_pending_progress(user_id)
+        directory.set_placement(user_id, source, frozen=True)
+        try:
+            time.sleep(options["grace"])
+            self._sync(source, target, user_id, since)
+            # アーカイブは移動中のユーザーには書き込まれないため、ここで一度だけ写す
+            self._copy(target, ArchivedTodo._base_manager.using(source).filter(user_id=user_id))
+            # 3. 読み書き先を移動先へ切り替える
+            directory.set_placement(user_id, target)
+        except BaseException:
+            directory.set_placement(user_id, source)
+            raise
+
+        # 4. 移動元の行を削除する
+        deleted = self._delete_all(source, user_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {copied} todos of user {user_id} to {target} ({deleted} rows removed from {source})."
+        ))
+
+    def _sync(self, source, target, user_id, since):
+        """
+        since 以降に更新された行をコピーし、移動元で削除された行を移動先から削除する
+
+        論理削除したTodoも deleted_at を設定した行としてそのまま写す。
+        """
+        started = timezone.now()
+        changed = self._copy(
+            target,
+            Todo._base_manager.using(source).filter(user_id=user_id, updated_at__gte=since - self.margin),
+        )
+        source_ids = set(Todo._base_manager.using(source).filter(user_id=user_id).values_list("id", flat=True))
+        target_ids = set(Todo._base_manager.using(target).filter(user_id=user_id).values_list("id", flat=True))
+        removed = list(target_ids - source_ids)
+        for start in range(0, len(removed), self.chunk_size):
+            Todo._base_manager.using(target).filter(id__in=removed[start:start + self.chunk_size]).delete()
+        return changed + len(removed), started
+
+    def _copy(self, target, queryset):
+        """
+        queryset の行をID順にチャンク単位で移動先へ upsert する
+
+        raw=True で挿入し、作成日時・更新日時を自動設定で上書きせずそのまま写す。
+        """
+        model = queryset.model
+        fields = list(model._meta.concrete_fields)
+        update_fields = [field for field in fields if not field.primary_key]
+        unique_fields = [model._meta.pk]
+        if model is Todo:
+            unique_fields += map(model._meta.get_field, partition_key_fields())
+        copied, last_id = 0, 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id).order_by("id")[:self.chunk_size])
+            if not chunk:
+                return copied
+            with transaction.atomic(using=target):
+                model._base_manager._insert(
+                    chunk, fields=fields, using=target, raw=True,
+                    on_conflict=OnConflict.UPDATE,
+                    update_fields=update_fields,
+                    unique_fields=unique_fields,
+                )
+            copied += len(chunk)
+            last_id = chunk[-1].id
+
+    def _delete_all(self, shard, user_id):
+        """シャード上のユーザーのTodo・アーカイブをチャンク単位で削除する"""
+        deleted = 0
+        for model in SHARDED_MODELS:
+            queryset = model._base_manager.using(shard).filter(user_id=user_id)
+            while True:
+                ids = list(queryset.values_list("id", flat=True)[:self.chunk_size])
+                if not ids:
+                    break
+                deleted += model._base_manager.using(shard).filter(id__in=ids).delete()[0]
+        return deleted
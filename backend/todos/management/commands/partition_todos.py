@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from todos import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        "todos_todo をPostgreSQLのパーティションテーブルへオンラインで変換します"
+        "（通常はマイグレーション 0004 で変換。後から有効にする場合・中断からの再開用）。"
+        "--ensure で range 方式の先の月のパーティションを作成します（定期実行用）。"
+    )
+
+    def add_arguments(self, parser):
+        options = settings.TODO_PARTITIONING
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="対象のDB（シャードごとに実行する）")
+        parser.add_argument("--method", choices=sorted(partitioning.PARTITION_KEYS), default=options["method"])
+        parser.add_argument("--partitions", type=int, default=options["partitions"])
+        parser.add_argument("--chunk-size", type=int, default=options["chunk_size"])
+        parser.add_argument("--months-ahead", type=int, default=options["months_ahead"])
+        parser.add_argument("--ensure", action="store_true", help="range 方式の先の月のパーティションのみ作成")
+        parser.add_argument("--drop-old", action="store_true", help="変換前のテーブルを削除")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning is only supported on PostgreSQL")
+
+        if options["drop_old"]:
+            partitioning.drop_unpartitioned(connection)
+            self.stdout.write(f"Dropped {partitioning.OLD_TABLE}.")
+            return
+
+        if options["ensure"]:
+            if options["method"] != "range" or not partitioning.is_partitioned(connection):
+                raise CommandError(f"{partitioning.TABLE} is not partitioned by range")
+            partitioning.ensure_range_partitions(connection, options["months_ahead"])
+            self.stdout.write(f"Partitions exist up to {options['months_ahead']} months ahead.")
+            return
+
+        if not options["method"]:
+            raise CommandError("Specify --method (or TODO_PARTITION_METHOD)")
+        partitioning.convert_to_partitioned(
+            connection,
+            options["method"],
+            partitions=options["partitions"],
+            chunk_size=options["chunk_size"],
+            months_ahead=options["months_ahead"],
+            log=self.stdout.write,
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from todos.models import Todo, TodoShardPlacement
+from todos.sharding import fan_out
+
+
+class Command(BaseCommand):
+    help = (
+        "Todoを持つユーザーのうち配置が未記録のユーザーについて、現在Todoがあるシャードを記録します。"
+        "TODO_SHARDS にシャードを追加する前後に実行し、既存ユーザーのTodoが見えなくなるのを防ぎます。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users_by_shard = fan_out(
+            lambda shard: set(Todo._base_manager.using(shard).values_list("user_id", flat=True).distinct())
+        )
+        pinned = set(TodoShardPlacement.objects.using(DEFAULT_DB_ALIAS).values_list("user_id", flat=True))
+
+        created = 0
+        for shard, user_ids in users_by_shard.items():
+            placements = [
+                TodoShardPlacement(user_id=user_id, shard=shard)
+                for user_id in sorted(user_ids - pinned)
+            ]
+            TodoShardPlacement.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                placements, batch_size=options["batch_size"], ignore_conflicts=True
+            )
+            pinned |= user_ids
+            created += len(placements)
+        self.stdout.write(self.style.SUCCESS(f"Recorded the shard of {created} users."))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from todos.purge import purge_deleted_todos
+
+
+class Command(BaseCommand):
+    help = "削除（論理削除）から一定期間が過ぎたTodoを少しずつ物理削除します（定期実行用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.TODO_PURGE_AFTER_DAYS,
+            help="削除からこの日数が過ぎたTodoを対象にする",
+        )
+        parser.add_argument("--batch-size", type=int, default=settings.TODO_PURGE_BATCH_SIZE)
+        parser.add_argument(
+            "--interval", type=float, default=settings.TODO_PURGE_BATCH_INTERVAL,
+            help="バッチ間の待ち時間（秒）",
+        )
+        parser.add_argument("--max-batches", type=int, help="シャードごとの最大バッチ数（1回の実行で削除する量の上限）")
+
+    def handle(self, *args, **options):
+        results = purge_deleted_todos(
+            options["days"],
+            batch_size=options["batch_size"],
+            interval=options["interval"],
+            max_batches=options["max_batches"],
+        )
+        for shard, count in results.items():
+            self.stdout.write(f"{shard}: {count} todos purged")
+        self.stdout.write(self.style.SUCCESS(f"{sum(results.values())} todos purged."))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from todos.compact_schema import table_sizes
+from todos.models import ArchivedTodo, Todo
+from todos.sharding import count_todos_by_priority, count_todos_by_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "シャードごとのTodo件数・ユーザー数と、全シャード合計の優先度別件数を表示します"
+        "（PostgreSQLのシャードはテーブル・インデックスのサイズも表示します）"
+    )
+
+    def handle(self, *args, **options):
+        counts_by_shard = count_todos_by_shard()
+        self.stdout.write(f"{'shard':<16} {'todos':>10} {'users':>8}")
+        for shard, counts in counts_by_shard.items():
+            self.stdout.write(f"{shard:<16} {counts['todos']:>10} {counts['users']:>8}")
+
+        self.stdout.write("")
+        for priority, count in count_todos_by_priority().items():
+            self.stdout.write(f"{priority:<16} {count:>10}")
+
+        sizes = {
+            (shard, model._meta.db_table): table_sizes(connections[shard], model._meta.db_table)
+            for shard in counts_by_shard
+            for model in (Todo, ArchivedTodo)
+        }
+        sizes = {key: size for key, size in sizes.items() if size is not None}
+        if sizes:
+            self.stdout.write("")
+            self.stdout.write(f"{'shard':<16} {'table':<20} {'table bytes':>14} {'index bytes':>14}")
+            for (shard, table), size in sizes.items():
+                self.stdout.write(f"{shard:<16} {table:<20} {size['table']:>14} {size['indexes']:>14}")
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:00
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+import django.db.models.deletion
+
+
+class AlterFieldOnShards(migrations.AlterField):
+    """
+    default 以外のDB（シャード）でだけDBの変更を行う AlterField
+
+    ユーザーは default にだけ存在するため、シャードのTodoの外部キー制約は外す必要があるが、
+    default（シャーディングしない構成では唯一のDB）のTodoには制約を残す。
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != DEFAULT_DB_ALIAS:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.alias != DEFAULT_DB_ALIAS:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_outboxmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todos', '0002_todo_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TodoShardPlacement',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='todo_shard_placement', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('shard', models.CharField(max_length=64)),
+                ('frozen', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        AlterFieldOnShards(
+            model_name='todo',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='todos', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def partition_todo_table(apps, schema_editor):
+    """
+    settings.TODO_PARTITIONING["method"] が指定されていれば todos_todo をパーティションテーブルへ変換する
+
+    PostgreSQL以外・未指定の場合は何もしない（後から変換する場合は partition_todos コマンド）。
+    """
+    from todos.partitioning import convert_to_partitioned
+
+    options = settings.TODO_PARTITIONING
+    if schema_editor.connection.vendor != 'postgresql' or not options.get('method'):
+        return
+    convert_to_partitioned(
+        schema_editor.connection,
+        options['method'],
+        partitions=options['partitions'],
+        chunk_size=options['chunk_size'],
+        months_ahead=options['months_ahead'],
+    )
+
+
+class Migration(migrations.Migration):
+    # 行のコピーをチャンクごとにコミットするため、マイグレーション全体をトランザクションにしない
+    atomic = False
+
+    dependencies = [
+        ('todos', '0003_todo_sharding'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_todo_table, migrations.RunPython.noop, elidable=True),
+    ]
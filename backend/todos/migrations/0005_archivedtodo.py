@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+from config.db.online_schema import AddIndexOnline
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # CREATE / DROP INDEX CONCURRENTLY はトランザクション内で実行できない
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todos', '0004_todo_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTodo',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('todo_title', models.CharField(max_length=255)),
+                ('priority', models.CharField(choices=[('LOW', '低'), ('MEDIUM', '中'), ('HIGH', '高')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        AddIndexOnline(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('progress', 100)), fields=['updated_at'], name='todo_completed_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtodo',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_todos', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
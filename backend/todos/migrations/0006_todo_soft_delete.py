@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:14
+
+from django.db import migrations, models
+
+from config.db.online_schema import AddIndexOnline, RemoveIndexOnline
+
+
+class Migration(migrations.Migration):
+    # CREATE / DROP INDEX CONCURRENTLY はトランザクション内で実行できない
+    atomic = False
+
+    dependencies = [
+        ('todos', '0005_archivedtodo'),
+    ]
+
+    operations = [
+        RemoveIndexOnline(
+            model_name='todo',
+            name='todo_completed_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        AddIndexOnline(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', '-created_at'], name='todo_live_user_created_idx'),
+        ),
+        AddIndexOnline(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('progress', 100)), fields=['updated_at'], name='todo_completed_updated_idx'),
+        ),
+        AddIndexOnline(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='todo_deleted_at_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import todos.compact_schema
+import todos.models
+
+PRIORITY_TO_CODE = "CASE {column} WHEN 'LOW' THEN 1 WHEN 'MEDIUM' THEN 2 WHEN 'HIGH' THEN 3 END"
+CODE_TO_PRIORITY = "CASE {column} WHEN '1' THEN 'LOW' WHEN '2' THEN 'MEDIUM' WHEN '3' THEN 'HIGH' END"
+CLAMP_PROGRESS = "CASE WHEN {column} < 0 THEN 0 WHEN {column} > 100 THEN 100 ELSE {column} END"
+
+
+class Migration(migrations.Migration):
+    # PostgreSQLでは埋め戻しをチャンクごとにコミットするため、マイグレーション全体をトランザクションにしない
+    atomic = False
+
+    dependencies = [
+        ('todos', '0006_todo_soft_delete'),
+    ]
+
+    operations = [
+        todos.compact_schema.AlterColumnsOnline(
+            model_name='todo',
+            operations=[
+                migrations.AlterField(
+                    model_name='todo',
+                    name='priority',
+                    field=todos.models.PriorityField(choices=[('LOW', '低'), ('MEDIUM', '中'), ('HIGH', '高')], default='MEDIUM'),
+                ),
+                migrations.AlterField(
+                    model_name='todo',
+                    name='progress',
+                    field=models.PositiveSmallIntegerField(default=0),
+                ),
+                migrations.AddConstraint(
+                    model_name='todo',
+                    constraint=models.CheckConstraint(check=models.Q(('progress__gte', 0), ('progress__lte', 100)), name='todo_progress_range'),
+                ),
+            ],
+            using={'priority': PRIORITY_TO_CODE, 'progress': CLAMP_PROGRESS},
+            reverse_using={'priority': CODE_TO_PRIORITY},
+        ),
+        todos.compact_schema.AlterColumnsOnline(
+            model_name='archivedtodo',
+            operations=[
+                migrations.AlterField(
+                    model_name='archivedtodo',
+                    name='priority',
+                    field=todos.models.PriorityField(choices=[('LOW', '低'), ('MEDIUM', '中'), ('HIGH', '高')]),
+                ),
+            ],
+            using={'priority': PRIORITY_TO_CODE},
+            reverse_using={'priority': CODE_TO_PRIORITY},
+        ),
+    ]
@@ -1,6 +1,49 @@
+from functools import cached_property
+
 from django.db import models
 from django.conf import settings
 
+
+class PriorityField(models.SmallIntegerField):
+    """
+    優先度（'LOW' / 'MEDIUM' / 'HIGH'）をDBには smallint の順位（1〜3）で保存するフィールド
+
+    Python・APIでは従来どおり文字列として扱う。DB上の並び替え・集計は順位の順になる。
+    """
+
+    CODES = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3}
+    NAMES = {code: name for name, code in CODES.items()}
+
+    @cached_property
+    def validators(self):
+        # 整数の範囲のバリデータは付けない（値は choices の文字列で検証する）
+        return list(self._validators)
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return self.NAMES[value]
+        return value
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return self.CODES[value]
+        except KeyError:
+            raise ValueError(f"Field '{self.name}' expected a priority but got {value!r}.")
+
+
+class TodoManager(models.Manager):
+    """削除済み（deleted_at 設定済み）のTodoを除くマネージャー"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Todo(models.Model):
     class Priority(models.TextChoices):
         LOW = 'LOW', '低'
@@ -10,22 +53,121 @@ class Todo(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='todos'
+        related_name='todos',
+        # ユーザー単位で別のDB（シャード）に置くことがあるため、シャードではDBの外部キー制約を張らない
+        # （default の制約はマイグレーション 0003 で残している）
+        db_constraint=False,
     )
     todo_title = models.CharField(max_length=255)
-    priority = models.CharField(
-        max_length=10,
+    priority = PriorityField(
         choices=Priority.choices,
         default=Priority.MEDIUM
     )
-    # 0-100の進捗率を想定
-    progress = models.IntegerField(default=0)
+    # 0-100の進捗率（範囲はDBの制約でも保証する）
+    progress = models.PositiveSmallIntegerField(default=0)
+    # 楽観的同時実行制御用のバージョン（更新のたびに+1、ETagとして公開）
+    version = models.IntegerField(default=1)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # 削除日時（論理削除。purge_deleted_todos コマンドで一定期間後に物理削除する）
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # 削除済みのTodoは含めない（含める場合は _base_manager）
+    objects = TodoManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(progress__gte=0, progress__lte=100),
+                name='todo_progress_range',
+            ),
+        ]
+        indexes = [
+            # ユーザーのTodo一覧（削除済みを除く）用
+            models.Index(
+                fields=['user', '-created_at'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='todo_live_user_created_idx',
+            ),
+            # アーカイブ対象（完了から一定期間が過ぎたTodo）の抽出用
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(progress=100, deleted_at__isnull=True),
+                name='todo_completed_updated_idx',
+            ),
+            # 物理削除の対象（削除から一定期間が過ぎたTodo）の抽出用
+            models.Index(
+                fields=['deleted_at'],
+                condition=models.Q(deleted_at__isnull=False),
+                name='todo_deleted_at_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.todo_title
+
+
+class ArchivedTodo(models.Model):
+    """
+    完了（進捗率100）から一定期間が過ぎたTodoのアーカイブ（archive_todos コマンドで移動）
+
+    Todoテーブルの一覧・集計の対象行を減らすため、読み取りに必要な列だけを持つ。
+    進捗率は常に100のため持たない。ユーザーのTodoと同じシャードに置く。
+    """
+
+    # 元のTodoのID
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_todos',
+        db_constraint=False,
+    )
+    todo_title = models.CharField(max_length=255)
+    priority = PriorityField(choices=Todo.Priority.choices)
+    created_at = models.DateTimeField()
+    # 最後に更新された日時（完了した日時）
+    completed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
-        return self.todo_title
\ No newline at end of file
+        return self.todo_title
+
+
+class TodoShardPlacement(models.Model):
+    """
+    ユーザーのTodoを置くシャードの指定（todos/sharding.py）
+
+    行がないユーザーはコンシステントハッシュで決まるシャードに置く。
+    シャード間の移動（move_todo_user）をしたユーザーはここに記録する。
+    常にプライマリ（default）に置く。
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='todo_shard_placement',
+    )
+    shard = models.CharField(max_length=64)
+    # 移動の最終段階の間は書き込みを止める（読み取りは移動元から行う）
+    frozen = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.shard}"
+
+
+class TodoIdSequence(models.Model):
+    """
+    シャードをまたいで一意なTodoのIDの払い出し状況（常にプライマリに置く1行のみ）
+
+    各プロセスは TODO_ID_BLOCK_SIZE 件ずつまとめて予約して払い出す。
+    """
+
+    next_value = models.BigIntegerField()
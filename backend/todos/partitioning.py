@@ -0,0 +1,315 @@
+"""
+Todoテーブル（todos_todo）のPostgreSQL宣言的パーティショニング
+
+settings.TODO_PARTITIONING["method"] で方式を選ぶ。
+- "hash": user_id のハッシュで分割。ユーザー単位の読み取りは1パーティションだけを見る
+- "range": created_at の月ごとに分割。古い月のパーティションごとに VACUUM・削除できる
+PostgreSQLでは主キーにパーティションキーを含める必要があるため、主キーは
+(id, パーティションキー) になる（IDの払い出しは従来どおりシーケンス）。
+
+既存テーブルの変換（convert_to_partitioned）はオンラインで行う。
+1. 同じ列のパーティションテーブルを作り、既存テーブルの変更をトリガーで写す
+2. 既存の行をIDの範囲ごとにコピーする（コピー中の行は FOR SHARE で変更を待たせる）
+3. 短い ACCESS EXCLUSIVE ロックの間にシーケンスを引き継ぎ、テーブル名を入れ替える
+モデルのインデックス（Todo.Meta.indexes）は一時的な名前でパーティションテーブルに作り、
+入れ替え時に既存テーブルのインデックスと名前を交換する。
+"""
+import logging
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Todo
+
+logger = logging.getLogger(__name__)
+
+TABLE = Todo._meta.db_table
+NEW_TABLE = f"{TABLE}_partitioned"
+OLD_TABLE = f"{TABLE}_unpartitioned"
+SYNC_FUNCTION = f"{TABLE}_partition_sync"
+
+PARTITION_KEYS = {"hash": "user_id", "range": "created_at"}
+
+
+def partition_method():
+    """設定されたパーティショニング方式（"hash" / "range" / None）"""
+    return settings.TODO_PARTITIONING.get("method")
+
+
+def partition_key_fields():
+    """主キーと合わせて行を一意に特定するパーティションキーのフィールド名"""
+    method = partition_method()
+    return [PARTITION_KEYS[method]] if method else []
+
+
+def row_filter(todo):
+    """
+    1行を更新・削除するときの条件（パーティションの絞り込みが効くようキーを含める）
+
+    user_id は認可のためにも常に含める。
+    """
+    conditions = {"id": todo.id, "user_id": todo.user_id}
+    for field in partition_key_fields():
+        conditions[field] = getattr(todo, field)
+    return conditions
+
+
+def _relkind(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+
+def _table_columns(connection):
+    """
+    既存テーブルの列名
+
+    マイグレーションの途中でも実行できるよう、モデルではなく実際のテーブルから取得する
+    （後のマイグレーションで追加する列はまだ存在しない）。
+    """
+    with connection.cursor() as cursor:
+        return [column.name for column in connection.introspection.get_table_description(cursor, TABLE)]
+
+
+def is_partitioned(connection, table=TABLE):
+    return _relkind(connection, table) == "p"
+
+
+def model_indexes(connection):
+    """
+    既存テーブルにあるモデルのインデックス（Todo.Meta.indexes）
+
+    マイグレーションの途中（todos.0004）では後のマイグレーションで追加するインデックスは
+    まだないため、実際のテーブルにあるものだけを対象にする。
+    """
+    with connection.cursor() as cursor:
+        existing = connection.introspection.get_constraints(cursor, TABLE)
+    return [index for index in Todo._meta.indexes if index.name in existing]
+
+
+def _new_index_name(name):
+    """変換中のパーティションテーブルでのインデックスの名前（入れ替え時に元の名前へ戻す）"""
+    return f"{name}_p"
+
+
+def _old_index_name(name):
+    """入れ替え後の変換前のテーブル（OLD_TABLE）でのインデックスの名前"""
+    return f"{name}_old"
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _last_month(months_ahead):
+    """今月から months_ahead か月先の月初"""
+    month = _month_start(date.today())
+    for _ in range(months_ahead):
+        month = _next_month(month)
+    return month
+
+
+def range_partition_name(month):
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def create_table_sql(connection, method, partitions, first_month=None, last_month=None):
+    """パーティションテーブル（NEW_TABLE）とパーティションを作るSQL"""
+    qn = connection.ops.quote_name
+    key = PARTITION_KEYS[method]
+    sequence = f"{NEW_TABLE}_id_seq"
+    statements = [
+        f"CREATE TABLE {qn(NEW_TABLE)} (LIKE {qn(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY {method.upper()} ({qn(key)})",
+        f"ALTER TABLE {qn(NEW_TABLE)} ADD PRIMARY KEY ({qn('id')}, {qn(key)})",
+        f"CREATE INDEX {qn(f'{NEW_TABLE}_user_id_idx')} ON {qn(NEW_TABLE)} ({qn('user_id')})",
+        # 既存テーブルのIDは IDENTITY 列のため引き継がれない。切り替え時に続きから払い出す
+        f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(NEW_TABLE)}.{qn('id')}",
+        f"ALTER TABLE {qn(NEW_TABLE)} ALTER COLUMN {qn('id')} SET DEFAULT nextval('{sequence}')",
+    ]
+    # モデルのインデックスを一時的な名前で作る（元の名前は既存テーブルが使っている）
+    schema_editor = connection.schema_editor()
+    for index in model_indexes(connection):
+        index = index.clone()
+        index.name = _new_index_name(index.name)
+        statement = index.create_sql(Todo, schema_editor)
+        statement.rename_table_references(TABLE, NEW_TABLE)
+        statements.append(str(statement))
+    if method == "hash":
+        statements += [
+            f"CREATE TABLE {qn(f'{TABLE}_p{i}')} PARTITION OF {qn(NEW_TABLE)} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+            for i in range(partitions)
+        ]
+    else:
+        statements += range_partitions_sql(connection, NEW_TABLE, first_month, last_month)
+        statements.append(f"CREATE TABLE {qn(f'{TABLE}_default')} PARTITION OF {qn(NEW_TABLE)} DEFAULT")
+    return statements
+
+
+def foreign_keys_sql(connection):
+    """
+    既存テーブルの外部キー制約をパーティションテーブル（NEW_TABLE）にも付けるSQL
+
+    LIKE ... INCLUDING CONSTRAINTS は外部キーを写さないため、pg_constraint から定義を写す
+    （user_id の制約は default にだけある。マイグレーション todos.0003）。空のテーブルに付けるため検証は一瞬で済む。
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        return [
+            f"ALTER TABLE {qn(NEW_TABLE)} ADD CONSTRAINT {qn(name)} {definition}"
+            for name, definition in cursor.fetchall()
+        ]
+
+
+def range_partitions_sql(connection, parent, first_month, last_month):
+    """first_month から last_month までの月ごとのパーティションを作るSQL（作成済みは飛ばす）"""
+    qn = connection.ops.quote_name
+    statements = []
+    month = _month_start(first_month)
+    while month <= last_month:
+        following = _next_month(month)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {qn(range_partition_name(month))} PARTITION OF {qn(parent)} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+        )
+        month = following
+    return statements
+
+
+def sync_trigger_sql(connection, method):
+    """変換中に既存テーブルの変更をパーティションテーブルへ写すトリガー"""
+    qn = connection.ops.quote_name
+    key = qn(PARTITION_KEYS[method])
+    columns = [qn(column) for column in _table_columns(connection)]
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"NEW.{column}" for column in columns)
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {qn(SYNC_FUNCTION)}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {qn(NEW_TABLE)} WHERE id = OLD.id AND {key} = OLD.{key};
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {qn(NEW_TABLE)} ({column_list}) VALUES ({new_values});
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"DROP TRIGGER IF EXISTS {qn(SYNC_FUNCTION)} ON {qn(TABLE)}",
+        f"CREATE TRIGGER {qn(SYNC_FUNCTION)} AFTER INSERT OR UPDATE OR DELETE ON {qn(TABLE)} "
+        f"FOR EACH ROW EXECUTE FUNCTION {qn(SYNC_FUNCTION)}()",
+    ]
+
+
+def copy_chunk_sql(connection):
+    """IDの範囲 (%s, %s] の行をコピーするSQL（トリガーで写した新しい行は上書きしない）"""
+    qn = connection.ops.quote_name
+    column_list = ", ".join(qn(column) for column in _table_columns(connection))
+    return (
+        f"INSERT INTO {qn(NEW_TABLE)} ({column_list}) "
+        f"SELECT {column_list} FROM {qn(TABLE)} WHERE id > %s AND id <= %s FOR SHARE "
+        "ON CONFLICT DO NOTHING"
+    )
+
+
+def swap_sql(connection):
+    """シーケンスを引き継いでテーブル名を入れ替えるSQL（1トランザクションで実行する）"""
+    qn = connection.ops.quote_name
+    return [
+        f"LOCK TABLE {qn(TABLE)} IN ACCESS EXCLUSIVE MODE",
+        f"SELECT setval('{NEW_TABLE}_id_seq', GREATEST("
+        f"(SELECT COALESCE(MAX(id), 0) FROM {qn(TABLE)}), "
+        f"pg_sequence_last_value(pg_get_serial_sequence('{TABLE}', 'id')::regclass), 1))",
+        f"DROP TRIGGER {qn(SYNC_FUNCTION)} ON {qn(TABLE)}",
+        f"DROP FUNCTION {qn(SYNC_FUNCTION)}()",
+        f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(OLD_TABLE)}",
+        f"ALTER TABLE {qn(NEW_TABLE)} RENAME TO {qn(TABLE)}",
+        # インデックスの名前を交換し、マイグレーションの状態と同じ名前をパーティションテーブルに付ける
+        *(
+            sql
+            for index in model_indexes(connection)
+            for sql in (
+                f"ALTER INDEX {qn(index.name)} RENAME TO {qn(_old_index_name(index.name))}",
+                f"ALTER INDEX {qn(_new_index_name(index.name))} RENAME TO {qn(index.name)}",
+            )
+        ),
+    ]
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def convert_to_partitioned(connection, method, partitions=16, chunk_size=5000, months_ahead=3, log=logger.info):
+    """
+    既存の todos_todo をパーティションテーブルへオンラインで変換する（PostgreSQLのみ）
+
+    各ステップは個別にコミットする。途中で中断した場合は再実行すればよい
+    （変換中の変更はトリガーで写っており、コピーは ON CONFLICT DO NOTHING のため重複しない）。
+    変換前のテーブルは OLD_TABLE の名前で残す（確認後に drop_unpartitioned で削除）。
+    """
+    if method not in PARTITION_KEYS:
+        raise ValueError(f"Unknown partitioning method: {method!r}")
+    if is_partitioned(connection):
+        log(f"{TABLE} is already partitioned")
+        if method == "range":
+            ensure_range_partitions(connection, months_ahead)
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(id), MIN(created_at) FROM {connection.ops.quote_name(TABLE)}")
+        min_id, first_created = cursor.fetchone()
+
+    with transaction.atomic(using=connection.alias):
+        if _relkind(connection, NEW_TABLE) is None:
+            _execute(connection, create_table_sql(
+                connection, method, partitions,
+                first_month=first_created.date() if first_created else date.today(),
+                last_month=_last_month(months_ahead),
+            ))
+            _execute(connection, foreign_keys_sql(connection))
+        # トリガーを先に作るため、これ以降に書き込まれた行はコピーを待たずに写る
+        _execute(connection, sync_trigger_sql(connection, method))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT MAX(id) FROM {connection.ops.quote_name(TABLE)}")
+            max_id = cursor.fetchone()[0]
+
+    copied, lower = 0, (min_id or 1) - 1
+    sql = copy_chunk_sql(connection)
+    while max_id is not None and lower < max_id:
+        upper = min(lower + chunk_size, max_id)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(sql, [lower, upper])
+            copied += cursor.rowcount
+        lower = upper
+        log(f"copied up to id {upper} / {max_id}")
+
+    with transaction.atomic(using=connection.alias):
+        _execute(connection, swap_sql(connection))
+    log(f"{TABLE} is now partitioned by {method} ({copied} rows copied, previous table kept as {OLD_TABLE})")
+
+
+def ensure_range_partitions(connection, months_ahead=3):
+    """月ごとのパーティションを months_ahead か月先まで作る（定期実行用）"""
+    _execute(connection, range_partitions_sql(connection, TABLE, date.today(), _last_month(months_ahead)))
+
+
+def drop_unpartitioned(connection):
+    """変換前のテーブルを削除する"""
+    _execute(connection, [f"DROP TABLE IF EXISTS {connection.ops.quote_name(OLD_TABLE)}"])
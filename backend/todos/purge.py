@@ -0,0 +1,48 @@
+"""
+論理削除したTodoの物理削除
+
+TodoService.delete_todo は deleted_at を設定するだけのため、削除から一定期間が過ぎた
+行をシャードごとに少しずつ削除する。1回の DELETE の件数を抑え、バッチの間に
+待ち時間を置くことで、デッドタプルの増加とレプリケーションの遅延を平準化する。
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Todo
+from .sharding import get_shard_directory
+
+logger = logging.getLogger(__name__)
+
+
+def purge_deleted_todos(older_than_days, batch_size=500, interval=0.0, max_batches=None):
+    """
+    削除から older_than_days 日以上経ったTodoを全シャードで物理削除する
+
+    Args:
+        older_than_days: 削除からの経過日数
+        batch_size: 1回の DELETE で削除する件数
+        interval: バッチ間の待ち時間（秒）
+        max_batches: シャードごとの最大バッチ数（None で対象がなくなるまで）
+
+    Returns:
+        {shard: 削除した件数}
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    results = {}
+    for shard in get_shard_directory().shards:
+        queryset = Todo._base_manager.using(shard).filter(deleted_at__lt=cutoff)
+        purged, batches = 0, 0
+        while max_batches is None or batches < max_batches:
+            ids = list(queryset.order_by("deleted_at").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            purged += Todo._base_manager.using(shard).filter(id__in=ids).delete()[0]
+            batches += 1
+            if interval and len(ids) == batch_size:
+                time.sleep(interval)
+        results[shard] = purged
+        logger.info("Purged %d deleted todos on %s", purged, shard)
+    return results
@@ -1,15 +1,33 @@
 from rest_framework import serializers
-from .models import Todo
+from .models import ArchivedTodo, Todo
 
 
 class TodoSerializer(serializers.ModelSerializer):
     # フロントからは送らせず、API側でログインユーザーを紐付けるため read_only
     user = serializers.ReadOnlyField(source='user.email')
+    # 進捗率の増減（サーバー側で原子的に加算し、0〜100に丸める）
+    progress_delta = serializers.IntegerField(
+        write_only=True, required=False, min_value=-100, max_value=100
+    )
 
     class Meta:
         model = Todo
-        fields = ['id', 'user', 'todo_title', 'priority', 'progress', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        fields = [
+            'id', 'user', 'todo_title', 'priority', 'progress', 'progress_delta',
+            'version', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'user', 'version', 'created_at', 'updated_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # まとめ書き待ちの進捗率があれば、DBの値ではなくそちらを返す
+        # バージョンも反映後の値（反映はバッファのエントリごとに1つ進める）にし、
+        # この応答の ETag で If-Match を送っても反映後に 412 にならないようにする
+        pending_progress = self.context.get('pending_progress')
+        if pending_progress and instance.id in pending_progress:
+            data['progress'] = pending_progress[instance.id]
+            data['version'] = instance.version + 1
+        return data
 
     def validate_todo_title(self, value):
         """空白のみのタイトルを弾く（トリミングも実施）"""
@@ -24,5 +42,46 @@ class TodoSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("進捗率は0から100の範囲で指定してください。")
         return value
     
+    def validate(self, attrs):
+        """progress_delta は単独の更新操作としてのみ受け付ける"""
+        if 'progress_delta' in attrs:
+            if self.instance is None:
+                raise serializers.ValidationError(
+                    {'progress_delta': "progress_delta は既存タスクの更新時のみ指定できます。"}
+                )
+            if len(attrs) > 1:
+                raise serializers.ValidationError(
+                    {'progress_delta': "progress_delta は他の項目と同時に指定できません。"}
+                )
+        return attrs
+
     # 注意: isinstance(value, int)チェックは不要
-    # DRFがIntegerFieldとして自動的に型変換・検証する
\ No newline at end of file
+    # DRFがIntegerFieldとして自動的に型変換・検証する
+
+
+class ArchivedTodoSerializer(serializers.ModelSerializer):
+    """
+    アーカイブ済みのタスク（読み取り専用。include_archived 指定時の一覧用）
+
+    TodoSerializer と同じ形で返し、archived で区別できるようにする。
+    アーカイブ済みのタスクは削除（DELETE）と、戻す操作（POST .../unarchive/）だけができる。
+    """
+    user = serializers.ReadOnlyField(source='user.email')
+    progress = serializers.SerializerMethodField()
+    updated_at = serializers.DateTimeField(source='completed_at', read_only=True)
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedTodo
+        fields = [
+            'id', 'user', 'todo_title', 'priority', 'progress',
+            'created_at', 'updated_at', 'archived_at', 'archived',
+        ]
+        read_only_fields = fields
+
+    def get_progress(self, instance):
+        # 完了したタスクのみをアーカイブするため常に100
+        return 100
+
+    def get_archived(self, instance):
+        return True
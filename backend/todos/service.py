@@ -1,7 +1,21 @@
-from .models import Todo
-from django.db.models import Count, Case, When
+from collections import Counter
+from asgiref.sync import sync_to_async
+from config.async_cache import get_async_cache
+from config.db.replicas import mark_written
+from .models import ArchivedTodo, Todo
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Case, When, F, Value
+from django.db.models.functions import Greatest, Least
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.core.cache import cache
+from django.utils import timezone
+from .exceptions import PreconditionFailed
+from .coalescing import get_progress_coalescer
+from .events import publish_todo_event, todo_event_payload
+from .partitioning import row_filter
+from .sharding import get_shard_directory, todo_queryset
 
 
 class TodoService:
@@ -15,15 +29,78 @@ class TodoService:
     # キャッシュの有効期限（秒）
     CACHE_TIMEOUT = 900
 
+    # 進捗率の集計区分（ラベル, 上限）。上限 None は残り全て
+    PROGRESS_RANGES = (
+        ("range_0_20", 20),
+        ("range_21_40", 40),
+        ("range_41_60", 60),
+        ("range_61_80", 80),
+        ("range_81_100", None),
+    )
+
     @staticmethod
     def _get_stats_cache_key(user_id, stats_type):
         """キャッシュキーの生成ロジックを一元管理"""
         return f"todo_stats:{user_id}:{stats_type}"
+
+    @staticmethod
+    def _get_stats_counter_key(user_id, stats_type, label):
+        """
+        統計の区分ごとのカウンタキー
+
+        区分ごとに別キーへ分けておくことで、書き込み時に incr で原子的に差分更新できる
+        """
+        return f"{TodoService._get_stats_cache_key(user_id, stats_type)}:{label}"
+
+    @staticmethod
+    def _progress_range_label(progress):
+        """進捗率が属する集計区分のラベル"""
+        for label, upper in TodoService.PROGRESS_RANGES:
+            if upper is None or progress <= upper:
+                return label
     
     @staticmethod
     def get_user_todos(user):
-        """ユーザー自身のタスクのみを取得（認可の担保）"""
-        return Todo.objects.filter(user=user)
+        """ユーザー自身のタスクのみを取得（認可の担保）。ユーザーのシャードから読む"""
+        shard = get_shard_directory().placement(user.id).shard
+        return todo_queryset(shard).filter(user=user)
+
+    @staticmethod
+    def get_archived_todos(user):
+        """ユーザーのアーカイブ済みのタスク（所有者の問い合わせを省くため user を設定済み）"""
+        shard = get_shard_directory().placement(user.id).shard
+        todos = list(todo_queryset(shard, ArchivedTodo).filter(user=user))
+        for todo in todos:
+            todo.user = user
+        return todos
+
+    @staticmethod
+    def _get_archived_priority_counts(user):
+        """アーカイブ済みのタスクの優先度別件数"""
+        shard = get_shard_directory().placement(user.id).shard
+        return dict(TodoService._priority_count_rows(
+            todo_queryset(shard, ArchivedTodo).filter(user=user)
+        ).values_list('priority', 'count'))
+
+    @staticmethod
+    def get_deleted_todos(user, since):
+        """
+        since 以降に削除したタスクの (id, deleted_at)（同期クライアントが削除を反映する用）
+
+        物理削除（purge_deleted_todos）までの TODO_PURGE_AFTER_DAYS 日の間だけ取得できる。
+        """
+        shard = get_shard_directory().placement(user.id).shard
+        return (
+            todo_queryset(shard, include_deleted=True)
+            .filter(user=user, deleted_at__gt=since)
+            .order_by('deleted_at')
+            .values('id', 'deleted_at')
+        )
+
+    @staticmethod
+    async def _aget_user_todos_queryset(user):
+        shard = (await get_shard_directory().aplacement(user.id)).shard
+        return todo_queryset(shard).filter(user=user)
 
     @staticmethod
     def create_todo(user, validated_data):
@@ -34,13 +111,19 @@ class TodoService:
             user: 作成者
             validated_data: Serializerで検証済みのデータ
         """
-        todo = Todo.objects.create(user=user, **validated_data)
-        # データが更新されたので統計キャッシュを削除
-        TodoService._invalidate_stats_cache(user.id)
+        directory = get_shard_directory()
+        shard = directory.writable_shard(user.id)
+        todo = Todo.objects.using(shard).create(id=directory.new_todo_id(), user=user, **validated_data)
+        # 直後の一覧・統計の読み取りをプライマリへ固定（read-your-writes）
+        mark_written(user.id)
+        # 統計キャッシュを差分更新
+        TodoService._apply_stats_delta(user.id, new=(todo.priority, todo.progress))
+        # 他のタブ・端末へ変更を通知
+        publish_todo_event(user.id, "todo.created", todo.id, todo_event_payload(todo))
         return todo
 
     @staticmethod
-    def update_todo(todo_id, user, validated_data):
+    def update_todo(todo_id, user, validated_data, expected_version=None, coalesce=False):
         """
         タスクの更新
         
@@ -48,19 +131,180 @@ class TodoService:
             todo_id: 更新対象のID
             user: リクエストユーザー（認可チェック用）
             validated_data: Serializerで検証済みのデータ
+            expected_version: If-Match で指定されたバージョン（None なら無条件に更新）
+            coalesce: 進捗率のみの更新をバッファしてまとめ書きしてよいか
+
+        Raises:
+            PreconditionFailed: expected_version が現在のバージョンと一致しない場合
         """
-        # 認可チェック: 存在確認 + 本人確認
-        todo = get_object_or_404(Todo, id=todo_id, user=user)
+        coalescer = get_progress_coalescer()
+        can_coalesce = (
+            coalesce
+            and coalescer is not None
+            and expected_version is None
+            and set(validated_data) == {'progress'}
+        )
+        if not can_coalesce:
+            # バッファ済みの古い進捗率が後からこの更新を上書きしないよう先に反映する
+            TodoService.flush_pending_progress(user.id)
+
+        # 認可チェック: 存在確認 + 本人確認（シャード移動中は503）
+        shard = get_shard_directory().writable_shard(user.id)
+        todo = get_object_or_404(todo_queryset(shard), id=todo_id, user=user)
+        old_values = (todo.priority, todo.progress)
+
+        if can_coalesce:
+            # 最新値だけをバッファに残して即座に応答し、DBへの反映は定期的にまとめて行う
+            todo.progress = validated_data['progress']
+            coalescer.submit(user.id, todo.id, todo.progress)
+            # 反映時にバージョンはちょうど1つ進む（同じTodoへの連続した更新はまとめて1回）。
+            # 反映後のバージョンを返し、この ETag での If-Match が反映後も一致するようにする
+            todo.version += 1
+            publish_todo_event(user.id, "todo.updated", todo.id, todo_event_payload(todo))
+            return todo
         
         # 更新
+        if expected_version is not None:
+            TodoService._conditional_update(todo, validated_data, expected_version)
+        else:
+            # 無条件の更新でもバージョンは原子的に進め、古いETagでの上書きを防ぐ。
+            # 進めたバージョンは同じトランザクション内で読む（UPDATE の行ロックをコミットまで持つため、
+            # 間に他の書き込みが入って、その書き込みのバージョンを ETag として返すことはない）
+            updated_at = timezone.now()
+            row = TodoService._row_queryset(todo)
+            with transaction.atomic(using=row.db):
+                updated = row.update(
+                    **validated_data,
+                    version=F('version') + 1,
+                    updated_at=updated_at,
+                )
+                if not updated:
+                    raise Http404
+                todo.version = row.values_list('version', flat=True).get()
+            for key, value in validated_data.items():
+                setattr(todo, key, value)
+            todo.updated_at = updated_at
+        mark_written(user.id)
+        # 統計キャッシュを差分更新
+        TodoService._apply_stats_delta(user.id, old=old_values, new=(todo.priority, todo.progress))
+        publish_todo_event(user.id, "todo.updated", todo.id, todo_event_payload(todo))
+        
+        return todo
+
+    @staticmethod
+    def _row_queryset(todo):
+        """
+        1行を更新・削除するためのクエリセット
+
+        主キーに加えてパーティションキー（todos/partitioning.py）を条件に含め、
+        パーティション分割時も対象のパーティションだけを見るようにする。
+        """
+        return Todo.objects.using(router.db_for_write(Todo, instance=todo)).filter(**row_filter(todo))
+
+    @staticmethod
+    def _conditional_update(todo, validated_data, expected_version):
+        """
+        バージョン一致を条件とした1回の UPDATE で更新（楽観的同時実行制御）
+
+        UPDATE ... WHERE id=? AND user_id=? AND version=? として発行するため
+        select_for_update の行ロックを取らず、競合時は更新件数0で検出する。
+        """
+        if todo.version != expected_version:
+            raise PreconditionFailed()
+
+        updated_at = timezone.now()
+        updated = TodoService._row_queryset(todo).filter(version=expected_version).update(
+            **validated_data,
+            version=F('version') + 1,
+            updated_at=updated_at,
+        )
+        if not updated:
+            # 取得から UPDATE までの間に他のリクエストが更新した
+            raise PreconditionFailed()
+
+        # 取得時点の値はバージョン一致で最新と保証されるため、再取得せずに反映する
         for key, value in validated_data.items():
             setattr(todo, key, value)
-        todo.save()
-        # データが更新されたので統計キャッシュを削除
-        TodoService._invalidate_stats_cache(user.id)
+        todo.version = expected_version + 1
+        todo.updated_at = updated_at
+
+    @staticmethod
+    def increment_progress(todo, delta):
+        """
+        進捗率を原子的に増減
         
+        Args:
+            todo: 対象のTodo（ViewSetで本人のタスクと確認済み）
+            delta: 増減量（負の値で減算）
+
+        UPDATE ... SET progress = LEAST(100, GREATEST(0, progress + delta)) ... RETURNING
+        の1文で実行する。事前の取得・事後の読み直しが不要で同時実行でも加算が失われず、
+        TodoSerializer.validate_progress と同じ 0〜100 の範囲をSQL側で保証する。
+        """
+        TodoService.flush_pending_progress(todo.user_id)
+
+        alias = get_shard_directory().writable_shard(todo.user_id)
+        updated_at = timezone.now()
+        row = TodoService._increment_returning(alias, todo, delta, updated_at)
+        if row is None:
+            raise Http404
+        mark_written(todo.user_id)
+
+        priority, progress, version = row
+        # 生のSQLの結果は変換されないため、DB上の優先度の順位を文字列に戻す
+        priority = Todo._meta.get_field('priority').to_python(priority)
+
+        # 丸めが起きていなければ旧値は一意に決まるため差分更新、それ以外は破棄
+        if 0 < progress < 100:
+            TodoService._apply_stats_delta(
+                todo.user_id, old=(priority, progress - delta), new=(priority, progress)
+            )
+        else:
+            TodoService._invalidate_stats_cache(todo.user_id)
+
+        todo.priority, todo.progress, todo.version = priority, progress, version
+        todo.updated_at = updated_at
+        publish_todo_event(todo.user_id, "todo.updated", todo.id, todo_event_payload(todo))
         return todo
 
+    @staticmethod
+    def _increment_returning(alias, todo, delta, updated_at):
+        """
+        進捗率を加算し、更新後の (priority, progress, version) を返す（対象がなければ None）
+
+        PostgreSQLは UPDATE ... RETURNING の1文（coalescing.py の _write と同じく生のSQL）。
+        それ以外のDBは update() の後に同じトランザクション内で読み直す
+        （UPDATE の行ロックをコミットまで持つため、他の書き込みの値は混ざらない）。
+        """
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            row = Todo.objects.using(alias).filter(**row_filter(todo))
+            with transaction.atomic(using=alias):
+                updated = row.update(
+                    progress=Least(Value(100), Greatest(Value(0), F('progress') + delta)),
+                    version=F('version') + 1,
+                    updated_at=updated_at,
+                )
+                if not updated:
+                    return None
+                return row.values_list('priority', 'progress', 'version').get()
+
+        qn = connection.ops.quote_name
+        columns = {field.attname: field.column for field in Todo._meta.concrete_fields}
+        conditions, params = ["deleted_at IS NULL"], [delta, updated_at]
+        for name, value in row_filter(todo).items():
+            conditions.append(f"{qn(columns[name])} = %s")
+            params.append(value)
+        sql = (
+            f"UPDATE {qn(Todo._meta.db_table)} "
+            "SET progress = LEAST(100, GREATEST(0, progress + %s)), version = version + 1, updated_at = %s "
+            f"WHERE {' AND '.join(conditions)} "
+            "RETURNING priority, progress, version"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
     @staticmethod
     def delete_todo(todo_id, user):
         """
@@ -69,48 +313,294 @@ class TodoService:
         Args:
             todo_id: 削除対象のID
             user: リクエストユーザー（認可チェック用）
+
+        TODO_SOFT_DELETE が有効な場合は deleted_at を設定するだけの1行の UPDATE とし、
+        行の物理削除は purge_deleted_todos コマンドでまとめて行う。
+        アーカイブ済みのタスク（include_archived の一覧に含まれるID）も削除できる。
         """
-        # 認可チェック: 存在確認 + 本人確認
-        todo = get_object_or_404(Todo, id=todo_id, user=user)
-        todo.delete()
-        # データが更新されたので統計キャッシュを削除
-        TodoService._invalidate_stats_cache(user.id)
-
-    @staticmethod
-    def get_progress_stats(user):
-        cache_key = TodoService._get_stats_cache_key(user.id, "progress")
-        stats = cache.get(cache_key)
-
-        if stats is None:
-            """進捗率の分布を集計（20%刻み）"""
-            stats = Todo.objects.filter(user=user).aggregate(
-                range_0_20=Count(Case(When(progress__lte=20, then=1))),
-                range_21_40=Count(Case(When(progress__gt=20, progress__lte=40, then=1))),
-                range_41_60=Count(Case(When(progress__gt=40, progress__lte=60, then=1))),
-                range_61_80=Count(Case(When(progress__gt=60, progress__lte=80, then=1))),
-                range_81_100=Count(Case(When(progress__gt=80, then=1))),
+        # 認可チェック: 存在確認 + 本人確認（シャード移動中は503）
+        shard = get_shard_directory().writable_shard(user.id)
+        todo = todo_queryset(shard).filter(id=todo_id, user=user).first()
+        if todo is None:
+            TodoService._delete_archived_todo(shard, todo_id, user)
+            return
+        old_values = (todo.priority, todo.progress)
+        if settings.TODO_SOFT_DELETE:
+            # 更新日時も進め、シャード間の移動（move_todo_user）の差分同期で削除を写す
+            now = timezone.now()
+            deleted = TodoService._row_queryset(todo).update(
+                deleted_at=now, updated_at=now, version=F('version') + 1,
             )
-            cache.set(cache_key, stats, TodoService.CACHE_TIMEOUT)
-        return stats
+        else:
+            deleted, _ = TodoService._row_queryset(todo).delete()
+        if not deleted:
+            # 取得から削除までの間に他のリクエストが削除した
+            raise Http404
+        mark_written(user.id)
+        # 統計キャッシュを差分更新
+        TodoService._apply_stats_delta(user.id, old=old_values)
+        publish_todo_event(user.id, "todo.deleted", todo_id)
+
+    @staticmethod
+    def _delete_archived_todo(shard, todo_id, user):
+        """
+        アーカイブ済みのタスクの削除
+
+        TODO_SOFT_DELETE が有効な場合は、削除済みのTodoとして戻して deleted_at を設定する
+        （get_deleted_todos で同期クライアントに削除を伝え、purge_deleted_todos で物理削除する）。
+        """
+        with transaction.atomic(using=shard):
+            archived = get_object_or_404(
+                todo_queryset(shard, ArchivedTodo).select_for_update(), id=todo_id, user=user
+            )
+            if settings.TODO_SOFT_DELETE:
+                TodoService._restore_archived(shard, archived, user, deleted_at=timezone.now())
+            archived.delete()
+        mark_written(user.id)
+        publish_todo_event(user.id, "todo.deleted", archived.id)
 
     @staticmethod
-    def get_priority_stats(user):
-        cache_key = TodoService._get_stats_cache_key(user.id, "priority")
-        stats = cache.get(cache_key)
+    def unarchive_todo(todo_id, user):
+        """
+        アーカイブ済みのタスクを通常のTodoに戻す（以降は取得・更新・削除できる）
 
-        if stats is None:
-            """優先度別の統計を取得"""
-            stats = list(
-                Todo.objects.filter(user=user)
-                .values('priority')
-                .annotate(count=Count('id'))
-                .order_by('priority')
+        作成日時は元のまま、更新日時は戻した日時になる（すぐに再びアーカイブされないよう）。
+        """
+        shard = get_shard_directory().writable_shard(user.id)
+        with transaction.atomic(using=shard):
+            archived = get_object_or_404(
+                todo_queryset(shard, ArchivedTodo).select_for_update(), id=todo_id, user=user
             )
-            cache.set(cache_key, stats, TodoService.CACHE_TIMEOUT)
+            todo = TodoService._restore_archived(shard, archived, user)
+            archived.delete()
+        mark_written(user.id)
+        TodoService._apply_stats_delta(user.id, new=(todo.priority, todo.progress))
+        publish_todo_event(user.id, "todo.created", todo.id, todo_event_payload(todo))
+        return todo
+
+    @staticmethod
+    def _restore_archived(shard, archived, user, **fields):
+        """アーカイブの行から同じIDのTodo（進捗率100）を作成する"""
+        todo = Todo.objects.using(shard).create(
+            id=archived.id,
+            user=user,
+            todo_title=archived.todo_title,
+            priority=archived.priority,
+            progress=100,
+            **fields,
+        )
+        # created_at は auto_now_add のため、作成後に元の作成日時へ戻す
+        Todo._base_manager.using(shard).filter(id=todo.id, user_id=user.id).update(created_at=archived.created_at)
+        todo.created_at = archived.created_at
+        return todo
+
+    @staticmethod
+    def get_pending_progress(user):
+        """まとめ書き待ちの進捗率 {todo_id: progress}（無効時は空）"""
+        coalescer = get_progress_coalescer()
+        if coalescer is None:
+            return {}
+        return coalescer.pending_for_user(user.id)
+
+    @staticmethod
+    def flush_pending_progress(user_id):
+        """ユーザーのまとめ書き待ちの進捗率をDBへ反映"""
+        coalescer = get_progress_coalescer()
+        if coalescer is not None:
+            coalescer.flush(user_id)
+
+    @staticmethod
+    def get_progress_stats(user, include_archived=False):
+        """
+        進捗率の分布を集計（20%刻み）
+
+        include_archived: アーカイブ済みのタスク（進捗率100）も含めるか
+        """
+        stats = TodoService._get_progress_stats(user)
+        if include_archived:
+            archived = sum(TodoService._get_archived_priority_counts(user).values())
+            stats = {**stats, 'range_81_100': stats['range_81_100'] + archived}
         return stats
-    
+
+    @staticmethod
+    def _get_progress_stats(user):
+        # 統計にも未反映の進捗率が含まれるよう先に反映する
+        TodoService.flush_pending_progress(user.id)
+        labels = [label for label, _ in TodoService.PROGRESS_RANGES]
+        keys = {
+            label: TodoService._get_stats_counter_key(user.id, "progress", label)
+            for label in labels
+        }
+        cached = cache.get_many(keys.values())
+
+        if len(cached) == len(keys):
+            return {label: cached[key] for label, key in keys.items()}
+
+        stats = TodoService.get_user_todos(user).aggregate(
+            range_0_20=Count(Case(When(progress__lte=20, then=1))),
+            range_21_40=Count(Case(When(progress__gt=20, progress__lte=40, then=1))),
+            range_41_60=Count(Case(When(progress__gt=40, progress__lte=60, then=1))),
+            range_61_80=Count(Case(When(progress__gt=60, progress__lte=80, then=1))),
+            range_81_100=Count(Case(When(progress__gt=80, then=1))),
+        )
+        cache.set_many(
+            {keys[label]: stats[label] for label in labels},
+            TodoService.CACHE_TIMEOUT,
+        )
+        return stats
+
+    @staticmethod
+    def get_priority_stats(user, include_archived=False):
+        """
+        優先度別の統計を取得（件数0の優先度は含めない）
+
+        include_archived: アーカイブ済みのタスクも含めるか
+        """
+        keys = TodoService._priority_counter_keys(user.id)
+        cached = cache.get_many(keys.values())
+
+        if len(cached) == len(keys):
+            counts = {priority: cached[key] for priority, key in keys.items()}
+        else:
+            counts = dict.fromkeys(Todo.Priority.values, 0)
+            for row in TodoService._priority_count_rows(TodoService.get_user_todos(user)):
+                counts[row['priority']] = row['count']
+            # 件数0の優先度もカウンタとして保持し、後続の差分更新を可能にする
+            cache.set_many(
+                {keys[priority]: count for priority, count in counts.items()},
+                TodoService.CACHE_TIMEOUT,
+            )
+
+        if include_archived:
+            counts = Counter(counts)
+            counts.update(TodoService._get_archived_priority_counts(user))
+        return TodoService._format_priority_stats(counts)
+
+    @staticmethod
+    def _priority_counter_keys(user_id):
+        return {
+            priority: TodoService._get_stats_counter_key(user_id, "priority", priority)
+            for priority in Todo.Priority.values
+        }
+
+    @staticmethod
+    def _priority_count_rows(queryset):
+        return (
+            queryset
+            .values('priority')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+
+    @staticmethod
+    def _format_priority_stats(counts):
+        """優先度の低い順（LOW, MEDIUM, HIGH）に並べる"""
+        return [
+            {'priority': priority, 'count': counts[priority]}
+            for priority in Todo.Priority.values
+            if counts.get(priority, 0) > 0
+        ]
+
+    @staticmethod
+    def get_stats(user):
+        """優先度別・進捗率別の統計をまとめて取得（書き込みレスポンス同梱用）"""
+        return {
+            'priority': TodoService.get_priority_stats(user),
+            'progress': TodoService.get_progress_stats(user),
+        }
+
+    # 非同期版の読み取り（todos/async_views.py 用）
+    # DB・Redisの応答待ちの間もワーカーのスレッドを占有しない
+
+    @staticmethod
+    async def aget_user_todos(user):
+        """get_user_todos の非同期版（評価済みのリストを返す）"""
+        queryset = await TodoService._aget_user_todos_queryset(user)
+        todos = [todo async for todo in queryset]
+        for todo in todos:
+            # 所有者は分かっているため、シリアライザの user（メールアドレス）で問い合わせない
+            todo.user = user
+        return todos
+
+    @staticmethod
+    async def aget_todo(todo_id, user):
+        """本人のタスクを1件取得（存在しない・他人のタスクは404）"""
+        try:
+            queryset = await TodoService._aget_user_todos_queryset(user)
+            todo = await queryset.aget(id=todo_id)
+        except Todo.DoesNotExist:
+            raise Http404
+        todo.user = user
+        return todo
+
+    @staticmethod
+    async def aget_pending_progress(user):
+        """get_pending_progress の非同期版"""
+        if get_progress_coalescer() is None:
+            return {}
+        return await sync_to_async(TodoService.get_pending_progress)(user)
+
+    @staticmethod
+    async def aget_priority_stats(user):
+        """get_priority_stats の非同期版（同期版と同じカウンタを読み書きする）"""
+        async_cache = get_async_cache()
+        keys = TodoService._priority_counter_keys(user.id)
+        cached = await async_cache.get_many(keys.values())
+
+        if len(cached) == len(keys):
+            counts = {priority: cached[key] for priority, key in keys.items()}
+        else:
+            counts = dict.fromkeys(Todo.Priority.values, 0)
+            queryset = await TodoService._aget_user_todos_queryset(user)
+            async for row in TodoService._priority_count_rows(queryset):
+                counts[row['priority']] = row['count']
+            await async_cache.set_many(
+                {keys[priority]: count for priority, count in counts.items()},
+                TodoService.CACHE_TIMEOUT,
+            )
+
+        return TodoService._format_priority_stats(counts)
+
+    @staticmethod
+    def _apply_stats_delta(user_id, old=None, new=None):
+        """
+        変更行の旧値・新値から統計キャッシュを差分更新
+
+        Args:
+            user_id: 対象ユーザーID
+            old: 変更前の (priority, progress)。作成時は None
+            new: 変更後の (priority, progress)。削除時は None
+
+        集計をやり直さずに済むよう、キャッシュ済みのカウンタを incr で増減する。
+        カウンタが揃っていない（未キャッシュ・期限切れ）場合は整合性を優先して
+        破棄し、次回取得時に集計し直す。
+        """
+        deltas = Counter()
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None:
+                continue
+            priority, progress = values
+            deltas[TodoService._get_stats_counter_key(user_id, "priority", priority)] += sign
+            progress_label = TodoService._progress_range_label(progress)
+            deltas[TodoService._get_stats_counter_key(user_id, "progress", progress_label)] += sign
+
+        try:
+            for key, delta in deltas.items():
+                if delta:
+                    cache.incr(key, delta)
+        except ValueError:
+            # incr はキーが存在しない場合 ValueError
+            TodoService._invalidate_stats_cache(user_id)
+
     @staticmethod
     def _invalidate_stats_cache(user_id):
         """指定したユーザーの統計キャッシュをすべて削除"""
-        cache.delete(TodoService._get_stats_cache_key(user_id, "progress"))
-        cache.delete(TodoService._get_stats_cache_key(user_id, "priority"))
\ No newline at end of file
+        keys = [
+            TodoService._get_stats_counter_key(user_id, "progress", label)
+            for label, _ in TodoService.PROGRESS_RANGES
+        ]
+        keys += [
+            TodoService._get_stats_counter_key(user_id, "priority", priority)
+            for priority in Todo.Priority.values
+        ]
+        cache.delete_many(keys)
@@ -0,0 +1,267 @@
+"""
+Todoのユーザー単位のシャーディング
+
+ユーザーのTodoとそのアーカイブはすべて同じシャード（settings.TODO_SHARDS のいずれかの
+DBエイリアス）に置く。置き場所は TodoShardPlacement の行があればそれに従い、なければ
+コンシステントハッシュで決める。シャードを追加しても移動が必要なユーザーは
+一部に限られ、移動は move_todo_user コマンドでオンラインに行う。
+
+TODO_SHARDS が1つ（既定の ["default"]）のときは配置の参照も採番も行わず、
+従来どおり default（とリードレプリカ）を使う。
+"""
+import bisect
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Max
+
+from .exceptions import TodoShardMoving
+from .models import ArchivedTodo, Todo, TodoIdSequence, TodoShardPlacement
+
+PLACEMENT_KEY = "todo_shard:{user_id}"
+
+# ユーザーのシャードに置くモデル
+SHARDED_MODELS = (Todo, ArchivedTodo)
+
+Placement = namedtuple("Placement", ["shard", "frozen", "pinned"])
+
+
+class HashRing:
+    """
+    コンシステントハッシュのリング
+
+    各シャードを vnodes 個の仮想ノードとして配置し、キーのハッシュ値から
+    時計回りに最初の仮想ノードのシャードを返す。
+    """
+
+    def __init__(self, nodes, vnodes=64):
+        points = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in nodes
+            for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._hashes)
+        return self._nodes[index]
+
+
+class TodoShardDirectory:
+    """
+    ユーザーIDからシャードを引く（配置はキャッシュに保持）
+
+    TodoのIDは各シャードの自動採番ではなく、default の TodoIdSequence から
+    ブロック単位で予約して払い出す（シャード間の移動でIDが衝突しないように）。
+    """
+
+    def __init__(self, shards, vnodes):
+        self.shards = list(shards)
+        self.sharded = len(self.shards) > 1
+        self._ring = HashRing(self.shards, vnodes)
+        self._id_lock = threading.Lock()
+        self._next_id = 0
+        self._id_limit = 0
+
+    def placement(self, user_id):
+        """ユーザーの配置 (shard, frozen, pinned)"""
+        if not self.sharded:
+            return Placement(self.shards[0], False, True)
+        key = PLACEMENT_KEY.format(user_id=user_id)
+        cached = cache.get(key)
+        if cached is not None:
+            return Placement(*cached)
+        placement = self._load(user_id)
+        cache.set(key, tuple(placement), settings.TODO_SHARD_CACHE_TIMEOUT)
+        return placement
+
+    async def aplacement(self, user_id):
+        """placement の非同期版"""
+        if not self.sharded:
+            return Placement(self.shards[0], False, True)
+        return await sync_to_async(self.placement)(user_id)
+
+    def _load(self, user_id):
+        row = (
+            TodoShardPlacement.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id=user_id)
+            .values_list("shard", "frozen")
+            .first()
+        )
+        if row is not None:
+            return Placement(row[0], row[1], True)
+        return Placement(self._ring.node_for(user_id), False, False)
+
+    def set_placement(self, user_id, shard, frozen=False):
+        """配置を記録し、キャッシュも即座に差し替える"""
+        TodoShardPlacement.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+            user_id=user_id, defaults={"shard": shard, "frozen": frozen}
+        )
+        cache.set(
+            PLACEMENT_KEY.format(user_id=user_id),
+            (shard, frozen, True),
+            settings.TODO_SHARD_CACHE_TIMEOUT,
+        )
+
+    def writable_shard(self, user_id):
+        """
+        書き込み先のシャード
+
+        移動中（frozen）のユーザーは TodoShardMoving（503）。
+        ハッシュで決まったユーザーは初回の書き込み時に配置を記録し、
+        後からシャードを追加してもTodoの置き場所が変わらないようにする。
+        """
+        placement = self.placement(user_id)
+        if placement.frozen:
+            raise TodoShardMoving()
+        if not placement.pinned:
+            TodoShardPlacement.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+                user_id=user_id, defaults={"shard": placement.shard}
+            )
+            cache.delete(PLACEMENT_KEY.format(user_id=user_id))
+            return self.placement(user_id).shard
+        return placement.shard
+
+    def new_todo_id(self):
+        """新しいTodoのID（シャーディングしていない場合は None で自動採番）"""
+        if not self.sharded:
+            return None
+        with self._id_lock:
+            if self._next_id >= self._id_limit:
+                self._next_id, self._id_limit = self._reserve_ids(settings.TODO_ID_BLOCK_SIZE)
+            todo_id = self._next_id
+            self._next_id += 1
+            return todo_id
+
+    def _reserve_ids(self, size):
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            sequence = (
+                TodoIdSequence.objects.using(DEFAULT_DB_ALIAS)
+                .select_for_update()
+                .filter(pk=1)
+                .first()
+            )
+            if sequence is None:
+                # 初回は全シャードの既存IDの続きから払い出す（アーカイブ済みのIDも再利用しない）
+                start = max(
+                    model._base_manager.using(shard).aggregate(max_id=Max("id"))["max_id"] or 0
+                    for shard in self.shards
+                    for model in SHARDED_MODELS
+                ) + 1
+                sequence, _ = (
+                    TodoIdSequence.objects.using(DEFAULT_DB_ALIAS)
+                    .select_for_update()
+                    .get_or_create(pk=1, defaults={"next_value": start})
+                )
+            start = sequence.next_value
+            sequence.next_value = start + size
+            sequence.save(update_fields=["next_value"])
+        return start, start + size
+
+
+@lru_cache(maxsize=None)
+def get_shard_directory():
+    return TodoShardDirectory(settings.TODO_SHARDS, settings.TODO_SHARD_VNODES)
+
+
+def todo_queryset(shard, model=Todo, include_deleted=False):
+    """
+    シャード上のTodo（model でアーカイブも指定可）のクエリセット
+
+    include_deleted=True で削除済み（論理削除）のTodoも含める。
+    default には using を付けず、replica_reads によるレプリカへの振り分けを妨げない。
+    """
+    manager = model._base_manager if include_deleted else model.objects
+    if shard == DEFAULT_DB_ALIAS:
+        return manager.all()
+    return manager.using(shard)
+
+
+def fan_out(func, shards=None):
+    """
+    func(shard) を各シャードで並列に実行し {shard: 結果} を返す（管理用の横断クエリ）
+    """
+    shards = list(shards or settings.TODO_SHARDS)
+
+    def run(shard):
+        try:
+            return func(shard)
+        finally:
+            # 接続はスレッドごとのため、作業スレッドで開いた接続はここで閉じる
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        return dict(zip(shards, executor.map(run, shards)))
+
+
+def count_todos_by_shard():
+    """シャードごとのTodo件数とユーザー数"""
+    return fan_out(
+        lambda shard: Todo.objects.using(shard).aggregate(
+            todos=Count("id"), users=Count("user_id", distinct=True)
+        )
+    )
+
+
+def count_todos_by_priority():
+    """全シャードを合算した優先度別のTodo件数"""
+    totals = dict.fromkeys(Todo.Priority.values, 0)
+    results = fan_out(
+        lambda shard: list(
+            Todo.objects.using(shard).values("priority").annotate(count=Count("id")).order_by()
+        )
+    )
+    for rows in results.values():
+        for row in rows:
+            totals[row["priority"]] += row["count"]
+    return totals
+
+
+class TodoShardRouter:
+    """
+    Todo・アーカイブのインスタンス（または所有者）が分かる操作を、そのユーザーのシャードへ振り分けるルーター
+
+    todo.save() / todo.delete() / user.todos.all() などが対象。
+    default のユーザーと、インスタンスが分からない操作は後続のルーター
+    （PrimaryReplicaRouter）に任せる。
+    """
+
+    def _shard_for_hints(self, model, hints):
+        if model not in SHARDED_MODELS:
+            return None
+        instance = hints.get("instance")
+        if isinstance(instance, SHARDED_MODELS):
+            user_id = instance.user_id
+        elif isinstance(instance, get_user_model()):
+            user_id = instance.pk
+        else:
+            return None
+        if user_id is None:
+            return None
+        shard = get_shard_directory().placement(user_id).shard
+        return None if shard == DEFAULT_DB_ALIAS else shard
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for_hints(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for_hints(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todoの所有者（ユーザー）は default、Todo自体は各シャードにある
+        if isinstance(obj1, SHARDED_MODELS) or isinstance(obj2, SHARDED_MODELS):
+            return True
+        return None
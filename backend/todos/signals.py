@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .sharding import SHARDED_MODELS, get_shard_directory, todo_queryset
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_todos(sender, instance, **kwargs):
+    """
+    ユーザーの削除時に、default 以外のシャードにあるTodo・アーカイブも削除する
+
+    default の行は外部キーの CASCADE で削除されるが、別のDBにある行には及ばない。
+    """
+    directory = get_shard_directory()
+    if not directory.sharded:
+        return
+    for shard in directory.shards:
+        if shard != DEFAULT_DB_ALIAS:
+            for model in SHARDED_MODELS:
+                todo_queryset(shard, model, include_deleted=True).filter(user_id=instance.pk).delete()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .events import get_event_channel
+
+EVENTS_PATH = "/api/v1/todos/events/"
+
+
+def _get_raw_token(scope):
+    """AuthorizationヘッダーまたはJWT Cookieからアクセストークンを取り出す"""
+    headers = dict(scope.get("headers") or [])
+
+    authorization = headers.get(b"authorization", b"").decode()
+    parts = authorization.split()
+    if len(parts) == 2 and parts[0] in jwt_settings.AUTH_HEADER_TYPES:
+        return parts[1]
+
+    cookie_name = settings.REST_AUTH.get("JWT_AUTH_COOKIE", "access-token")
+    cookies = SimpleCookie()
+    cookies.load(headers.get(b"cookie", b"").decode())
+    if cookie_name in cookies:
+        return cookies[cookie_name].value
+    return None
+
+
+def authenticate_scope(scope):
+    """
+    アクセストークンを検証してユーザーIDを返す（失敗時は None）
+
+    署名と有効期限の検証のみで完結させ、DBには問い合わせない。
+    数千本の待機接続を張っても接続確立時のDB負荷が増えないようにするため。
+    """
+    raw_token = _get_raw_token(scope)
+    if not raw_token:
+        return None
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return None
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    # クレームは文字列で発行されるため、TodoService が配信に使う主キーの型に揃える
+    return get_user_model()._meta.pk.to_python(user_id)
+
+
+def _cors_headers(scope):
+    """
+    CORSのレスポンスヘッダー
+
+    このアプリはDjangoのミドルウェア（corsheaders）を通らないため、同じ設定
+    （CORS_ALLOWED_ORIGINS・CORS_ALLOW_CREDENTIALS）で許可したオリジンをそのまま返す。
+    別オリジンのフロントエンドの EventSource(..., {withCredentials: true}) は、
+    エラー応答も含めてこれがないとブラウザに読み取りを拒否される。
+    """
+    headers = [(b"vary", b"origin")]
+    origin = dict(scope.get("headers") or []).get(b"origin", b"").decode()
+    if origin and origin in filter(None, settings.CORS_ALLOWED_ORIGINS):
+        headers.append((b"access-control-allow-origin", origin.encode()))
+        if settings.CORS_ALLOW_CREDENTIALS:
+            headers.append((b"access-control-allow-credentials", b"true"))
+    return headers
+
+
+async def todo_events_app(scope, receive, send):
+    """
+    Todo変更イベントを Server-Sent Events で配信するASGIアプリ
+
+    Djangoのミドルウェアスタック（同期）を通さず、イベントループ上で直接
+    ストリームを保持するため、接続ごとにスレッドを消費しない。
+    """
+    cors_headers = _cors_headers(scope)
+    if scope["method"] != "GET":
+        await _send_json(send, 405, {"detail": "Method not allowed."}, cors_headers)
+        return
+
+    user_id = authenticate_scope(scope)
+    if user_id is None:
+        await _send_json(send, 401, {"detail": "Authentication credentials were not provided."}, cors_headers)
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            # nginx等のリバースプロキシでバッファリングさせない
+            (b"x-accel-buffering", b"no"),
+            *cors_headers,
+        ],
+    })
+    # 接続確立を即座にクライアントへ通知
+    await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    events = get_event_channel().subscribe(user_id)
+    next_event = None
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected},
+                timeout=settings.TODO_EVENTS_HEARTBEAT_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                break
+            if next_event in done:
+                event = next_event.result()
+                next_event = None
+                body = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            else:
+                # アイドル接続をプロキシに切られないようにハートビートを送る
+                body = ": keepalive\n\n"
+            await send({"type": "http.response.body", "body": body.encode(), "more_body": True})
+    finally:
+        pending = [task for task in (next_event, disconnected) if task is not None]
+        for task in pending:
+            task.cancel()
+        # 実行中のジェネレータは閉じられないため、キャンセル完了を待ってから閉じる
+        await asyncio.gather(*pending, return_exceptions=True)
+        await events.aclose()
+
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _send_json(send, status, payload, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), *headers],
+    })
+    await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+
+
+def with_todo_events(django_application):
+    """SSEのパスだけを todo_events_app に振り分け、残りはDjangoへ渡す"""
+
+    async def application(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+            await todo_events_app(scope, receive, send)
+        else:
+            await django_application(scope, receive, send)
+
+    return application
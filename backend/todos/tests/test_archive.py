@@ -0,0 +1,127 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from todos.archive import archive_completed_todos
+from todos.models import ArchivedTodo, Todo
+from todos.service import TodoService
+
+User = get_user_model()
+
+
+class TodoArchiveTest(TestCase):
+    """完了したTodoのアーカイブのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        long_ago = timezone.now() - timedelta(days=60)
+        self.old_done = Todo.objects.create(
+            user=self.user, todo_title='完了済み', priority=Todo.Priority.HIGH, progress=100
+        )
+        self.old_open = Todo.objects.create(user=self.user, todo_title='未完了', progress=50)
+        self.recent_done = Todo.objects.create(user=self.user, todo_title='最近完了', progress=100)
+        Todo.objects.filter(id__in=[self.old_done.id, self.old_open.id]).update(updated_at=long_ago)
+        self.old_done.refresh_from_db()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_archives_only_old_completed_todos(self):
+        """完了から指定日数が過ぎたTodoだけをアーカイブへ移す（作成日時などは保持）"""
+        self.assertEqual(archive_completed_todos(30), {'default': 1})
+
+        self.assertFalse(Todo.objects.filter(id=self.old_done.id).exists())
+        archived = ArchivedTodo.objects.get(id=self.old_done.id)
+        self.assertEqual(
+            (archived.user, archived.todo_title, archived.priority, archived.created_at, archived.completed_at),
+            (self.user, '完了済み', 'HIGH', self.old_done.created_at, self.old_done.updated_at),
+        )
+        self.assertEqual(Todo.objects.count(), 2)
+
+    def test_list_includes_archive_only_when_requested(self):
+        """一覧は既定でアーカイブを含まず、include_archived 指定時は末尾に含める"""
+        archive_completed_todos(30)
+
+        listing = self.client.get('/api/v1/todos/').json()
+        self.assertNotIn(self.old_done.id, [todo['id'] for todo in listing])
+
+        # 一覧 + 所有者 x2 + アーカイブ（アーカイブ分は所有者を問い合わせない）
+        with self.assertNumQueries(4):
+            listing = self.client.get('/api/v1/todos/?include_archived=true').json()
+        self.assertEqual(listing[-1]['id'], self.old_done.id)
+        self.assertEqual(listing[-1]['progress'], 100)
+        self.assertTrue(listing[-1]['archived'])
+        self.assertEqual(listing[-1]['user'], 'user@example.com')
+
+    def test_stats_include_archive_only_when_requested(self):
+        """統計は既定でアーカイブを含まず、キャッシュ済みの統計もアーカイブ後に更新される"""
+        self.assertEqual(TodoService.get_progress_stats(self.user)['range_81_100'], 2)
+
+        archive_completed_todos(30)
+
+        self.assertEqual(TodoService.get_progress_stats(self.user)['range_81_100'], 1)
+        self.assertEqual(
+            TodoService.get_progress_stats(self.user, include_archived=True)['range_81_100'], 2
+        )
+        self.assertEqual(self.client.get('/api/v1/todos/stats/').json(), [{'priority': 'MEDIUM', 'count': 2}])
+        self.assertEqual(
+            self.client.get('/api/v1/todos/stats/?include_archived=true').json(),
+            [{'priority': 'MEDIUM', 'count': 2}, {'priority': 'HIGH', 'count': 1}],
+        )
+
+    def test_archived_todo_can_be_unarchived(self):
+        """一覧に含まれるアーカイブ済みのIDは unarchive で戻し、その後は取得・更新できる"""
+        archive_completed_todos(30)
+        self.assertEqual(self.client.get(f'/api/v1/todos/{self.old_done.id}/').status_code, 404)
+
+        response = self.client.post(f'/api/v1/todos/{self.old_done.id}/unarchive/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['progress'], response['ETag']), (100, '"1"'))
+        self.assertFalse(ArchivedTodo.objects.exists())
+        todo = Todo.objects.get(id=self.old_done.id)
+        self.assertEqual((todo.todo_title, todo.priority, todo.created_at), ('完了済み', 'HIGH', self.old_done.created_at))
+        self.assertEqual(TodoService.get_progress_stats(self.user)['range_81_100'], 2)
+        response = self.client.patch(f'/api/v1/todos/{todo.id}/', {'progress': 50}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # 戻すのはアーカイブ済みのタスクだけ
+        self.assertEqual(self.client.post(f'/api/v1/todos/{todo.id}/unarchive/').status_code, 404)
+
+    def test_archived_todo_can_be_deleted(self):
+        """アーカイブ済みのタスクを削除すると、削除済みのTodoとして同期クライアントに伝わる"""
+        archive_completed_todos(30)
+        since = timezone.now() - timedelta(minutes=1)
+
+        response = self.client.delete(f'/api/v1/todos/{self.old_done.id}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ArchivedTodo.objects.exists())
+        self.assertEqual([row['id'] for row in TodoService.get_deleted_todos(self.user, since)], [self.old_done.id])
+        self.assertEqual(self.client.delete(f'/api/v1/todos/{self.old_done.id}/').status_code, 404)
+
+    def test_command_archives_in_batches(self):
+        """archive_todos コマンドはバッチ単位で繰り返し移す"""
+        Todo.objects.filter(id=self.old_open.id).update(progress=100)
+
+        out = StringIO()
+        call_command('archive_todos', days=30, batch_size=1, stdout=out)
+
+        self.assertEqual(ArchivedTodo.objects.count(), 2)
+        self.assertIn('2 todos archived', out.getvalue())
+
+    def test_user_deletion_deletes_archive(self):
+        """ユーザーの削除でアーカイブも削除される"""
+        archive_completed_todos(30)
+
+        self.user.delete()
+
+        self.assertFalse(ArchivedTodo.objects.exists())
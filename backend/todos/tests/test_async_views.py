@@ -0,0 +1,127 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from todos.models import Todo
+from users.user_cache import user_resolution_cache
+
+User = get_user_model()
+
+
+class AsyncTodoViewsTest(TestCase):
+    """
+    読み取りの非同期版（/api/v1/async/todos/）のテスト
+    """
+
+    def setUp(self):
+        cache.clear()
+        user_resolution_cache.clear()
+        self.user = User.objects.create_user(email='user1@example.com', password='testpass123')
+        self.other = User.objects.create_user(email='user2@example.com', password='testpass123')
+        self.todo = Todo.objects.create(
+            user=self.user, todo_title='タスク1', priority=Todo.Priority.HIGH, progress=50
+        )
+        Todo.objects.create(user=self.user, todo_title='タスク2', priority=Todo.Priority.LOW)
+        self.other_todo = Todo.objects.create(user=self.other, todo_title='他人のタスク')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def tearDown(self):
+        cache.clear()
+        user_resolution_cache.clear()
+
+    def _get_both(self, path):
+        """同期版・非同期版の同じパスのレスポンス"""
+        return (
+            self.client.get(f'/api/v1/todos/{path}', **self.auth),
+            self.client.get(f'/api/v1/async/todos/{path}', **self.auth),
+        )
+
+    def test_list_matches_sync_view(self):
+        """一覧: 同期版と同じく本人のタスクのみを返す"""
+        sync_response, async_response = self._get_both('')
+
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.json(), sync_response.json())
+        self.assertEqual(len(async_response.json()), 2)
+
+    def test_list_does_not_query_owner_per_todo(self):
+        """一覧: タスクごとに所有者を問い合わせない"""
+        self.client.get('/api/v1/async/todos/', **self.auth)  # ユーザーをキャッシュ
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/async/todos/', **self.auth)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+    def test_retrieve_matches_sync_view(self):
+        """詳細: 同期版と同じ本文と ETag を返す"""
+        sync_response, async_response = self._get_both(f'{self.todo.id}/')
+
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.json(), sync_response.json())
+        self.assertEqual(async_response['ETag'], sync_response['ETag'])
+
+    def test_retrieve_other_users_todo_is_404(self):
+        """詳細: 他人のタスクは404"""
+        response = self.client.get(f'/api/v1/async/todos/{self.other_todo.id}/', **self.auth)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_matches_sync_view(self):
+        """統計: 同期版と同じ結果を返し、同じカウンタを共有する"""
+        async_response = self.client.get('/api/v1/async/todos/stats/', **self.auth)
+        self.assertEqual(
+            async_response.json(),
+            [{'priority': 'LOW', 'count': 1}, {'priority': 'HIGH', 'count': 1}],
+        )
+
+        # 同期側の書き込みによる差分更新が非同期版の読み取りに反映される
+        self.client.post(
+            '/api/v1/todos/', {'todo_title': 'タスク3', 'priority': 'HIGH'},
+            content_type='application/json', **self.auth,
+        )
+        sync_response, async_response = self._get_both('stats/')
+
+        self.assertEqual(async_response.json(), sync_response.json())
+        self.assertEqual(async_response.json()[-1], {'priority': 'HIGH', 'count': 2})
+
+    def test_unauthenticated_is_401(self):
+        """未認証は401"""
+        response = self.client.get('/api/v1/async/todos/')
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+    def test_invalid_token_is_401(self):
+        """不正なトークンは401"""
+        response = self.client.get('/api/v1/async/todos/', HTTP_AUTHORIZATION='Bearer invalid')
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    def test_inactive_user_is_401(self):
+        """無効化されたユーザーは401"""
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get('/api/v1/async/todos/', **self.auth)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cookie_token_is_accepted(self):
+        """JWT Cookieでも認証できる"""
+        self.client.cookies['access-token'] = str(AccessToken.for_user(self.user))
+
+        response = self.client.get('/api/v1/async/todos/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_write_methods_are_not_allowed(self):
+        """書き込みは同期版のみ（405）"""
+        response = self.client.post('/api/v1/async/todos/', {}, **self.auth)
+
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
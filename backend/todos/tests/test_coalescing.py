@@ -0,0 +1,184 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from rest_framework import status
+from todos.coalescing import ProgressWriteCoalescer, get_progress_coalescer
+from todos.models import Todo
+from todos.service import TodoService
+
+User = get_user_model()
+
+
+# 定期反映スレッドは使わず、テスト内で明示的に反映する
+@override_settings(
+    TODO_PROGRESS_BUFFER='todos.coalescing.InMemoryProgressBuffer',
+    TODO_PROGRESS_FLUSH_INTERVAL=None,
+)
+class ProgressCoalescingTestCase(TestCase):
+    """進捗率更新のまとめ書きのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        get_progress_coalescer.cache_clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.todo1 = Todo.objects.create(user=self.user, todo_title='タスク1', progress=0)
+        self.todo2 = Todo.objects.create(user=self.user, todo_title='タスク2', progress=0)
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        get_progress_coalescer.cache_clear()
+        cache.clear()
+
+    def test_progress_only_update_is_buffered(self):
+        """進捗率のみの更新はDBに書かずに即座に応答する"""
+        response = self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'progress': 40})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['progress'], 40)
+        self.todo1.refresh_from_db()
+        self.assertEqual(self.todo1.progress, 0)
+
+    def test_reads_see_pending_progress(self):
+        """一覧・詳細の取得には未反映の進捗率が反映される"""
+        self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'progress': 40})
+
+        detail = self.client.get(f'/api/v1/todos/{self.todo1.id}/')
+        listing = self.client.get('/api/v1/todos/')
+
+        self.assertEqual(detail.data['progress'], 40)
+        progress = {todo['id']: todo['progress'] for todo in listing.data}
+        self.assertEqual(progress, {self.todo1.id: 40, self.todo2.id: 0})
+
+    def test_flush_writes_latest_values_in_one_update(self):
+        """反映: 連続した更新は最新値のみが1回の UPDATE で書き込まれる"""
+        for progress in (10, 20, 30):
+            self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'progress': progress})
+        self.client.patch(f'/api/v1/todos/{self.todo2.id}/', {'progress': 70})
+
+        with self.assertNumQueries(1):
+            flushed = get_progress_coalescer().flush()
+
+        self.assertEqual(flushed, 2)
+        self.todo1.refresh_from_db()
+        self.todo2.refresh_from_db()
+        self.assertEqual((self.todo1.progress, self.todo1.version), (30, 2))
+        self.assertEqual((self.todo2.progress, self.todo2.version), (70, 2))
+        self.assertEqual(TodoService.get_pending_progress(self.user), {})
+
+    def test_stats_include_pending_progress(self):
+        """統計の取得前に未反映の進捗率が反映される"""
+        self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'progress': 90})
+
+        response = self.client.get('/api/v1/todos/progress-stats/')
+
+        self.assertEqual(response.data['range_0_20'], 1)
+        self.assertEqual(response.data['range_81_100'], 1)
+
+    def test_other_field_update_flushes_pending_first(self):
+        """進捗率以外を含む更新は、先にバッファを反映してから即時に書き込む"""
+        self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'progress': 40})
+        self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'todo_title': '編集', 'progress': 50})
+
+        get_progress_coalescer().flush()
+
+        self.todo1.refresh_from_db()
+        self.assertEqual((self.todo1.todo_title, self.todo1.progress), ('編集', 50))
+
+    def test_conditional_update_is_not_buffered(self):
+        """If-Match 付きの更新はまとめ書きせず即時に反映する"""
+        response = self.client.patch(
+            f'/api/v1/todos/{self.todo1.id}/', {'progress': 40}, HTTP_IF_MATCH='"1"'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.todo1.refresh_from_db()
+        self.assertEqual(self.todo1.progress, 40)
+
+    def test_etag_of_buffered_update_matches_after_flush(self):
+        """まとめ書きの応答・読み取りの ETag は反映後のバージョンで、その If-Match は 412 にならない"""
+        first = self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'progress': 10})
+        second = self.client.patch(f'/api/v1/todos/{self.todo1.id}/', {'progress': 20})
+        detail = self.client.get(f'/api/v1/todos/{self.todo1.id}/')
+        self.assertEqual({first['ETag'], second['ETag'], detail['ETag']}, {'"2"'})
+
+        response = self.client.patch(
+            f'/api/v1/todos/{self.todo1.id}/', {'todo_title': '編集'}, HTTP_IF_MATCH=second['ETag']
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['progress'], response['ETag']), (20, '"3"'))
+
+    def test_pending_value_changed_during_flush_is_kept(self):
+        """反映中に新しい値が入った場合、その値はバッファに残る"""
+        coalescer = get_progress_coalescer()
+        coalescer.submit(self.user.id, self.todo1.id, 10)
+        entries = coalescer.buffer.snapshot()
+        coalescer.submit(self.user.id, self.todo1.id, 20)
+
+        coalescer.buffer.ack(entries)
+
+        self.assertEqual(coalescer.pending_for_user(self.user.id), {self.todo1.id: 20})
+
+    def test_flush_on_postgresql_skips_deleted_todos(self):
+        """反映: PostgreSQLの UPDATE ... FROM (VALUES ...) は削除済みのTodoを更新しない"""
+        connection = MagicMock(vendor='postgresql')
+        connection.ops.quote_name = lambda name: f'"{name}"'
+        cursor = connection.cursor.return_value.__enter__.return_value
+
+        with patch('todos.coalescing.connections', {'default': connection}):
+            ProgressWriteCoalescer._write('default', [(self.user.id, self.todo1.id, 40)])
+
+        sql, params = cursor.execute.call_args.args
+        self.assertTrue(sql.startswith('UPDATE "todos_todo" AS t'))
+        self.assertTrue(sql.endswith('AND t.deleted_at IS NULL'))
+        self.assertEqual(params[1:], [self.todo1.id, self.user.id, 40])
+
+    def _flush_concurrently(self, other_flush):
+        """1つ目の flush の反映中に別スレッドで other_flush を実行し、(1つ目, 2つ目, _write の呼び出し数) を返す"""
+        coalescer = get_progress_coalescer()
+        coalescer.submit(self.user.id, self.todo1.id, 40)
+        write = ProgressWriteCoalescer._write
+        others, results = [], []
+
+        def write_while_other_flushes(alias, entries):
+            other = threading.Thread(target=lambda: results.append(other_flush(coalescer)))
+            others.append(other)
+            other.start()
+            # 2つ目の flush が反映を飛ばす（または確保を待つ）間に反映する
+            other.join(timeout=0.2)
+            write(alias, entries)
+
+        with patch.object(
+            ProgressWriteCoalescer, '_write', side_effect=write_while_other_flushes
+        ) as mocked:
+            flushed = coalescer.flush()
+            for other in others:
+                other.join()
+        return flushed, results, mocked.call_count
+
+    def test_concurrent_flush_skips_user_being_flushed(self):
+        """反映中のユーザーは、同時に走った定期反映では書き込まない（バージョンは1つだけ進む）"""
+        flushed, results, writes = self._flush_concurrently(lambda coalescer: coalescer.flush())
+
+        self.assertEqual((flushed, results, writes), (1, [0], 1))
+        self.todo1.refresh_from_db()
+        self.assertEqual((self.todo1.progress, self.todo1.version), (40, 2))
+
+    def test_flush_for_user_waits_for_concurrent_flush(self):
+        """ユーザー指定の反映は、反映中の flush の完了を待ち、反映済みの値を書き直さない"""
+        flushed, results, writes = self._flush_concurrently(
+            lambda coalescer: coalescer.flush(self.user.id)
+        )
+
+        self.assertEqual((flushed, results, writes), (1, [0], 1))
+        self.todo1.refresh_from_db()
+        self.assertEqual((self.todo1.progress, self.todo1.version), (40, 2))
+        self.assertEqual(TodoService.get_pending_progress(self.user), {})
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from rest_framework.test import APIClient
+from todos import compact_schema
+from todos.models import Todo
+
+User = get_user_model()
+
+COLUMNS = [
+    ('priority', 'smallint', "CASE {column} WHEN 'LOW' THEN 1 WHEN 'MEDIUM' THEN 2 WHEN 'HIGH' THEN 3 END"),
+    ('progress', 'smallint', '{column}'),
+]
+
+
+class CompactColumnsTest(TestCase):
+    """優先度の smallint での保存と進捗率の範囲制約のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.high = Todo.objects.create(user=self.user, todo_title='高', priority=Todo.Priority.HIGH)
+        self.low = Todo.objects.create(user=self.user, todo_title='低', priority=Todo.Priority.LOW)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_priority_is_stored_as_rank(self):
+        """DBには順位（1〜3）で保存し、Python・APIでは文字列のまま扱う"""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT priority FROM todos_todo WHERE id = %s', [self.high.id])
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+        self.assertEqual(Todo.objects.get(id=self.high.id).priority, 'HIGH')
+        self.assertEqual(Todo.objects.get(priority='LOW'), self.low)
+        self.assertEqual(list(Todo.objects.order_by('priority').values_list('priority', flat=True)), ['LOW', 'HIGH'])
+        self.assertEqual(self.client.get(f'/api/v1/todos/{self.high.id}/').json()['priority'], 'HIGH')
+
+    def test_increment_returns_priority_name(self):
+        """加算後に読み直した優先度も文字列で返す"""
+        response = self.client.patch(f'/api/v1/todos/{self.high.id}/', {'progress_delta': 10}, format='json')
+
+        self.assertEqual((response.json()['priority'], response.json()['progress']), ('HIGH', 10))
+
+    def test_stats_are_ordered_by_rank(self):
+        """優先度別統計は文字列順ではなく優先度の低い順に並ぶ"""
+        self.assertEqual(
+            self.client.get('/api/v1/todos/stats/').json(),
+            [{'priority': 'LOW', 'count': 1}, {'priority': 'HIGH', 'count': 1}],
+        )
+
+    def test_progress_range_is_enforced_by_database(self):
+        """進捗率の範囲はシリアライザを通らない更新でもDBの制約で拒否される"""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Todo.objects.filter(id=self.high.id).update(progress=101)
+
+
+class OnlineConversionSqlTest(TestCase):
+    """PostgreSQLでのオンライン変換のSQLのテスト（実行はPostgreSQLのみ）"""
+
+    def test_new_columns_are_filled_by_trigger_and_backfill(self):
+        """新しい列はトリガーと未変換の行だけの埋め戻しで埋める"""
+        add = compact_schema.add_columns_sql(connection, 'todos_todo', COLUMNS)
+        self.assertIn('ADD COLUMN IF NOT EXISTS "priority__new" smallint', add[0])
+
+        trigger = compact_schema.sync_trigger_sql(connection, 'todos_todo', COLUMNS)[0]
+        self.assertIn(
+            'NEW."priority__new" := CASE NEW."priority" WHEN \'LOW\' THEN 1', trigger
+        )
+        self.assertIn('NEW."progress__new" := NEW."progress";', trigger)
+
+        assignments, pending = compact_schema.backfill_sql(connection, COLUMNS)
+        self.assertIn('"progress__new" = "progress"', assignments)
+        self.assertEqual(pending, '"priority__new" IS NULL OR "progress__new" IS NULL')
+
+    def test_swap_replaces_columns_under_one_lock(self):
+        """入れ替えは1回のロックの間に元の列の削除・名前の変更・NOT NULL の設定を行う"""
+        statements = compact_schema.swap_sql(connection, 'todos_todo', COLUMNS)
+
+        self.assertTrue(statements[0].startswith('LOCK TABLE "todos_todo"'))
+        self.assertIn('ALTER TABLE "todos_todo" DROP COLUMN "priority"', statements)
+        self.assertIn('ALTER TABLE "todos_todo" RENAME COLUMN "priority__new" TO "priority"', statements)
+        self.assertIn('ALTER TABLE "todos_todo" ALTER COLUMN "progress" SET NOT NULL', statements)
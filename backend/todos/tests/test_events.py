@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import AccessToken
+from todos.events import InMemoryEventChannel, get_event_channel
+from todos.models import Todo
+from todos.service import TodoService
+from todos.sse import EVENTS_PATH, todo_events_app
+
+User = get_user_model()
+
+
+class InMemoryEventChannelTestCase(TestCase):
+    """InMemoryEventChannelのテスト"""
+
+    def test_publish_delivers_to_subscriber(self):
+        """publish: 購読中のユーザーにイベントが届く"""
+        channel = InMemoryEventChannel()
+
+        async def scenario():
+            events = channel.subscribe(1)
+            pending = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0)  # 購読の登録を待つ
+            channel.publish(1, {"type": "todo.created", "id": 10})
+            event = await asyncio.wait_for(pending, 1)
+            await events.aclose()
+            return event
+
+        event = asyncio.run(scenario())
+
+        self.assertEqual(event, {"type": "todo.created", "id": 10})
+        self.assertEqual(channel.subscriber_count(), 0)
+
+    def test_publish_is_scoped_to_user(self):
+        """publish: 他ユーザーのイベントは届かない"""
+        channel = InMemoryEventChannel()
+
+        async def scenario():
+            events = channel.subscribe(1)
+            pending = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0)
+            channel.publish(2, {"type": "todo.created", "id": 10})
+            await asyncio.sleep(0.05)
+            received = pending.done()
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+            await events.aclose()
+            return received
+
+        self.assertFalse(asyncio.run(scenario()))
+
+
+class TodoServiceEventTestCase(TestCase):
+    """TodoServiceが変更イベントを配信するかのテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.channel = get_event_channel()
+        self.published = []
+        self.channel.publish = lambda user_id, event: self.published.append((user_id, event))
+
+    def tearDown(self):
+        del self.channel.publish
+
+    def test_create_publishes_after_commit(self):
+        """create_todo: コミット後に todo.created が配信される"""
+        with self.captureOnCommitCallbacks(execute=True):
+            todo = TodoService.create_todo(self.user, {'todo_title': '新しいタスク'})
+
+        user_id, event = self.published[0]
+        self.assertEqual(user_id, self.user.id)
+        self.assertEqual(event['type'], 'todo.created')
+        self.assertEqual(event['todo']['id'], todo.id)
+        self.assertEqual(event['todo']['todo_title'], '新しいタスク')
+        self.assertNotIn('user', event['todo'])
+
+    def test_update_and_delete_publish_events(self):
+        """update_todo / delete_todo: todo.updated と todo.deleted が配信される"""
+        todo = Todo.objects.create(user=self.user, todo_title='タスク')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TodoService.update_todo(todo.id, self.user, {'progress': 40})
+            TodoService.delete_todo(todo.id, self.user)
+
+        types = [event['type'] for _, event in self.published]
+        self.assertEqual(types, ['todo.updated', 'todo.deleted'])
+        self.assertEqual(self.published[0][1]['todo']['progress'], 40)
+        self.assertEqual(self.published[1][1]['id'], todo.id)
+
+
+class TodoEventsAppTestCase(TestCase):
+    """SSEエンドポイント（ASGIアプリ）のテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user1@example.com',
+            password='testpass123'
+        )
+
+    def _scope(self, headers=()):
+        return {
+            'type': 'http',
+            'method': 'GET',
+            'path': EVENTS_PATH,
+            'headers': list(headers),
+        }
+
+    def _run(self, scope, after_connect=None):
+        """アプリを起動し、接続後に after_connect を実行してから切断する"""
+        sent = []
+
+        async def scenario():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            app = asyncio.ensure_future(todo_events_app(scope, receive, send))
+            await asyncio.sleep(0.05)
+            if after_connect is not None:
+                after_connect()
+                await asyncio.sleep(0.05)
+            disconnected.set()
+            await asyncio.wait_for(app, 1)
+
+        asyncio.run(scenario())
+        return sent
+
+    def test_unauthenticated_returns_401(self):
+        """未認証の接続は401"""
+        sent = self._run(self._scope())
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_streams_events_for_cookie_authenticated_user(self):
+        """JWT Cookieで認証したユーザーにイベントがストリームされる"""
+        token = str(AccessToken.for_user(self.user))
+        scope = self._scope([(b'cookie', f'access-token={token}'.encode())])
+
+        sent = self._run(
+            scope,
+            after_connect=lambda: get_event_channel().publish(
+                self.user.id, {'type': 'todo.deleted', 'id': 5, 'todo': None}
+            ),
+        )
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in sent[1:]).decode()
+        self.assertIn('event: todo.deleted', body)
+        data_line = next(line for line in body.splitlines() if line.startswith('data: '))
+        self.assertEqual(json.loads(data_line[len('data: '):])['id'], 5)
+        # 切断後は購読が解除される
+        self.assertEqual(get_event_channel().subscriber_count(), 0)
+
+    @override_settings(CORS_ALLOWED_ORIGINS=['https://front.example.com', None], CORS_ALLOW_CREDENTIALS=True)
+    def test_cors_headers_for_allowed_origin(self):
+        """許可したオリジンからの接続にはエラー応答を含めてCORSのヘッダーを返す"""
+        token = str(AccessToken.for_user(self.user))
+        origin = (b'origin', b'https://front.example.com')
+
+        streamed = self._run(self._scope([origin, (b'cookie', f'access-token={token}'.encode())]))
+        rejected = self._run(self._scope([origin]))
+        other = self._run(self._scope([(b'origin', b'https://evil.example.com')]))
+
+        for sent in (streamed, rejected):
+            self.assertIn((b'access-control-allow-origin', b'https://front.example.com'), sent[0]['headers'])
+            self.assertIn((b'access-control-allow-credentials', b'true'), sent[0]['headers'])
+            self.assertIn((b'vary', b'origin'), sent[0]['headers'])
+        self.assertEqual((streamed[0]['status'], rejected[0]['status']), (200, 401))
+        self.assertNotIn(b'access-control-allow-origin', dict(other[0]['headers']))
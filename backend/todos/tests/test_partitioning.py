@@ -0,0 +1,117 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from todos import partitioning
+from todos.models import Todo
+from todos.service import TodoService
+
+User = get_user_model()
+
+
+def partitioned(method):
+    return override_settings(TODO_PARTITIONING={
+        'method': method, 'partitions': 4, 'months_ahead': 1, 'chunk_size': 100,
+    })
+
+
+class PartitionSqlTest(TestCase):
+    """パーティションテーブルを作るSQLのテスト（実行はPostgreSQLのみ）"""
+
+    def test_hash_partitions(self):
+        """hash: 主キーに user_id を含め、指定数のパーティションを作る"""
+        statements = partitioning.create_table_sql(connection, 'hash', 4)
+
+        self.assertIn('PARTITION BY HASH ("user_id")', statements[0])
+        self.assertIn('PRIMARY KEY ("id", "user_id")', statements[1])
+        partitions = [sql for sql in statements if 'PARTITION OF' in sql]
+        self.assertEqual(len(partitions), 4)
+        self.assertIn('MODULUS 4, REMAINDER 3', partitions[-1])
+
+    def test_range_partitions_cover_months_across_year_end(self):
+        """range: 月ごとのパーティションを年をまたいで作り、範囲外はDEFAULTパーティションに入る"""
+        statements = partitioning.create_table_sql(
+            connection, 'range', None, first_month=date(2025, 11, 15), last_month=date(2026, 1, 1),
+        )
+
+        self.assertIn('PRIMARY KEY ("id", "created_at")', statements[1])
+        partitions = [sql for sql in statements if 'PARTITION OF' in sql]
+        self.assertEqual(len(partitions), 4)
+        self.assertIn('"todos_todo_y2025m12"', partitions[1])
+        self.assertIn("FROM ('2025-12-01') TO ('2026-01-01')", partitions[1])
+        self.assertIn("FROM ('2026-01-01') TO ('2026-02-01')", partitions[2])
+        self.assertTrue(partitions[-1].endswith('DEFAULT'))
+
+    def test_model_indexes_are_recreated_and_renamed_on_swap(self):
+        """モデルのインデックスをすべてパーティションテーブルに作り、入れ替え時に元の名前を付け替える"""
+        statements = partitioning.create_table_sql(connection, 'hash', 4)
+        swap = partitioning.swap_sql(connection)
+
+        self.assertTrue(Todo._meta.indexes)
+        for index in Todo._meta.indexes:
+            with self.subTest(index=index.name):
+                created = [
+                    sql for sql in statements
+                    if sql.startswith(f'CREATE INDEX "{index.name}_p" ON "todos_todo_partitioned"')
+                ]
+                self.assertEqual(len(created), 1)
+                self.assertIn(f'ALTER INDEX "{index.name}" RENAME TO "{index.name}_old"', swap)
+                self.assertIn(f'ALTER INDEX "{index.name}_p" RENAME TO "{index.name}"', swap)
+        live = next(sql for sql in statements if '"todo_live_user_created_idx_p"' in sql)
+        self.assertIn('WHERE "deleted_at" IS NULL', live)
+
+
+class PartitionAwareServiceTest(TestCase):
+    """1行の更新・削除がパーティションキーを条件に含めることのテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        self.todo = Todo.objects.create(user=self.user, todo_title='タスク')
+
+    def tearDown(self):
+        cache.clear()
+
+    def _write_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith(('UPDATE', 'DELETE'))
+        ]
+
+    @partitioned('range')
+    def test_range_writes_include_created_at(self):
+        """range: 更新・増減・削除の条件に created_at を含める"""
+        for func in (
+            lambda: TodoService.update_todo(self.todo.id, self.user, {'todo_title': '更新'}),
+            lambda: TodoService.update_todo(self.todo.id, self.user, {'progress': 10}, expected_version=2),
+            lambda: TodoService.increment_progress(self.todo, 5),
+            lambda: TodoService.delete_todo(self.todo.id, self.user),
+        ):
+            sql = self._write_queries(func)
+            self.assertTrue(sql)
+            self.assertTrue(all('"created_at" =' in query for query in sql), sql)
+
+        self.assertFalse(Todo.objects.exists())
+
+    @partitioned('hash')
+    def test_hash_writes_and_reads_include_user_id(self):
+        """hash: 読み取り・更新の条件に user_id を含める"""
+        sql = self._write_queries(
+            lambda: TodoService.update_todo(self.todo.id, self.user, {'todo_title': '更新'})
+        )
+        self.assertTrue(all('"user_id" =' in query for query in sql))
+        self.assertIn('"user_id" =', str(TodoService.get_user_todos(self.user).query))
+
+        self.todo.refresh_from_db()
+        self.assertEqual((self.todo.todo_title, self.todo.version), ('更新', 2))
+
+    def test_partition_key_fields(self):
+        """パーティション分割しない場合は主キーだけで行を特定する"""
+        self.assertEqual(partitioning.partition_key_fields(), [])
+        with partitioned('range'):
+            self.assertEqual(partitioning.partition_key_fields(), ['created_at'])
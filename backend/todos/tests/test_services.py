@@ -1,8 +1,16 @@
-from django.test import TestCase
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, TransactionTestCase
+from django.db import OperationalError, connection, connections
+from django.db.models import F, QuerySet
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.http import Http404
 from django.core.cache import cache
 from todos.models import Todo
+from todos.exceptions import PreconditionFailed
 from todos.service import TodoService
 
 User = get_user_model()
@@ -173,6 +181,101 @@ class TodoServiceTestCase(TestCase):
         self.assertEqual(updated_todo.priority, Todo.Priority.LOW)
         self.assertEqual(updated_todo.progress, 100)
 
+    def test_update_todo_increments_version(self):
+        """update_todo: 更新のたびにバージョンが進む"""
+        updated_todo = TodoService.update_todo(self.todo1.id, self.user1, {'progress': 60})
+
+        self.assertEqual(updated_todo.version, 2)
+        self.todo1.refresh_from_db()
+        self.assertEqual(self.todo1.version, 2)
+
+    def test_update_todo_with_matching_version(self):
+        """update_todo: バージョン一致時は条件付きUPDATE1回で更新される"""
+        with self.assertNumQueries(2):  # 対象の取得 + 条件付きUPDATE
+            updated_todo = TodoService.update_todo(
+                self.todo1.id, self.user1, {'progress': 60}, expected_version=1
+            )
+
+        self.assertEqual(updated_todo.progress, 60)
+        self.assertEqual(updated_todo.version, 2)
+        self.todo1.refresh_from_db()
+        self.assertEqual((self.todo1.progress, self.todo1.version), (60, 2))
+
+    def test_update_todo_with_stale_version(self):
+        """update_todo: バージョン不一致は PreconditionFailed で更新しない"""
+        TodoService.update_todo(self.todo1.id, self.user1, {'progress': 60})
+
+        with self.assertRaises(PreconditionFailed):
+            TodoService.update_todo(
+                self.todo1.id, self.user1, {'progress': 10}, expected_version=1
+            )
+
+        self.todo1.refresh_from_db()
+        self.assertEqual(self.todo1.progress, 60)
+
+    def test_update_todo_with_version_of_other_user_todo(self):
+        """update_todo: 他人のタスクはバージョン指定があっても404"""
+        with self.assertRaises(Http404):
+            TodoService.update_todo(
+                self.todo1.id, self.user2, {'progress': 10}, expected_version=1
+            )
+
+    # ============================================
+    # increment_progress のテスト
+    # ============================================
+
+    def test_increment_progress_in_single_statement(self):
+        """increment_progress: 事前の取得なしに1文の UPDATE で加算し、読み直した新しい値を返す"""
+        with CaptureQueriesContext(connection) as ctx:
+            todo = TodoService.increment_progress(self.todo1, 15)
+
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries if 'todos_todo' in q['sql']]
+        self.assertEqual(statements, ['UPDATE', 'SELECT'])
+
+        self.assertEqual((todo.progress, todo.version), (65, 2))
+        self.todo1.refresh_from_db()
+        self.assertEqual(self.todo1.progress, 65)
+
+    def test_increment_progress_uses_returning_on_postgresql(self):
+        """increment_progress: PostgreSQLでは UPDATE ... RETURNING の1文だけを発行する"""
+        connection = MagicMock(vendor='postgresql')
+        connection.ops.quote_name = lambda name: f'"{name}"'
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (3, 65, 2)
+
+        with patch('todos.service.connections', {'default': connection}):
+            todo = TodoService.increment_progress(self.todo1, 15)
+
+        cursor.execute.assert_called_once()
+        sql, params = cursor.execute.call_args.args
+        self.assertTrue(sql.startswith('UPDATE "todos_todo" SET progress = LEAST(100, GREATEST(0, progress + %s))'))
+        self.assertIn('deleted_at IS NULL', sql)
+        self.assertTrue(sql.endswith('RETURNING priority, progress, version'))
+        self.assertEqual(params[0], 15)
+        self.assertEqual((todo.priority, todo.progress, todo.version), ('HIGH', 65, 2))
+
+    def test_increment_progress_is_clamped_in_sql(self):
+        """increment_progress: 0〜100の範囲に丸められる"""
+        self.assertEqual(TodoService.increment_progress(self.todo1, 80).progress, 100)
+        self.assertEqual(TodoService.increment_progress(self.todo1, -100).progress, 0)
+
+    def test_increment_progress_uses_current_db_value(self):
+        """increment_progress: 手元の値ではなくDBの現在値に加算する"""
+        stale = Todo.objects.get(id=self.todo1.id)
+        Todo.objects.filter(id=self.todo1.id).update(progress=70)
+
+        self.assertEqual(TodoService.increment_progress(stale, 10).progress, 80)
+
+    def test_increment_progress_keeps_cached_stats_consistent(self):
+        """increment_progress: キャッシュ済みの統計が集計結果と一致する"""
+        TodoService.get_progress_stats(self.user1)
+
+        TodoService.increment_progress(self.todo1, -40)
+
+        cached = TodoService.get_progress_stats(self.user1)
+        cache.clear()
+        self.assertEqual(cached, TodoService.get_progress_stats(self.user1))
+
     # ============================================
     # delete_todo のテスト
     # ============================================
@@ -311,4 +414,75 @@ class TodoServiceTestCase(TestCase):
         
         # HIGHが3つ、他は集計されない
         self.assertEqual(stats_dict.get('HIGH', 0), 3)
-        self.assertNotIn('LOW', stats_dict)
\ No newline at end of file
+        self.assertNotIn('LOW', stats_dict)
+    # ============================================
+    # 統計キャッシュの差分更新のテスト
+    # ============================================
+
+    def test_write_updates_cached_stats_by_delta(self):
+        """書き込み: キャッシュ済みの統計は差分で更新され、集計結果と一致する"""
+        TodoService.get_priority_stats(self.user1)
+        TodoService.get_progress_stats(self.user1)
+
+        TodoService.create_todo(self.user1, {'todo_title': '新規', 'priority': Todo.Priority.LOW, 'progress': 30})
+        TodoService.update_todo(self.todo1.id, self.user1, {'progress': 90})
+        TodoService.delete_todo(self.todo2.id, self.user1)
+
+        with self.assertNumQueries(0):
+            cached = TodoService.get_stats(self.user1)
+
+        cache.clear()
+        self.assertEqual(cached, TodoService.get_stats(self.user1))
+
+    def test_write_with_cold_cache_does_not_create_partial_stats(self):
+        """書き込み: 統計が未キャッシュなら差分は適用せず、次回集計し直す"""
+        TodoService.create_todo(self.user1, {'todo_title': '新規', 'priority': Todo.Priority.LOW})
+
+        stats = TodoService.get_priority_stats(self.user1)
+        stats_dict = {item['priority']: item['count'] for item in stats}
+
+        self.assertEqual(stats_dict, {'HIGH': 1, 'MEDIUM': 1, 'LOW': 1})
+
+
+class TodoServiceConcurrencyTestCase(TransactionTestCase):
+    """別の接続からの書き込みと交錯する更新のテスト"""
+
+    def test_unconditional_update_returns_its_own_version(self):
+        """無条件の更新の UPDATE と応答のバージョンの読み取りの間に他の書き込みが入らない"""
+        user = User.objects.create_user(email='user@example.com', password='testpass123')
+        todo = Todo.objects.create(user=user, todo_title='タスク')
+        main = threading.current_thread()
+        other_started, other_done = threading.Event(), threading.Event()
+        original_update = QuerySet.update
+
+        def other_writer():
+            # 別の接続で同じTodoを更新する（ロック中は待って再試行）
+            try:
+                while True:
+                    try:
+                        Todo.objects.filter(id=todo.id).update(todo_title='他の書き込み', version=F('version') + 1)
+                        return
+                    except OperationalError:
+                        other_started.set()
+                        time.sleep(0.01)
+            finally:
+                other_started.set()
+                other_done.set()
+                connections.close_all()
+
+        other = threading.Thread(target=other_writer)
+
+        def update_then_interleave(queryset, **kwargs):
+            result = original_update(queryset, **kwargs)
+            if threading.current_thread() is main and not other.is_alive() and not other_done.is_set():
+                # UPDATE の直後に他の書き込みを始め、試みるまで（または終わるまで）待つ
+                other.start()
+                other_started.wait(1)
+            return result
+
+        with patch.object(QuerySet, 'update', update_then_interleave):
+            updated = TodoService.update_todo(todo.id, user, {'todo_title': '自分の書き込み'})
+        other.join(5)
+
+        self.assertEqual(updated.version, 2)
+        self.assertEqual(Todo.objects.get(id=todo.id).version, 3)
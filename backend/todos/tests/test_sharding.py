@@ -0,0 +1,277 @@
+from importlib import import_module
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, migrations
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from todos.coalescing import get_progress_coalescer
+from todos.models import ArchivedTodo, Todo, TodoShardPlacement
+from todos.service import TodoService
+from users.services import UserCommandService
+from todos.sharding import (
+    HashRing,
+    count_todos_by_priority,
+    count_todos_by_shard,
+    get_shard_directory,
+)
+
+User = get_user_model()
+
+
+class HashRingTestCase(TestCase):
+    """コンシステントハッシュのテスト"""
+
+    def test_adding_shard_moves_only_some_keys_to_new_shard(self):
+        """シャードを追加しても、移動するキーは一部で、移動先はすべて新しいシャード"""
+        before = HashRing(['a', 'b'])
+        after = HashRing(['a', 'b', 'c'])
+
+        moved = [key for key in range(3000) if before.node_for(key) != after.node_for(key)]
+
+        self.assertLess(len(moved), 1500)
+        self.assertTrue(all(after.node_for(key) == 'c' for key in moved))
+
+    def test_keys_are_spread_over_shards(self):
+        """キーは各シャードに分散する"""
+        ring = HashRing(['a', 'b'])
+        counts = {'a': 0, 'b': 0}
+        for key in range(2000):
+            counts[ring.node_for(key)] += 1
+
+        self.assertGreater(min(counts.values()), 600)
+
+
+class TodoUserForeignKeyTestCase(TransactionTestCase):
+    """Todo.user の外部キー制約（マイグレーション todos.0003）のテスト"""
+
+    databases = {'default', 'shard_2'}
+
+    def alter_field_sql(self, alias):
+        """0003 の Todo.user の変更で実行するSQL"""
+        migration = import_module('todos.migrations.0003_todo_sharding').Migration
+        operation = next(op for op in migration.operations if isinstance(op, migrations.AlterField))
+        before = MigrationLoader(None, ignore_no_migrations=True).project_state(('todos', '0002_todo_version'))
+        after = before.clone()
+        operation.state_forwards('todos', after)
+        with connections[alias].schema_editor(collect_sql=True, atomic=False) as schema_editor:
+            operation.database_forwards('todos', schema_editor, before, after)
+        return schema_editor.collected_sql
+
+    def test_constraint_is_dropped_only_on_shards(self):
+        """ユーザーのいる default では制約を残し、シャードでだけ外す"""
+        self.assertEqual(self.alter_field_sql('default'), [])
+        self.assertNotEqual(self.alter_field_sql('shard_2'), [])
+
+
+class ShardingTestMixin:
+    def setUp(self):
+        cache.clear()
+        get_shard_directory.cache_clear()
+        self.directory = get_shard_directory()
+        self.user = User.objects.create_user(email='user1@example.com', password='testpass123')
+        self.other_user = User.objects.create_user(email='user2@example.com', password='testpass123')
+        self.directory.set_placement(self.user.id, 'shard_2')
+        self.directory.set_placement(self.other_user.id, 'default')
+
+    def tearDown(self):
+        get_shard_directory.cache_clear()
+        cache.clear()
+
+
+@override_settings(TODO_SHARDS=['default', 'shard_2'])
+class TodoShardingTestCase(ShardingTestMixin, TestCase):
+    """ユーザー単位のシャーディングのテスト（default と shard_2 は別のSQLite）"""
+
+    databases = {'default', 'shard_2'}
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_api_reads_and_writes_use_user_shard(self):
+        """APIでの作成・取得・更新・削除はユーザーのシャードに対して行う"""
+        response = self.client.post('/api/v1/todos/', {'todo_title': 'タスク'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        todo_id = response.data['id']
+        self.assertTrue(Todo.objects.using('shard_2').filter(id=todo_id).exists())
+        self.assertFalse(Todo.objects.using('default').filter(id=todo_id).exists())
+
+        self.assertEqual([todo['id'] for todo in self.client.get('/api/v1/todos/').data], [todo_id])
+
+        response = self.client.patch(f'/api/v1/todos/{todo_id}/', {'todo_title': '更新'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(
+            f'/api/v1/todos/{todo_id}/', {'progress_delta': 30}, format='json',
+            HTTP_IF_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        todo = Todo.objects.using('shard_2').get(id=todo_id)
+        self.assertEqual((todo.todo_title, todo.progress), ('更新', 30))
+
+        self.assertEqual(self.client.get('/api/v1/todos/stats/').data, [{'priority': 'MEDIUM', 'count': 1}])
+
+        response = self.client.delete(f'/api/v1/todos/{todo_id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Todo.objects.using('shard_2').exists())
+
+    def test_async_reads_use_user_shard(self):
+        """非同期版の読み取りもユーザーのシャードから行う"""
+        todo = TodoService.create_todo(self.user, {'todo_title': 'タスク'})
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+        listing = self.client.get('/api/v1/async/todos/', **auth)
+        detail = self.client.get(f'/api/v1/async/todos/{todo.id}/', **auth)
+        stats = self.client.get('/api/v1/async/todos/stats/', **auth)
+
+        self.assertEqual([item['id'] for item in listing.json()], [todo.id])
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+        self.assertEqual(stats.json(), [{'priority': 'MEDIUM', 'count': 1}])
+
+    def test_other_users_todo_on_other_shard_is_not_found(self):
+        """他のユーザーのTodoは、IDが分かっても取得できない"""
+        other = TodoService.create_todo(self.other_user, {'todo_title': '他人のタスク'})
+
+        response = self.client.get(f'/api/v1/todos/{other.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_ids_are_unique_across_shards(self):
+        """TodoのIDはシャードをまたいで一意"""
+        ids = [
+            TodoService.create_todo(user, {'todo_title': 'タスク'}).id
+            for user in (self.user, self.other_user, self.user, self.other_user)
+        ]
+
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_user_without_placement_is_pinned_on_first_write(self):
+        """配置が未記録のユーザーは、初回の書き込み時にハッシュで決まったシャードを記録する"""
+        user = User.objects.create_user(email='user3@example.com', password='testpass123')
+
+        todo = TodoService.create_todo(user, {'todo_title': 'タスク'})
+
+        placement = TodoShardPlacement.objects.get(user=user)
+        self.assertEqual(todo._state.db, placement.shard)
+
+    def test_writes_are_rejected_while_moving(self):
+        """移動中（frozen）のユーザーは読み取りのみでき、書き込みは503"""
+        todo = TodoService.create_todo(self.user, {'todo_title': 'タスク'})
+        self.directory.set_placement(self.user.id, 'shard_2', frozen=True)
+
+        self.assertEqual(self.client.get('/api/v1/todos/').status_code, status.HTTP_200_OK)
+        response = self.client.patch(f'/api/v1/todos/{todo.id}/', {'todo_title': '更新'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = self.client.post('/api/v1/todos/', {'todo_title': 'タスク'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_move_command_moves_todos_between_shards(self):
+        """move_todo_user で移動すると、作成日時などを保ったまま移動先から読み書きできる"""
+        todos = [
+            TodoService.create_todo(self.other_user, {'todo_title': f'タスク{i}', 'progress': i})
+            for i in range(5)
+        ]
+
+        call_command('move_todo_user', user_id=self.other_user.id, to='shard_2',
+                     chunk_size=2, grace=0, stdout=StringIO())
+
+        self.assertFalse(Todo.objects.using('default').filter(user=self.other_user).exists())
+        moved = {todo.id: todo for todo in Todo.objects.using('shard_2').filter(user=self.other_user)}
+        self.assertEqual(set(moved), {todo.id for todo in todos})
+        for todo in todos:
+            self.assertEqual(moved[todo.id].created_at, todo.created_at)
+            self.assertEqual(moved[todo.id].progress, todo.progress)
+        self.assertEqual(TodoShardPlacement.objects.get(user=self.other_user).shard, 'shard_2')
+        self.assertFalse(TodoShardPlacement.objects.get(user=self.other_user).frozen)
+
+        client = APIClient()
+        client.force_authenticate(user=self.other_user)
+        self.assertEqual(len(client.get('/api/v1/todos/').data), 5)
+        response = client.patch(f'/api/v1/todos/{todos[0].id}/', {'todo_title': '移動後'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_move_command_moves_archive(self):
+        """アーカイブ済みのタスクも一緒に移動する"""
+        todo = TodoService.create_todo(self.other_user, {'todo_title': 'タスク', 'progress': 100})
+        ArchivedTodo.objects.create(
+            id=todo.id + 1, user=self.other_user, todo_title='アーカイブ', priority='LOW',
+            created_at=todo.created_at, completed_at=todo.updated_at,
+        )
+
+        call_command('move_todo_user', user_id=self.other_user.id, to='shard_2', grace=0, stdout=StringIO())
+
+        self.assertFalse(ArchivedTodo.objects.using('default').exists())
+        self.assertEqual(TodoService.get_archived_todos(self.other_user)[0].todo_title, 'アーカイブ')
+
+    def test_move_command_rerun_cleans_up_source(self):
+        """切り替え後に中断した場合は、再実行で移動元に残った行を削除する"""
+        todo = TodoService.create_todo(self.user, {'todo_title': 'タスク'})
+        Todo.objects.using('default').bulk_create([
+            Todo(id=todo.id, user=self.user, todo_title='タスク')
+        ])
+
+        call_command('move_todo_user', user_id=self.user.id, to='shard_2', stdout=StringIO())
+
+        self.assertFalse(Todo.objects.using('default').exists())
+        self.assertTrue(Todo.objects.using('shard_2').filter(id=todo.id).exists())
+
+    def test_user_purge_deletes_todos_on_user_shard(self):
+        """削除要求されたユーザーのTodoは、ユーザーのシャードからバッチ単位で削除する"""
+        TodoService.create_todo(self.user, {'todo_title': 'タスク'})
+        UserCommandService.delete_user(self.user)
+
+        self.assertTrue(UserCommandService.purge_user(self.user.id))
+
+        self.assertFalse(Todo.objects.using('shard_2').exists())
+        self.assertFalse(TodoShardPlacement.objects.filter(user_id=self.user.id).exists())
+
+    def test_user_deletion_deletes_todos_on_other_shards(self):
+        """ユーザーを削除すると、default 以外のシャードのTodoも削除される"""
+        TodoService.create_todo(self.user, {'todo_title': 'タスク'})
+
+        self.user.delete()
+
+        self.assertFalse(Todo.objects.using('shard_2').exists())
+
+    @override_settings(
+        TODO_PROGRESS_BUFFER='todos.coalescing.InMemoryProgressBuffer',
+        TODO_PROGRESS_FLUSH_INTERVAL=None,
+    )
+    def test_coalesced_progress_is_written_to_user_shard(self):
+        """まとめ書きの進捗率はユーザーのシャードへ反映し、移動中のユーザーの分は残す"""
+        get_progress_coalescer.cache_clear()
+        self.addCleanup(get_progress_coalescer.cache_clear)
+        todo = TodoService.create_todo(self.user, {'todo_title': 'タスク'})
+        TodoService.update_todo(todo.id, self.user, {'progress': 40}, coalesce=True)
+
+        self.directory.set_placement(self.user.id, 'shard_2', frozen=True)
+        self.assertEqual(get_progress_coalescer().flush(), 0)
+
+        self.directory.set_placement(self.user.id, 'shard_2')
+        self.assertEqual(get_progress_coalescer().flush(), 1)
+        self.assertEqual(Todo.objects.using('shard_2').get(id=todo.id).progress, 40)
+
+
+@override_settings(TODO_SHARDS=['default', 'shard_2'])
+class TodoShardFanOutTestCase(ShardingTestMixin, TransactionTestCase):
+    """全シャードへの横断クエリのテスト（別スレッドから読むためコミット済みのデータで行う）"""
+
+    databases = {'default', 'shard_2'}
+
+    def test_counts_are_collected_from_all_shards(self):
+        """シャードごとの件数と、全シャード合計の優先度別件数"""
+        TodoService.create_todo(self.user, {'todo_title': 'タスク1', 'priority': 'HIGH'})
+        TodoService.create_todo(self.user, {'todo_title': 'タスク2'})
+        TodoService.create_todo(self.other_user, {'todo_title': 'タスク3', 'priority': 'HIGH'})
+
+        self.assertEqual(count_todos_by_shard(), {
+            'default': {'todos': 1, 'users': 1},
+            'shard_2': {'todos': 2, 'users': 1},
+        })
+        self.assertEqual(count_todos_by_priority(), {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2})
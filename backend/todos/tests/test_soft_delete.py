@@ -0,0 +1,113 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from todos.models import Todo
+from todos.purge import purge_deleted_todos
+from todos.service import TodoService
+
+User = get_user_model()
+
+
+class TodoSoftDeleteTest(TestCase):
+    """Todoの論理削除のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.todo = Todo.objects.create(user=self.user, todo_title='削除する', priority=Todo.Priority.HIGH)
+        self.other = Todo.objects.create(user=self.user, todo_title='残す')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_delete_marks_row_deleted(self):
+        """削除は deleted_at を設定する1行の UPDATE で、一覧・統計・取得から除かれる"""
+        self.client.get('/api/v1/todos/stats/')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.delete(f'/api/v1/todos/{self.todo.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(any(q['sql'].startswith('DELETE') for q in ctx.captured_queries))
+
+        row = Todo._base_manager.get(id=self.todo.id)
+        self.assertIsNotNone(row.deleted_at)
+        self.assertEqual(row.version, 2)
+        self.assertEqual([todo['id'] for todo in self.client.get('/api/v1/todos/').json()], [self.other.id])
+        self.assertEqual(self.client.get(f'/api/v1/todos/{self.todo.id}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/todos/stats/').json(), [{'priority': 'MEDIUM', 'count': 1}])
+        # 削除済みのタスクは再度削除・更新できない
+        self.assertEqual(self.client.delete(f'/api/v1/todos/{self.todo.id}/').status_code, 404)
+        self.assertEqual(
+            self.client.patch(f'/api/v1/todos/{self.todo.id}/', {'progress': 10}, format='json').status_code, 404
+        )
+
+    def test_deleted_endpoint_lists_deletions_since(self):
+        """同期クライアントは since 以降に削除されたタスクのIDを取得できる"""
+        since = timezone.now() - timedelta(seconds=1)
+        TodoService.delete_todo(self.todo.id, self.user)
+
+        response = self.client.get('/api/v1/todos/deleted/', {'since': since.isoformat()})
+        self.assertEqual([row['id'] for row in response.json()], [self.todo.id])
+        later = (timezone.now() + timedelta(seconds=1)).isoformat()
+        self.assertEqual(self.client.get('/api/v1/todos/deleted/', {'since': later}).json(), [])
+        self.assertEqual(self.client.get('/api/v1/todos/deleted/').status_code, 400)
+
+    def test_deleted_endpoint_rejects_invalid_since(self):
+        """存在しない日時・エンコードされていない "+" のタイムゾーンは400"""
+        for since in ('2024-13-01T00:00:00', '2024-02-30T00:00:00+09:00', 'yesterday'):
+            with self.subTest(since=since):
+                self.assertEqual(self.client.get('/api/v1/todos/deleted/', {'since': since}).status_code, 400)
+        # "+" はクエリ文字列では空白になる
+        self.assertEqual(self.client.get('/api/v1/todos/deleted/?since=2024-01-01T00:00:00+09:00').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/todos/deleted/?since=2024-01-01T00:00:00%2B09:00').status_code, 200)
+
+    @override_settings(TODO_SOFT_DELETE=False)
+    def test_hard_delete_when_disabled(self):
+        """TODO_SOFT_DELETE が無効なら従来どおり行を削除する"""
+        TodoService.delete_todo(self.todo.id, self.user)
+
+        self.assertFalse(Todo._base_manager.filter(id=self.todo.id).exists())
+
+
+class TodoPurgeTest(TestCase):
+    """論理削除したTodoの物理削除のテスト"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+        long_ago = timezone.now() - timedelta(days=30)
+        self.old_ids = [
+            Todo.objects.create(user=self.user, todo_title=f'古い削除{i}').id for i in range(5)
+        ]
+        Todo.objects.filter(id__in=self.old_ids).update(deleted_at=long_ago)
+        self.recent = Todo.objects.create(user=self.user, todo_title='最近の削除')
+        Todo.objects.filter(id=self.recent.id).update(deleted_at=timezone.now())
+        self.live = Todo.objects.create(user=self.user, todo_title='未削除')
+
+    def test_purges_old_deletions_in_batches(self):
+        """削除から指定日数が過ぎた行だけを batch_size 件ずつ削除する"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(purge_deleted_todos(7, batch_size=2), {'default': 5})
+
+        deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(
+            set(Todo._base_manager.values_list('id', flat=True)), {self.recent.id, self.live.id}
+        )
+
+    def test_command_limits_batches(self):
+        """--max-batches で1回の実行で削除する量を抑えられる"""
+        out = StringIO()
+        call_command('purge_deleted_todos', days=7, batch_size=2, interval=0, max_batches=1, stdout=out)
+
+        self.assertIn('2 todos purged', out.getvalue())
+        self.assertEqual(Todo._base_manager.filter(id__in=self.old_ids).count(), 3)
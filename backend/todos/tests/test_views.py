@@ -2,6 +2,9 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from todos.models import Todo
 
 User = get_user_model()
@@ -265,4 +268,182 @@ class TodoViewSetTestCase(TestCase):
         
         # それぞれのタスク数が正しい
         self.assertEqual(user1_count, 2)
-        self.assertEqual(user2_count, 1)
\ No newline at end of file
+        self.assertEqual(user2_count, 1)
+
+class TodoViewSetStatsEnvelopeTestCase(TestCase):
+    """書き込みレスポンスへの統計同梱（?include_stats=true）のテスト"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.todo = Todo.objects.create(
+            user=self.user,
+            todo_title='既存のタスク',
+            priority=Todo.Priority.HIGH,
+            progress=50
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_create_without_opt_in_keeps_plain_response(self):
+        """作成: 指定がなければ従来どおりTodoのみを返す"""
+        response = self.client.post('/api/v1/todos/', {'todo_title': '新しいタスク'})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['todo_title'], '新しいタスク')
+        self.assertNotIn('stats', response.data)
+
+    def test_create_returns_updated_stats(self):
+        """作成: 統計が作成後の値で返る"""
+        response = self.client.post(
+            '/api/v1/todos/?include_stats=true',
+            {'todo_title': '新しいタスク', 'priority': 'LOW', 'progress': 90}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['todo']['todo_title'], '新しいタスク')
+        priority = {item['priority']: item['count'] for item in response.data['stats']['priority']}
+        self.assertEqual(priority, {'HIGH': 1, 'LOW': 1})
+        self.assertEqual(response.data['stats']['progress']['range_41_60'], 1)
+        self.assertEqual(response.data['stats']['progress']['range_81_100'], 1)
+
+    def test_update_applies_delta_without_reaggregating(self):
+        """更新: キャッシュ済みの統計は集計をやり直さずに差分で更新される"""
+        # 統計をキャッシュに載せておく
+        self.client.get('/api/v1/todos/stats/')
+        self.client.get('/api/v1/todos/progress-stats/')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/v1/todos/{self.todo.id}/?include_stats=true',
+                {'priority': 'MEDIUM', 'progress': 10}
+            )
+
+        # 集計クエリは発行されない
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['todo']['progress'], 10)
+        self.assertEqual(response.data['stats']['priority'], [{'priority': 'MEDIUM', 'count': 1}])
+        self.assertEqual(response.data['stats']['progress']['range_0_20'], 1)
+        self.assertEqual(response.data['stats']['progress']['range_41_60'], 0)
+
+    def test_delete_returns_stats_with_200(self):
+        """削除: 統計を本文に含めて200を返す"""
+        response = self.client.delete(f'/api/v1/todos/{self.todo.id}/?include_stats=true')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['todo'])
+        self.assertEqual(response.data['stats']['priority'], [])
+        self.assertEqual(sum(response.data['stats']['progress'].values()), 0)
+
+
+class TodoViewSetConcurrencyTestCase(TestCase):
+    """ETag / If-Match による楽観的同時実行制御のテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.todo = Todo.objects.create(user=self.user, todo_title='タスク', progress=0)
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/v1/todos/{self.todo.id}/'
+
+    def test_retrieve_returns_etag(self):
+        """詳細取得: バージョンを ETag として返す"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(response.data['version'], 1)
+
+    def test_update_with_matching_if_match(self):
+        """更新: If-Match が一致すれば更新し、新しい ETag を返す"""
+        response = self.client.patch(self.url, {'progress': 30}, HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertEqual(response.data['progress'], 30)
+
+    def test_concurrent_update_with_stale_if_match_returns_412(self):
+        """更新: 先に別の更新が入った場合、古い If-Match の更新は412で上書きしない"""
+        # スライダーからの更新
+        self.client.patch(self.url, {'progress': 30}, HTTP_IF_MATCH='"1"')
+        # 編集モーダルが古いバージョンのまま送信
+        response = self.client.patch(self.url, {'todo_title': '編集'}, HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.todo_title, 'タスク')
+        self.assertEqual(self.todo.progress, 30)
+
+    def test_update_without_if_match_is_unconditional(self):
+        """更新: If-Match なしは従来どおり無条件に更新"""
+        response = self.client.patch(self.url, {'progress': 30})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 2)
+
+    def test_update_with_malformed_if_match_returns_412(self):
+        """更新: 解釈できない If-Match は412"""
+        response = self.client.patch(self.url, {'progress': 30}, HTTP_IF_MATCH='"abc"')
+
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+
+class TodoViewSetProgressDeltaTestCase(TestCase):
+    """進捗率の増減操作（progress_delta）のテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.todo = Todo.objects.create(user=self.user, todo_title='タスク', progress=50)
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/v1/todos/{self.todo.id}/'
+
+    def test_increment_returns_new_value(self):
+        """増減: 加算後の値を返す"""
+        response = self.client.patch(self.url, {'progress_delta': 20})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['progress'], 70)
+        self.assertNotIn('progress_delta', response.data)
+        self.assertEqual(response['ETag'], '"2"')
+
+    def test_decrement_is_clamped(self):
+        """増減: 0未満にはならない"""
+        response = self.client.patch(self.url, {'progress_delta': -80})
+
+        self.assertEqual(response.data['progress'], 0)
+
+    def test_delta_with_other_fields_is_rejected(self):
+        """増減: 他の項目との同時指定は400"""
+        response = self.client.patch(self.url, {'progress_delta': 10, 'progress': 20})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('progress_delta', response.data)
+
+    def test_delta_on_create_is_rejected(self):
+        """増減: 作成時は指定できない"""
+        response = self.client.post('/api/v1/todos/', {'todo_title': '新規', 'progress_delta': 10})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delta_on_other_users_todo_returns_404(self):
+        """増減: 他人のタスクは404"""
+        other = User.objects.create_user(email='user2@example.com', password='testpass123')
+        self.client.force_authenticate(user=other)
+
+        response = self.client.patch(self.url, {'progress_delta': 10})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
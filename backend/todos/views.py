@@ -1,10 +1,15 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .serializers import TodoSerializer
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from .serializers import ArchivedTodoSerializer, TodoSerializer
 from .service import TodoService
+from .exceptions import PreconditionFailed
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from django.db.models import Count
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from config.db.replicas import replica_reads
 
 class TodoViewSet(viewsets.ModelViewSet):
     serializer_class = TodoSerializer
@@ -14,6 +19,91 @@ class TodoViewSet(viewsets.ModelViewSet):
         # 認可：本人のタスクのみをService層から取得
         return TodoService.get_user_todos(self.request.user)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated and self.request.method in SAFE_METHODS:
+            # 読み取りにもまとめ書き待ちの進捗率を反映する
+            # （書き込みの応答はService層が返した反映後・バッファ後の値をそのまま返す）
+            context['pending_progress'] = TodoService.get_pending_progress(self.request.user)
+        return context
+
+    def _include_archived(self):
+        """?include_archived=true 指定時は一覧・統計にアーカイブ済みのタスクも含める"""
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true')
+
+    def _include_stats(self):
+        """?include_stats=true 指定時は書き込みレスポンスに最新の統計を同梱する"""
+        return self.request.query_params.get('include_stats', '').lower() in ('1', 'true')
+
+    def _with_stats(self, response):
+        """
+        書き込みレスポンスを {"todo": ..., "stats": {...}} の形式に包む
+
+        統計はService層で差分更新済みのキャッシュから返すため、
+        クライアントは stats / progress-stats を再取得する必要がない
+        """
+        if not self._include_stats():
+            return response
+        response.data = {
+            'todo': response.data,
+            'stats': TodoService.get_stats(self.request.user),
+        }
+        return response
+
+    def _get_expected_version(self):
+        """
+        If-Match ヘッダーから更新の前提となるバージョンを取得
+
+        ヘッダーなし・"*" の場合は None（無条件に更新）。
+        解釈できない値は一致しないものとして412にする。
+        """
+        if_match = self.request.headers.get('If-Match', '').strip()
+        if not if_match or if_match == '*':
+            return None
+        if if_match.startswith('W/'):
+            if_match = if_match[2:]
+        try:
+            return int(if_match.strip('"'))
+        except ValueError:
+            raise PreconditionFailed()
+
+    @staticmethod
+    def _set_etag(response):
+        """レスポンスのTodoのバージョンを ETag ヘッダーとして返す"""
+        if isinstance(response.data, dict) and 'version' in response.data:
+            response['ETag'] = f'"{response.data["version"]}"'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # 一覧は読み取りのみのためレプリカから（直近に書き込んだユーザーはプライマリ）
+        with replica_reads(request.user.id):
+            response = super().list(request, *args, **kwargs)
+            if self._include_archived():
+                # アーカイブは指定時のみ読み、通常のタスクの後ろに並べる
+                archived = TodoService.get_archived_todos(request.user)
+                response.data = [*response.data, *ArchivedTodoSerializer(archived, many=True).data]
+            return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._set_etag(super().retrieve(request, *args, **kwargs))
+
+    def create(self, request, *args, **kwargs):
+        response = self._set_etag(super().create(request, *args, **kwargs))
+        return self._with_stats(response)
+
+    def update(self, request, *args, **kwargs):
+        response = self._set_etag(super().update(request, *args, **kwargs))
+        return self._with_stats(response)
+
+    def destroy(self, request, *args, **kwargs):
+        # アーカイブ済みのタスクも削除できるよう、get_object を介さずService層で探す
+        TodoService.delete_todo(self._get_pk(), request.user)
+        response = Response(status=status.HTTP_204_NO_CONTENT)
+        if not self._include_stats():
+            return response
+        # 削除時は本文を返すため 204 ではなく 200
+        return self._with_stats(Response(None, status=status.HTTP_200_OK))
+
     def perform_create(self, serializer):
         # Service層を介して作成
         todo = TodoService.create_todo(self.request.user, serializer.validated_data)
@@ -21,25 +111,75 @@ class TodoViewSet(viewsets.ModelViewSet):
         serializer.instance = todo
 
     def perform_update(self, serializer):
+        if 'progress_delta' in serializer.validated_data:
+            # 増減操作: 取得済みのインスタンスに対して原子的に加算（追加のSELECTなし）
+            TodoService.increment_progress(
+                serializer.instance, serializer.validated_data['progress_delta']
+            )
+            return
         # Service層を介して更新
-        todo = TodoService.update_todo(self.get_object().id, self.request.user, serializer.validated_data)
+        # If-Match 指定時はバージョン一致を条件に更新（不一致は412）
+        todo = TodoService.update_todo(
+            self.get_object().id,
+            self.request.user,
+            serializer.validated_data,
+            expected_version=self._get_expected_version(),
+            # 統計を同梱する場合は即時に反映する必要があるため、まとめ書きしない
+            coalesce=not self._include_stats(),
+        )
         # serializerのinstanceを設定（レスポンスに含めるため）
         serializer.instance = todo
 
-    def perform_destroy(self, instance):
-        # Service層を介して削除
-        TodoService.delete_todo(instance.id, self.request.user)
+    def _get_pk(self):
+        """URLのタスクID（数値でなければ404）"""
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+
+    @action(detail=True, methods=['post'])
+    def unarchive(self, request, pk=None):
+        """
+        アーカイブ済みのタスクを戻す: POST /api/v1/todos/{id}/unarchive/
+
+        include_archived の一覧に含まれるアーカイブ済みのタスクは、戻した後に取得・更新できる。
+        """
+        todo = TodoService.unarchive_todo(self._get_pk(), request.user)
+        response = self._set_etag(Response(self.get_serializer(todo).data))
+        return self._with_stats(response)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):  # ← request引数を追加
         """統計データの取得: /api/v1/todos/stats/"""
         user = request.user
-        stats = TodoService.get_priority_stats(user)
+        with replica_reads(user.id):
+            stats = TodoService.get_priority_stats(user, include_archived=self._include_archived())
         return Response(stats)
     
     @action(detail=False, methods=['get'], url_path='progress-stats')  # ← 新規追加
     def progress_stats(self, request):
         """進捗率別統計データの取得: /api/v1/todos/progress-stats/"""
         user = request.user
-        stats = TodoService.get_progress_stats(user)
-        return Response(stats)
\ No newline at end of file
+        with replica_reads(user.id):
+            stats = TodoService.get_progress_stats(user, include_archived=self._include_archived())
+        return Response(stats)
+
+    @action(detail=False, methods=['get'])
+    def deleted(self, request):
+        """
+        削除されたタスクの取得: /api/v1/todos/deleted/?since=<ISO 8601日時>
+
+        同期クライアントが前回の同期以降に削除されたタスクを反映するために使う。
+        タイムゾーンを "+09:00" のように指定する場合は、"+" をURLエンコード（%2B）すること
+        （そのままではクエリ文字列で空白として扱われ、日時として解釈できず400になる）。
+        """
+        try:
+            since = parse_datetime(request.query_params.get('since', ''))
+        except ValueError:
+            # 形式は正しいが存在しない日時（13月など）
+            since = None
+        if since is None:
+            raise ValidationError({'since': 'ISO 8601形式の日時を指定してください。'})
+        with replica_reads(request.user.id):
+            deleted = list(TodoService.get_deleted_todos(request.user, since))
+        return Response(deleted)
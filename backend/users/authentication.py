@@ -0,0 +1,89 @@
+from asgiref.sync import sync_to_async
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import CustomUser
+from .user_cache import user_resolution_cache
+
+
+class CachedUserMixin:
+    """
+    トークンからのユーザー取得を UserResolutionCache 経由にする
+
+    リクエストごとの custom_user テーブルへの問い合わせを避ける。
+    """
+
+    def get_user(self, validated_token):
+        # パスワード変更によるトークン失効の確認にはハッシュが必要なため、DBから取得する
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != 'id':
+            return super().get_user(validated_token)
+
+        try:
+            user = user_resolution_cache.resolve(self._get_user_id(validated_token))
+        except CustomUser.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self._check_active(user)
+
+    async def aget_user(self, validated_token):
+        """get_user の非同期版（非同期ビュー用）"""
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != 'id':
+            return await sync_to_async(super().get_user)(validated_token)
+
+        try:
+            user = await user_resolution_cache.aresolve(self._get_user_id(validated_token))
+        except CustomUser.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self._check_active(user)
+
+    @staticmethod
+    def _get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    @staticmethod
+    def _check_active(user):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+class CachedJWTCookieAuthentication(CachedUserMixin, JWTCookieAuthentication):
+    """JWT Cookie認証（ユーザー取得をキャッシュ）"""
+
+    async def aauthenticate(self, request):
+        """
+        authenticate の非同期版（DRFを通さない非同期ビュー用）
+
+        Authorizationヘッダーを優先し、なければCookieのトークンを使う。
+        トークンの検証は署名と有効期限の確認のみのため同期のまま行う。
+
+        Returns:
+            (user, validated_token)。トークンがなければ None
+        """
+        header = self.get_header(request)
+        if header is None:
+            if not rest_auth_settings.JWT_AUTH_COOKIE:
+                return None
+            raw_token = request.COOKIES.get(rest_auth_settings.JWT_AUTH_COOKIE)
+            if rest_auth_settings.JWT_AUTH_COOKIE_ENFORCE_CSRF_ON_UNAUTHENTICATED or (
+                raw_token is not None and rest_auth_settings.JWT_AUTH_COOKIE_USE_CSRF
+            ):
+                self.enforce_csrf(request)
+        else:
+            raw_token = self.get_raw_token(header)
+
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+
+class CachedJWTAuthentication(CachedUserMixin, JWTAuthentication):
+    """JWT Authorizationヘッダー認証（ユーザー取得をキャッシュ）"""
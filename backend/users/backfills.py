@@ -0,0 +1,33 @@
+from django.db import transaction
+
+from config.db.backfill import Backfill, register
+
+from .models import CustomUser
+from .user_cache import user_resolution_cache
+
+
+@register
+class NormalizeUserEmails(Backfill):
+    """
+    既存ユーザーのメールアドレスのドメイン部分を小文字にそろえる
+
+    create_user は登録時に正規化するが、管理画面・データ移行で作られた行は
+    正規化されていない場合がある（大文字小文字違いの重複は一意制約で防がれている）。
+    """
+
+    name = "normalize_user_emails"
+    model = CustomUser
+
+    def process(self, queryset):
+        changed = []
+        for user in queryset.only("id", "email"):
+            email = CustomUser.objects.normalize_email(user.email)
+            if email != user.email:
+                user.email = email
+                changed.append(user)
+        if not changed:
+            return 0
+        CustomUser._base_manager.using(queryset.db).bulk_update(changed, ["email"])
+        for user in changed:
+            transaction.on_commit(lambda user_id=user.pk: user_resolution_cache.invalidate(user_id), using=queryset.db)
+        return len(changed)
@@ -1,40 +1,159 @@
+import threading
+from functools import lru_cache
+
 import resend
 from django.conf import settings
+from django.template.loader import get_template
+from django.utils.module_loading import import_string
+from resend.exceptions import MissingRequiredFieldsError, ValidationError
+
+from .resilience import get_outbound_guard
 
 resend.api_key = settings.RESEND_API_KEY
 
 
+class EmailTemplateRegistry:
+    """
+    メールテンプレート（件名・本文HTML）の登録と、プロセス内でのコンパイル済みキャッシュ
+
+    テンプレートはDjangoテンプレートのため、本文の変数は自動でエスケープされる。
+    件名はHTMLではないためエスケープしないが、改行は取り除く（ヘッダーインジェクション対策）。
+    """
+
+    # テンプレート名 -> (件名テンプレート, 本文テンプレート)
+    TEMPLATES = {
+        "welcome": ("emails/welcome_subject.txt", "emails/welcome.html"),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compiled = {}
+
+    def get(self, name):
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(name)
+                if compiled is None:
+                    subject_path, html_path = self.TEMPLATES[name]
+                    compiled = (get_template(subject_path), get_template(html_path))
+                    self._compiled[name] = compiled
+        return compiled
+
+    def render(self, name, context):
+        """(件名, HTML) を返す"""
+        subject_template, html_template = self.get(name)
+        subject = " ".join(subject_template.render(context).split())
+        return subject, html_template.render(context)
+
+
+email_templates = EmailTemplateRegistry()
+
+
+class ResendTransport:
+    """Resend APIで送信する"""
+
+    def send(self, message):
+        return resend.Emails.send(message)["id"]
+
+    def send_batch(self, messages):
+        response = resend.Batch.send(messages)
+        data = response["data"] if isinstance(response, dict) else response
+        return [item["id"] for item in data]
+
+
+class FakeTransport:
+    """送信せずに記録するだけのトランスポート（テスト・ローカル開発用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = []
+        self.requests = 0
+
+    def send(self, message):
+        return self.send_batch([message])[0]
+
+    def send_batch(self, messages):
+        with self._lock:
+            self.requests += 1
+            start = len(self.sent)
+            self.sent.extend(messages)
+            return [f"fake-{i}" for i in range(start, start + len(messages))]
+
+
+@lru_cache(maxsize=None)
+def get_email_transport():
+    return import_string(settings.EMAIL_TRANSPORT)()
+
+
+def _is_outage(exc) -> bool:
+    """Resend側の障害か（メッセージ自体の誤りはサーキットを開く理由にしない）"""
+    return not isinstance(exc, (ValidationError, MissingRequiredFieldsError))
+
+
+def _guarded(func, *args):
+    """
+    サーキットブレーカー・バルクヘッド経由で送信する
+
+    開いている間・同時送信数の上限に達している間は送信せずに即座に失敗し、
+    Webhookは500を返してQStashの再送に任せる
+    """
+    return get_outbound_guard("resend").call(func, *args, is_failure=_is_outage)
+
+
 class EmailService:
     """Resendを使ったメール送信サービス"""
-    
+
+    FROM_ADDRESS = "noreply@yourdomain.com"  # 検証済みドメイン
+
+    @staticmethod
+    def _build_welcome_email(email: str, first_name: str) -> dict:
+        subject, html = email_templates.render("welcome", {
+            "first_name": first_name,
+            "frontend_url": settings.FRONTEND_URL,
+        })
+        return {
+            "from": EmailService.FROM_ADDRESS,
+            "to": [email],
+            "subject": subject,
+            "html": html,
+        }
+
     @staticmethod
     def send_welcome_email(email: str, first_name: str):
         """ウェルカムメール送信"""
         try:
-            params = {
-                "from": "noreply@yourdomain.com",  # 検証済みドメイン
-                "to": [email],
-                "subject": f"Welcome to Django React App, {first_name}!",
-                "html": f"""
-                <html>
-                    <body>
-                        <h1>Welcome, {first_name}!</h1>
-                        <p>Thank you for registering with Django React App.</p>
-                        <p>We're excited to have you on board!</p>
-                        <p>
-                            <a href="{settings.FRONTEND_URL}/dashboard">
-                                Get Started
-                            </a>
-                        </p>
-                    </body>
-                </html>
-                """
-            }
-            
-            response = resend.Emails.send(params)
-            return {"success": True, "id": response["id"]}
-            
+            message_id = _guarded(
+                get_email_transport().send, EmailService._build_welcome_email(email, first_name)
+            )
+            return {"success": True, "id": message_id}
+
         except Exception as e:
             # ログに記録（本番環境ではSentryなどに送信）
             print(f"Failed to send email: {str(e)}")
-            return {"success": False, "error": str(e)}
\ No newline at end of file
+            return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def send_welcome_emails(recipients: list):
+        """
+        複数のウェルカムメールを EMAIL_BATCH_SIZE 件ずつのバッチリクエストで送信
+
+        Args:
+            recipients: {"email", "first_name"} のリスト
+
+        Returns:
+            recipients と同じ順の結果リスト（send_welcome_email と同じ形式）
+        """
+        transport = get_email_transport()
+        results = []
+        for start in range(0, len(recipients), settings.EMAIL_BATCH_SIZE):
+            chunk = recipients[start:start + settings.EMAIL_BATCH_SIZE]
+            try:
+                message_ids = _guarded(transport.send_batch, [
+                    EmailService._build_welcome_email(r["email"], r["first_name"]) for r in chunk
+                ])
+                results.extend({"success": True, "id": message_id} for message_id in message_ids)
+            except Exception as e:
+                print(f"Failed to send email batch: {str(e)}")
+                results.extend({"success": False, "error": str(e)} for _ in chunk)
+        return results
@@ -3,6 +3,9 @@ from django_ratelimit.exceptions import Ratelimited
 from rest_framework.response import Response
 from rest_framework import status
 
+from .hashing import PasswordHashingBusy
+
+
 def custom_exception_handler(exc, context):
     if isinstance(exc, Ratelimited):
         return Response(
@@ -10,4 +13,11 @@ def custom_exception_handler(exc, context):
             status=status.HTTP_429_TOO_MANY_REQUESTS
         )
 
+    if isinstance(exc, PasswordHashingBusy):
+        # ログイン・登録時のパスワードのハッシュ計算の上限超過（users/hashing.py）
+        return Response(
+            {"detail": "ただいま混み合っています。しばらく時間を置いてから再度お試しください。"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
     return exception_handler(exc, context)
\ No newline at end of file
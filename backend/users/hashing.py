@@ -0,0 +1,87 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from config.metrics import get_metrics
+
+
+class PasswordHashingBusy(Exception):
+    """
+    パスワードのハッシュ計算が混み合っている
+
+    DRFのビューでは users.exceptions.custom_exception_handler が503に変換する。
+    管理画面・管理コマンドなどDRF以外の呼び出し元には依存しないよう、通常の例外にしている。
+    """
+
+
+class PasswordHashingLimiter:
+    """
+    パスワードのハッシュ計算の同時実行数を制限する
+
+    PBKDF2（hashlib）は計算中にGILを解放するため、リクエストのスレッドのまま並列に動く。
+    同時に計算する数を max_workers に、空きを待つ数を max_pending に制限し、
+    ログインが集中してもCPUを使い切ってTodo APIを巻き込まないようにする。
+    上限を超えた要求は待たせずに PasswordHashingBusy で断る。
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._running = threading.BoundedSemaphore(max_workers)
+        self.metrics = get_metrics("password_hashing")
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self.metrics.incr("rejected")
+            raise PasswordHashingBusy()
+        try:
+            submitted_at = time.monotonic()
+            with self._running:
+                started_at = time.monotonic()
+                self.metrics.observe("queue_ms", (started_at - submitted_at) * 1000)
+                try:
+                    return func(*args)
+                finally:
+                    self.metrics.observe("hash_ms", (time.monotonic() - started_at) * 1000)
+        finally:
+            self._slots.release()
+
+    def make_password(self, raw_password):
+        # 使用不可のパスワード（None）はハッシュ計算をしない
+        if raw_password is None:
+            return hashers.make_password(None)
+        return self._run(hashers.make_password, raw_password)
+
+    def check_password(self, user, raw_password):
+        """
+        パスワードを検証し、正しければ必要に応じて現在のハッシュ設定で保存し直す
+
+        Djangoの check_password() は、反復回数の変更やハッシャーの切り替えで
+        ハッシュの更新が必要な場合に setter を呼ぶ。setter は同時実行数の枠を
+        持ったまま呼ばれるため、そこでは印を付けるだけにして、ハッシュの計算と保存は
+        枠を返した後に行う（setter の中で計算すると枠を二重に取る）。
+        保存し直しの計算が上限を超えた場合は、ログインを失敗させずに次回のログインへ回す。
+        """
+        must_update = []
+        is_correct = self._run(hashers.check_password, raw_password, user.password, must_update.append)
+        if is_correct and must_update:
+            try:
+                user.set_password(raw_password)
+            except PasswordHashingBusy:
+                self.metrics.incr("rehash_skipped")
+                return is_correct
+            # ハッシュの更新はパスワード変更として扱わない
+            user._password = None
+            user.save(update_fields=["password"])
+            self.metrics.incr("rehashed")
+        return is_correct
+
+
+@lru_cache(maxsize=None)
+def get_password_hashing_limiter():
+    return PasswordHashingLimiter(
+        max_workers=settings.PASSWORD_HASHING_MAX_WORKERS,
+        max_pending=settings.PASSWORD_HASHING_MAX_PENDING,
+    )
@@ -0,0 +1,86 @@
+import statistics
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from users.models import CustomUser
+from users.services import UserQueryService
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "ログイン・新規登録で使うメールアドレス検索のレイテンシを計測します。"
+        "計測用ユーザーは1トランザクション内で作成し、終了時にロールバックします。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000, help="計測前に用意するユーザー数")
+        parser.add_argument("--iterations", type=int, default=1000, help="各処理の計測回数")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._seed(options["users"], options["batch_size"])
+                self._run(options["users"], options["iterations"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, count, batch_size):
+        # ハッシュ計算のコストを避けるため、全員同じ（使用不可の）パスワードにする
+        password = make_password(None)
+        for start in range(0, count, batch_size):
+            CustomUser.objects.bulk_create(
+                [
+                    CustomUser(email=f"bench-{i}@example.com", password=password)
+                    for i in range(start, min(start + batch_size, count))
+                ]
+            )
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(f"ANALYZE {CustomUser._meta.db_table}")
+        self.stdout.write(f"{count} 件のユーザーを作成しました。")
+
+    def _run(self, count, iterations):
+        step = max(count // iterations, 1)
+        emails = [f"BENCH-{(i * step) % count}@Example.com" for i in range(iterations)]
+
+        # ログイン: ModelBackend.authenticate() が呼ぶ get_by_natural_key
+        self._report("login lookup", [
+            self._time(lambda e=email: CustomUser.objects.get_by_natural_key(e)) for email in emails
+        ])
+        # 新規登録: 重複チェック + INSERT
+        self._report("registration", [
+            self._time(lambda: self._register(f"new-{uuid.uuid4().hex}@example.com"))
+            for _ in range(iterations)
+        ])
+
+        # 関数インデックス（custom_user_email_upper_uniq）が使われていることを確認する
+        self.stdout.write(f"plan:\n{CustomUser.objects.filter_by_email(emails[0]).explain()}")
+
+    @staticmethod
+    def _register(email):
+        if not UserQueryService.email_exists(email):
+            CustomUser.objects.create(email=email, password="!")
+
+    @staticmethod
+    def _time(func):
+        start = time.perf_counter()
+        func()
+        return (time.perf_counter() - start) * 1000
+
+    def _report(self, name, samples):
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        self.stdout.write(
+            f"{name}: p50={statistics.median(samples):.3f}ms "
+            f"p95={p95:.3f}ms max={samples[-1]:.3f}ms"
+        )
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from users.email_service import EmailService, get_email_transport
+
+
+class Command(BaseCommand):
+    help = (
+        "ウェルカムメールの1通ずつの送信とバッチ送信のスループットを計測します。"
+        "送信には FakeTransport を使い、--latency-ms でAPI呼び出し1回あたりの遅延を模擬します。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000)
+        parser.add_argument("--latency-ms", type=float, default=50.0)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        latency = options["latency_ms"] / 1000
+        recipients = [{"email": f"user{i}@example.com", "first_name": f"User{i}"} for i in range(count)]
+
+        with override_settings(EMAIL_TRANSPORT="users.email_service.FakeTransport"):
+            get_email_transport.cache_clear()
+            transport = get_email_transport()
+            send_batch = transport.send_batch
+
+            def slow_send_batch(messages):
+                time.sleep(latency)
+                return send_batch(messages)
+
+            transport.send_batch = slow_send_batch
+            try:
+                start = time.perf_counter()
+                for r in recipients:
+                    EmailService.send_welcome_email(r["email"], r["first_name"])
+                single = time.perf_counter() - start
+                single_requests = transport.requests
+
+                start = time.perf_counter()
+                EmailService.send_welcome_emails(recipients)
+                batch = time.perf_counter() - start
+                batch_requests = transport.requests - single_requests
+            finally:
+                get_email_transport.cache_clear()
+
+        self.stdout.write(f"1通ずつ: {count / single:.1f} 通/秒（API呼び出し {single_requests} 回）")
+        self.stdout.write(f"バッチ:   {count / batch:.1f} 通/秒（API呼び出し {batch_requests} 回）")
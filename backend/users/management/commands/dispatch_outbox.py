@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.outbox import OutboxService
+
+
+class Command(BaseCommand):
+    help = "アウトボックスの送信待ちメッセージを送信します（--loop で常駐ワーカーとして動作）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="送信待ちを監視し続ける")
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        while True:
+            result = OutboxService.dispatch_batch(batch_size)
+            if result["sent"] or result["failed"]:
+                self.stdout.write(f"送信 {result['sent']} 件 / 失敗 {result['failed']} 件")
+
+            if result["sent"] + result["failed"] == batch_size:
+                # まだ残っている可能性があるため待たずに続ける
+                continue
+            if not options["loop"]:
+                return
+            close_old_connections()
+            time.sleep(settings.OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from users.token_blacklist import get_token_blacklist
+
+
+class Command(BaseCommand):
+    help = (
+        "token_blacklistアプリのSQLテーブル（OutstandingToken / BlacklistedToken）を"
+        "一定件数ずつ削除します。既定では期限切れの行のみが対象です。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="1回のDELETEで削除する件数")
+        parser.add_argument("--sleep", type=float, default=0.0, help="チャンク間の待機秒数（DB負荷の調整用）")
+        parser.add_argument(
+            "--import-active",
+            action="store_true",
+            help="削除の前に、期限内の失効済みJTIを TOKEN_BLACKLIST_BACKEND へ移す",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="期限内の行も削除する（--import-active で移行済みの場合に使用）",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        now = timezone.now()
+
+        if options["import_active"]:
+            imported = self._import_active(now, chunk_size)
+            self.stdout.write(f"{imported} 件の失効済みJTIを移行しました。")
+
+        queryset = OutstandingToken.objects.all()
+        if not options["all"]:
+            queryset = queryset.filter(expires_at__lte=now)
+
+        deleted = 0
+        while True:
+            ids = list(queryset.order_by("id").values_list("id", flat=True)[:chunk_size])
+            if not ids:
+                break
+            # BlacklistedToken は CASCADE で同じチャンク分だけ削除される
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            self.stdout.write(f"{deleted} 件削除...")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"{deleted} 件のトークンを削除しました。"))
+
+    def _import_active(self, now, chunk_size):
+        blacklist = get_token_blacklist()
+        imported = 0
+        last_id = 0
+        while True:
+            rows = list(
+                BlacklistedToken.objects.filter(id__gt=last_id, token__expires_at__gt=now)
+                .order_by("id")
+                .values_list("id", "token__jti", "token__expires_at")[:chunk_size]
+            )
+            if not rows:
+                return imported
+            for _, jti, expires_at in rows:
+                blacklist.revoke(jti, expires_at.timestamp())
+            imported += len(rows)
+            last_id = rows[-1][0]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:40
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+from config.db.online_schema import AddUniqueConstraintOnline
+
+
+class Migration(migrations.Migration):
+    # CREATE UNIQUE INDEX CONCURRENTLY はトランザクション内で実行できない
+    atomic = False
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        AddUniqueConstraintOnline(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Upper('email'), name='custom_user_email_upper_uniq'),
+        ),
+    ]
@@ -1,7 +1,13 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Upper
+from django.db.models.lookups import Exact
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .hashing import get_password_hashing_limiter
+
 class CustomUserManager(BaseUserManager):
     """
     カスタムユーザーモデルのためのマネージャー
@@ -40,6 +46,15 @@ class CustomUserManager(BaseUserManager):
         
         return self.create_user(email, password, **extra_fields)
     
+    def filter_by_email(self, email):
+        """
+        メールアドレスで大文字小文字を区別せずに検索
+
+        email__iexact ではなく UPPER(email) = UPPER(%s) の形で検索し、
+        CustomUser.Meta.constraints の関数インデックスを使わせる。
+        """
+        return self.filter(Exact(Upper(self.model.USERNAME_FIELD), Upper(Value(email))))
+
     def get_by_natural_key(self, username):
         """
         【重要】ログイン時のメールアドレス大文字小文字問題を解決
@@ -49,8 +64,7 @@ class CustomUserManager(BaseUserManager):
         
         解決: ログイン時にもメールアドレスを正規化してから検索
         """
-        case_insensitive_username_field = f'{self.model.USERNAME_FIELD}__iexact'
-        return self.get(**{case_insensitive_username_field: username})
+        return self.filter_by_email(username).get()
 
 
 class CustomUser(AbstractUser):
@@ -94,6 +108,53 @@ class CustomUser(AbstractUser):
         db_table = 'custom_user'
         verbose_name = _('user')
         verbose_name_plural = _('users')
+        constraints = [
+            # 大文字小文字違いのメールアドレスの重複登録を防ぎ、
+            # filter_by_email() の検索にインデックスを使わせる
+            models.UniqueConstraint(Upper('email'), name='custom_user_email_upper_uniq'),
+        ]
     
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+    def set_password(self, raw_password):
+        """ハッシュ計算は同時実行数の上限の範囲で行う（users/hashing.py）"""
+        self.password = get_password_hashing_limiter().make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        ログイン時のパスワード検証も同時実行数の上限の範囲で行う
+        ハッシュ設定が更新されていれば、検証に成功した時点で保存し直す
+        """
+        return get_password_hashing_limiter().check_password(self, raw_password)
+
+
+class OutboxMessage(models.Model):
+    """
+    外部サービスへ送るメッセージの送信待ち（トランザクショナル・アウトボックス）
+
+    ユーザー作成などの業務データと同じトランザクションで書き込み、コミット後に
+    dispatch_outbox コマンドが送信する。送信に成功した行は削除する。
+    next_attempt_at が NULL の行は再試行の上限に達したもの（要調査）。
+    """
+
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # 送信待ちの行だけを対象にした部分インデックス
+            models.Index(
+                fields=['next_attempt_at'],
+                name='outbox_pending_idx',
+                condition=models.Q(next_attempt_at__isnull=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.topic}#{self.pk}"
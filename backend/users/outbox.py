@@ -0,0 +1,142 @@
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .qstash_service import QStashService
+
+logger = logging.getLogger(__name__)
+
+# トピック
+WELCOME_EMAIL = "welcome_email"
+USER_PURGE = "user_purge"
+
+
+class OutboxDeliveryError(Exception):
+    """外部サービスへの送信に失敗した（再試行の対象）"""
+
+
+def _send_welcome_emails(messages):
+    # 1回のバッチリクエストで送る。送信後・削除前にプロセスが落ちて再送しても、
+    # QStash側で重複が除かれる
+    results = QStashService.send_welcome_emails_async([
+        {**message.payload, "deduplication_id": f"outbox-{message.pk}"} for message in messages
+    ])
+    return [
+        None if result["success"] else OutboxDeliveryError(result["error"])
+        for result in results
+    ]
+
+
+def _purge_users(messages):
+    # 削除要求（UserCommandService.delete_user）されたユーザーの関連データと本体を削除する
+    from .services import UserCommandService
+
+    errors = []
+    for message in messages:
+        try:
+            UserCommandService.purge_user(message.payload["user_id"])
+            errors.append(None)
+        except Exception as e:
+            errors.append(e)
+    return errors
+
+
+# トピック -> 送信処理（メッセージのリストを受け取り、メッセージごとのエラー（成功は None）を返す）
+HANDLERS = {
+    WELCOME_EMAIL: _send_welcome_emails,
+    USER_PURGE: _purge_users,
+}
+
+
+class OutboxService:
+    """
+    アウトボックスへの書き込みと送信
+    """
+
+    @staticmethod
+    def enqueue(topic: str, payload: dict) -> OutboxMessage:
+        """
+        送信待ちのメッセージを追加
+
+        業務データと同じトランザクション内で呼び出すこと。
+        ロールバックされればメッセージも残らず、コミットされれば必ず送信される。
+        """
+        return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+    @staticmethod
+    def claim_batch(batch_size: int) -> list:
+        """
+        送信時期が来たメッセージを取得し、送信中の間は他のワーカーが取らないよう
+        next_attempt_at を OUTBOX_LEASE_SECONDS 後にずらす（送信中にプロセスが
+        落ちた場合は、その時刻に再び取得される）
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:batch_size]
+            )
+            if messages:
+                OutboxMessage.objects.filter(pk__in=[m.pk for m in messages]).update(
+                    next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+                )
+        return messages
+
+    @staticmethod
+    def dispatch_batch(batch_size: int = None) -> dict:
+        """
+        1バッチ分を送信
+
+        Returns:
+            {'sent': 送信成功数, 'failed': 失敗数}
+        """
+        messages = OutboxService.claim_batch(batch_size or settings.OUTBOX_BATCH_SIZE)
+        by_topic = {}
+        for message in messages:
+            by_topic.setdefault(message.topic, []).append(message)
+
+        sent_ids = []
+        failed = 0
+        for topic, topic_messages in by_topic.items():
+            try:
+                errors = HANDLERS[topic](topic_messages)
+            except Exception as e:
+                errors = [e] * len(topic_messages)
+            for message, error in zip(topic_messages, errors):
+                if error is None:
+                    sent_ids.append(message.pk)
+                    continue
+                logger.warning("Failed to dispatch outbox message %s: %s", message, error)
+                OutboxService._schedule_retry(message, error)
+                failed += 1
+
+        if sent_ids:
+            OutboxMessage.objects.filter(pk__in=sent_ids).delete()
+        return {'sent': len(sent_ids), 'failed': failed}
+
+    @staticmethod
+    def _schedule_retry(message, error):
+        attempts = message.attempts + 1
+        if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            # 上限に達したものは送信対象から外す（next_attempt_at を戻せば再送される）
+            logger.error("Giving up outbox message %s after %d attempts", message, attempts)
+            next_attempt_at = None
+        else:
+            next_attempt_at = timezone.now() + OutboxService._backoff(attempts)
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            attempts=attempts,
+            next_attempt_at=next_attempt_at,
+            last_error=str(error),
+        )
+
+    @staticmethod
+    def _backoff(attempts: int) -> timedelta:
+        """指数バックオフ（上限あり）。同時に失敗したメッセージが一斉に再送されないよう揺らす"""
+        delay = min(settings.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX)
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
@@ -1,34 +1,157 @@
+import json
+from functools import lru_cache
+
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .resilience import BulkheadFullError, CircuitOpenError, get_outbound_guard
+
+# 呼び出さずに即座に失敗した場合も送信失敗として扱い、呼び出し元の再試行に任せる
+GUARD_ERRORS = (requests.exceptions.RequestException, CircuitOpenError, BulkheadFullError)
+
+
+@lru_cache(maxsize=None)
+def get_session() -> requests.Session:
+    """
+    QStash用の共有HTTPセッション（プロセスに1つ）
+
+    keep-alive で接続を使い回し、メッセージごとのTLSハンドシェイクを避ける。
+    接続プール（urllib3）はスレッドセーフで、セッションの状態（Cookie・ヘッダー）は
+    書き換えずにリクエストごとにヘッダーを渡すため、スレッド間で共有できる。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.QSTASH_POOL_MAXSIZE,
+        # 接続確立の失敗のみ再試行する（送信済みかもしれないリクエストは再送しない）
+        max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _is_outage(exc) -> bool:
+    """QStash側の障害か（リクエスト自体の誤りである4xxはサーキットを開く理由にしない）"""
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return exc.response.status_code >= 500 or exc.response.status_code == 429
+    return True
+
+
+def _post(url: str, headers: dict, body, timeout: float) -> requests.Response:
+    """サーキットブレーカー・バルクヘッド経由でPOSTし、エラーステータスは例外にする"""
+    def post():
+        response = get_session().post(url, headers=headers, json=body, timeout=timeout)
+        response.raise_for_status()
+        return response
+
+    return get_outbound_guard("qstash").call(post, is_failure=_is_outage)
 
 
 class QStashService:
     """QStashを使った非同期タスク送信"""
-    
+
     @staticmethod
-    def send_welcome_email_async(email: str, first_name: str):
-        """ウェルカムメール送信をQStash経由で非同期実行"""
-        webhook_url = f"{settings.WEBHOOK_BASE_URL}/api/v1/webhooks/send-welcome-email"
-        
-        payload = {
-            "email": email,
-            "first_name": first_name
+    def _headers(deduplication_id: str = None) -> dict:
+        headers = {
+            "Authorization": f"Bearer {settings.QSTASH_TOKEN}",
+            "Content-Type": "application/json",
+            "Upstash-Forward-Authorization": f"Bearer {settings.QSTASH_TOKEN}",  # Webhook認証用
         }
-        
+        if deduplication_id:
+            headers["Upstash-Deduplication-Id"] = deduplication_id
+        return headers
+
+    @staticmethod
+    def _welcome_email_destination() -> str:
+        return f"{settings.WEBHOOK_BASE_URL}/api/v1/webhooks/send-welcome-email"
+
+    @staticmethod
+    def publish(destination: str, payload: dict, deduplication_id: str = None):
+        """
+        1件のメッセージを送信
+
+        deduplication_id を指定すると、同じIDでの再送はQStash側で破棄される
+        """
         try:
-            response = requests.post(
-                f"https://qstash.upstash.io/v2/publish/{webhook_url}",
-                headers={
-                    "Authorization": f"Bearer {settings.QSTASH_TOKEN}",
-                    "Content-Type": "application/json",
-                    "Upstash-Forward-Authorization": f"Bearer {settings.QSTASH_TOKEN}",  # Webhook認証用
-                },
-                json=payload,
+            response = _post(
+                f"{settings.QSTASH_URL}/v2/publish/{destination}",
+                QStashService._headers(deduplication_id),
+                payload,
                 timeout=10
             )
-            response.raise_for_status()
             return {"success": True, "message_id": response.json().get("messageId")}
-            
-        except requests.exceptions.RequestException as e:
+
+        except GUARD_ERRORS as e:
             print(f"Failed to send message to QStash: {str(e)}")
-            return {"success": False, "error": str(e)}
\ No newline at end of file
+            return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def publish_batch(messages: list):
+        """
+        複数のメッセージを /v2/batch でまとめて送信（QSTASH_BATCH_SIZE 件ずつ）
+
+        Args:
+            messages: (destination, payload, deduplication_id) のリスト
+
+        Returns:
+            messages と同じ順の結果リスト（publish と同じ形式）
+        """
+        results = []
+        for start in range(0, len(messages), settings.QSTASH_BATCH_SIZE):
+            chunk = messages[start:start + settings.QSTASH_BATCH_SIZE]
+            body = []
+            for destination, payload, deduplication_id in chunk:
+                headers = QStashService._headers(deduplication_id)
+                # 認証はバッチ全体のリクエストで行う
+                del headers["Authorization"]
+                body.append({"destination": destination, "headers": headers, "body": json.dumps(payload)})
+
+            try:
+                response = _post(
+                    f"{settings.QSTASH_URL}/v2/batch",
+                    {
+                        "Authorization": f"Bearer {settings.QSTASH_TOKEN}",
+                        "Content-Type": "application/json",
+                    },
+                    body,
+                    timeout=30
+                )
+                results.extend(
+                    {"success": True, "message_id": item.get("messageId")} for item in response.json()
+                )
+            except GUARD_ERRORS as e:
+                print(f"Failed to send batch to QStash: {str(e)}")
+                results.extend({"success": False, "error": str(e)} for _ in chunk)
+        return results
+
+    @staticmethod
+    def send_welcome_email_async(email: str, first_name: str, deduplication_id: str = None):
+        """ウェルカムメール送信をQStash経由で非同期実行"""
+        payload = {
+            "email": email,
+            "first_name": first_name
+        }
+        return QStashService.publish(
+            QStashService._welcome_email_destination(), payload, deduplication_id
+        )
+
+    @staticmethod
+    def send_welcome_emails_async(recipients: list):
+        """
+        複数のウェルカムメール送信を1回のリクエストでまとめて依頼
+
+        Args:
+            recipients: {"email", "first_name", "deduplication_id"(任意)} のリスト
+        """
+        destination = QStashService._welcome_email_destination()
+        return QStashService.publish_batch([
+            (
+                destination,
+                {"email": r["email"], "first_name": r["first_name"]},
+                r.get("deduplication_id"),
+            )
+            for r in recipients
+        ])
@@ -0,0 +1,156 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+from config.metrics import get_metrics
+
+
+class CircuitOpenError(Exception):
+    """サーキットが開いているため呼び出しを行わなかった"""
+
+
+class BulkheadFullError(Exception):
+    """同時呼び出し数の上限に達しているため呼び出しを行わなかった"""
+
+
+class CircuitBreaker:
+    """
+    連続した失敗で呼び出しを止めるサーキットブレーカー
+
+    - closed: 通常。failure_threshold 回連続で失敗すると open へ
+    - open: 呼び出さずに CircuitOpenError。reset_timeout 秒後に half_open へ
+    - half_open: half_open_max_calls 件だけ試しに呼び出し、成功すれば closed、失敗すれば open へ
+
+    状態はプロセスごとに持つ。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, metrics, failure_threshold, reset_timeout, half_open_max_calls=1):
+        self.metrics = metrics
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.metrics.set_gauge("state", self.CLOSED)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+            self._probes = 0
+        return self._state
+
+    def _set_state(self, state):
+        self._state = state
+        self.metrics.set_gauge("state", state)
+
+    def before_call(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN or (
+                state == self.HALF_OPEN and self._probes >= self.half_open_max_calls
+            ):
+                self.metrics.incr("rejected_open")
+                raise CircuitOpenError("circuit breaker is open")
+            if state == self.HALF_OPEN:
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.metrics.incr("opened")
+                self._set_state(self.OPEN)
+                self._opened_at = time.monotonic()
+
+
+class Bulkhead:
+    """
+    外部サービスごとの同時呼び出し数の上限
+
+    外部サービスが遅くなっても、待たされるワーカースレッドを max_concurrent に
+    抑え、残りのスレッドをTodo APIなどのために確保する。上限を超えた呼び出しは待たせない。
+    """
+
+    def __init__(self, metrics, max_concurrent):
+        self.metrics = metrics
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            self.metrics.incr("rejected_bulkhead")
+            raise BulkheadFullError("too many concurrent calls")
+
+    def release(self):
+        self._slots.release()
+
+
+class OutboundCallGuard:
+    """
+    外部サービスの呼び出しをバルクヘッドとサーキットブレーカーで保護する
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout, max_concurrent, half_open_max_calls=1):
+        self.name = name
+        self.metrics = get_metrics(f"outbound.{name}")
+        self.breaker = CircuitBreaker(self.metrics, failure_threshold, reset_timeout, half_open_max_calls)
+        self.bulkhead = Bulkhead(self.metrics, max_concurrent)
+
+    def call(self, func, *args, is_failure=None, **kwargs):
+        """
+        func を呼び出す
+
+        Args:
+            is_failure: 例外を受け取り、障害として数えるかを返す関数（省略時はすべて障害）
+
+        Raises:
+            CircuitOpenError, BulkheadFullError: 呼び出さずに即座に失敗した場合
+        """
+        # 先に枠を取る（枠が取れずに half_open の試行枠だけを消費しないように）
+        self.bulkhead.acquire()
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.bulkhead.release()
+            raise
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.metrics.incr("failures")
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.metrics.incr("successes")
+            self.breaker.record_success()
+            return result
+        finally:
+            self.bulkhead.release()
+
+
+@lru_cache(maxsize=None)
+def get_outbound_guard(name):
+    """settings.OUTBOUND_CALL_GUARDS[name] の設定で作ったガード（プロセスに1つ）"""
+    return OutboundCallGuard(name, **settings.OUTBOUND_CALL_GUARDS[name])
@@ -1,10 +1,14 @@
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from dj_rest_auth.serializers import LoginSerializer as DefaultLoginSerializer
+from dj_rest_auth.serializers import PasswordChangeSerializer as DefaultPasswordChangeSerializer
+from dj_rest_auth.jwt_auth import CookieTokenRefreshSerializer
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.db import IntegrityError
 
 from .models import CustomUser
-from .services import UserQueryService, UserRegistrationService
+from .services import UserCommandService, UserQueryService, UserRegistrationService
+from .tokens import RefreshToken
 
 
 # ============================================================================
@@ -13,12 +17,18 @@ from .services import UserQueryService, UserRegistrationService
 class CustomUserSerializer(serializers.ModelSerializer):
     """
     現在のユーザー情報を返すシリアライザ
+
+    更新（/auth/user/ の PUT・PATCH）は送られたフィールドだけを保存する。
+    instance は request.user（キャッシュから復元した値）のため、save() で全列を書き戻さない。
     """
     class Meta:
         model = CustomUser
         fields = ('id', 'email', 'first_name', 'last_name', 'is_staff')
         read_only_fields = ('id', 'email', 'is_staff')
 
+    def update(self, instance, validated_data):
+        return UserCommandService.update_user(instance, **validated_data)
+
 
 # ============================================================================
 # 2. ユーザー作成（サインアップ）用のシリアライザー
@@ -85,6 +95,21 @@ class CustomRegisterSerializer(RegisterSerializer):
         return user
 
 
+class CustomPasswordChangeSerializer(DefaultPasswordChangeSerializer):
+    """
+    パスワード変更（/auth/password/change/）
+
+    SetPasswordForm.save() は request.user の全列を保存するため、
+    パスワードの列だけを保存する UserCommandService.change_password を使う。
+    """
+
+    def save(self):
+        UserCommandService.change_password(self.user, self.set_password_form.cleaned_data['new_password1'])
+        if not self.logout_on_password_change:
+            from django.contrib.auth import update_session_auth_hash
+            update_session_auth_hash(self.request, self.user)
+
+
 # ============================================================================
 # 3. ログイン用のシリアライザー（オプション）
 # ============================================================================
@@ -93,4 +118,21 @@ class CustomLoginSerializer(DefaultLoginSerializer):
     emailベース認証用のカスタムログインシリアライザ
     """
     username = None
-    email = serializers.EmailField(required=True)
\ No newline at end of file
+    email = serializers.EmailField(required=True)
+
+
+# ============================================================================
+# 4. JWT発行・リフレッシュ用のシリアライザー
+# ============================================================================
+class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    ログイン時のトークン発行（失効管理はRedis）
+    """
+    token_class = RefreshToken
+
+
+class CustomTokenRefreshSerializer(CookieTokenRefreshSerializer):
+    """
+    トークンリフレッシュ（ローテーション時の失効はRedisに記録）
+    """
+    token_class = RefreshToken
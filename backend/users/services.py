@@ -1,6 +1,17 @@
-from django.db import IntegrityError
+import logging
+from django.conf import settings
+from django.db import IntegrityError, models, router, transaction
 from typing import Dict, Optional
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from config.db.replicas import mark_written, replica_reads
 from .models import CustomUser
+from .outbox import USER_PURGE, OutboxService
+from .user_cache import user_resolution_cache
+
+logger = logging.getLogger(__name__)
+
+# 削除要求済みのユーザーに付け替えるメールアドレス（.invalid は配送されないTLD）
+DELETED_EMAIL = "deleted-{user_id}@deleted.invalid"
 
 
 # ============================================================================
@@ -9,6 +20,8 @@ from .models import CustomUser
 class UserQueryService:
     """
     ユーザー情報の取得に関するサービス
+
+    取得はリードレプリカから行う（config/db/replicas.py）
     """
     
     @staticmethod
@@ -23,7 +36,8 @@ class UserQueryService:
             CustomUser or None
         """
         try:
-            return CustomUser.objects.get(email__iexact=email)
+            with replica_reads():
+                return CustomUser.objects.filter_by_email(email).get()
         except CustomUser.DoesNotExist:
             return None
     
@@ -38,7 +52,9 @@ class UserQueryService:
         Returns:
             True if exists, False otherwise
         """
-        return CustomUser.objects.filter(email__iexact=email).exists()
+        # 登録直後でレプリカに未反映でも、登録時の重複は一意制約で防がれる
+        with replica_reads():
+            return CustomUser.objects.filter_by_email(email).exists()
     
     @staticmethod
     def get_user_by_id(user_id: int) -> Optional[CustomUser]:
@@ -52,7 +68,8 @@ class UserQueryService:
             CustomUser or None
         """
         try:
-            return CustomUser.objects.get(id=user_id)
+            with replica_reads(user_id):
+                return CustomUser.objects.get(id=user_id)
         except CustomUser.DoesNotExist:
             return None
 
@@ -135,6 +152,9 @@ class UserCommandService:
         """
         ユーザー情報を更新
         
+        指定したフィールドだけを保存する。user は request.user（キャッシュから復元した
+        最大 AUTH_USER_CACHE_TTL 秒前の値）のこともあるため、他の列を古い値で上書きしない。
+        
         Args:
             user: 更新するCustomUserインスタンス
             **fields: 更新するフィールド
@@ -142,10 +162,13 @@ class UserCommandService:
         Returns:
             更新されたCustomUserインスタンス
         """
-        for field, value in fields.items():
-            if hasattr(user, field):
-                setattr(user, field, value)
-        user.save()
+        update_fields = [field for field in fields if hasattr(user, field)]
+        for field in update_fields:
+            setattr(user, field, fields[field])
+        if update_fields:
+            user.save(update_fields=update_fields)
+        user_resolution_cache.invalidate(user.pk)
+        mark_written(user.pk)
         return user
     
     @staticmethod
@@ -153,6 +176,8 @@ class UserCommandService:
         """
         ユーザーのパスワードを変更
         
+        パスワードの列だけを保存する（update_user と同じく request.user の古い値を書き戻さない）。
+        
         Args:
             user: CustomUserインスタンス
             new_password: 新しいパスワード（プレーンテキスト）
@@ -161,7 +186,9 @@ class UserCommandService:
             更新されたCustomUserインスタンス
         """
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=['password'])
+        user_resolution_cache.invalidate(user.pk)
+        mark_written(user.pk)
         return user
     
     @staticmethod
@@ -169,10 +196,73 @@ class UserCommandService:
         """
         ユーザーを削除
         
+        その場では無効化のみを行い、以降の認証・ログインを即座に失敗させる。
+        メールアドレスも付け替えて解放し、削除の完了を待たずに同じアドレスで再登録できるようにする。
+        Todo・トークンなどの関連データとユーザー本体は、アウトボックス経由で
+        purge_user がバッチ単位で削除する（dispatch_outbox ワーカー）。
+        削除の前に管理画面などで再び有効化する場合は、メールアドレスも設定し直すこと。
+        
         Args:
             user: 削除するCustomUserインスタンス
         """
+        with transaction.atomic():
+            email = DELETED_EMAIL.format(user_id=user.pk)
+            CustomUser.objects.filter(pk=user.pk).update(is_active=False, email=email)
+            OutboxService.enqueue(USER_PURGE, {'user_id': user.pk})
+        user.is_active, user.email = False, email
+        user_resolution_cache.invalidate(user.pk)
+        mark_written(user.pk)
+
+    @staticmethod
+    def purge_user(user_id: int, batch_size: int = None) -> bool:
+        """
+        削除要求済み（無効化済み）のユーザーの関連データをバッチ単位で削除し、最後に本体を削除
+        
+        Djangoの user.delete() は関連する行をすべてメモリに読み込んでから1トランザクションで
+        削除するため、関連データを先に USER_PURGE_BATCH_SIZE 件ずつ削除しておく。
+        各バッチは個別にコミットされ、途中で失敗しても再実行で続きから削除する。
+        
+        Args:
+            user_id: 削除するユーザーのID
+            batch_size: 1回に削除する件数
+            
+        Returns:
+            削除した場合 True（既に削除済み・再び有効化された場合は False）
+        """
+        batch_size = batch_size or settings.USER_PURGE_BATCH_SIZE
+        user = CustomUser.objects.filter(pk=user_id).first()
+        if user is None:
+            return False
+        if user.is_active:
+            logger.warning("Skipping purge of user %s: reactivated after deletion request", user_id)
+            return False
+
+        # 削除先のDBは削除を始める前に決めておく（Todoなどはユーザーのシャードにあり、
+        # その配置（TodoShardPlacement）自体も削除対象のため）
+        querysets = [
+            relation.related_model._base_manager
+            .using(router.db_for_write(relation.related_model, instance=user))
+            .filter(**{relation.field.name: user})
+            for relation in user._meta.related_objects
+            if not relation.many_to_many and relation.on_delete is models.CASCADE
+        ]
+        # 失効管理用のトークンは SET_NULL のため、所有者のない行として残さず削除する
+        querysets.append(OutstandingToken.objects.filter(user=user))
+        for queryset in querysets:
+            UserCommandService._delete_in_batches(queryset, batch_size)
+
         user.delete()
+        user_resolution_cache.invalidate(user_id)
+        return True
+
+    @staticmethod
+    def _delete_in_batches(queryset, batch_size: int) -> None:
+        """主キーを batch_size 件ずつ取得して削除（メモリ使用量は件数によらず一定）"""
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            queryset.filter(pk__in=pks).delete()
 
 
 # ============================================================================
@@ -203,14 +293,12 @@ class UserRegistrationService:
             作成されたCustomUserインスタンス
             
         Raises:
-            ValueError: メールアドレスが既に登録されている場合
-            IntegrityError: データベース制約エラー
+            IntegrityError: メールアドレスが既に登録されている場合（データベース制約エラー）
         """
         email = user_data.get('email')
         
-        # メールアドレスの重複チェック
-        if self.query_service.email_exists(email):
-            raise ValueError(f"A user is already registered with this e-mail address: {email}")
+        # メールアドレスの重複チェックはシリアライザ（validate_email）で済んでいるため行わない。
+        # チェック後に同じアドレスで登録された場合は UPPER(email) の一意制約で IntegrityError になる
         
         # ユーザー作成
         user = self.command_service.create_user_with_adapter(
@@ -0,0 +1,66 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class QStashStubServer:
+    """
+    テスト用のQStash互換スタブサーバー（127.0.0.1 の空きポートで起動）
+
+    /v2/publish/<destination> と /v2/batch に応答し、受け取ったリクエストと
+    確立されたTCP接続の数を記録する。settings.QSTASH_URL を self.url に向けて使う。
+    """
+
+    def __init__(self, status=200):
+        self.status = status
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+        )
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive を有効にする
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests.append({"path": self.path, "headers": dict(self.headers), "body": body})
+                    count = len(stub.requests)
+
+                if self.path == "/v2/batch":
+                    response = [{"messageId": f"msg-{count}-{i}"} for i in range(len(body))]
+                else:
+                    response = {"messageId": f"msg-{count}"}
+                payload = json.dumps(response).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
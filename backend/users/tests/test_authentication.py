@@ -0,0 +1,98 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from users.services import UserCommandService
+from users.user_cache import user_resolution_cache
+
+User = get_user_model()
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    """
+    認証ユーザー取得のキャッシュのテスト
+    """
+
+    def setUp(self):
+        cache.clear()
+        user_resolution_cache.clear()
+        user_resolution_cache.metrics.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def tearDown(self):
+        user_resolution_cache.clear()
+        cache.clear()
+
+    def _user_queries(self, path='/api/v1/todos/'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q['sql'] for q in ctx.captured_queries if 'custom_user' in q['sql']]
+
+    def test_user_lookup_is_cached(self):
+        """2回目以降のリクエストではユーザーをDBから取得しない"""
+        self.assertEqual(len(self._user_queries()), 1)
+        self.assertEqual(self._user_queries(), [])
+
+    def test_l2_cache_is_used_after_local_expiry(self):
+        """プロセス内キャッシュが空でもDjangoキャッシュから取得する"""
+        self._user_queries()
+        user_resolution_cache.clear()
+
+        self.assertEqual(self._user_queries(), [])
+        snapshot = user_resolution_cache.metrics.snapshot()
+        self.assertEqual((snapshot['misses'], snapshot['l2_hits']), (1, 1))
+
+    def test_deferred_fields_are_loaded_on_access(self):
+        """キャッシュに含まれない項目も参照時に取得できる"""
+        UserCommandService.update_user(self.user, first_name='Taro')
+
+        response = self.client.get('/api/v1/auth/user/')
+
+        self.assertEqual(response.data['email'], 'test@example.com')
+        self.assertEqual(response.data['first_name'], 'Taro')
+
+    def test_update_user_invalidates_cache(self):
+        """update_user: 無効化され、次のリクエストで最新の値を取得する"""
+        self._user_queries()
+        UserCommandService.update_user(self.user, is_active=False)
+
+        response = self.client.get('/api/v1/todos/')
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_delete_user_invalidates_cache(self):
+        """delete_user: 削除後のトークンは認証に失敗する"""
+        self._user_queries()
+        UserCommandService.delete_user(self.user)
+
+        response = self.client.get('/api/v1/todos/')
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_hit_rate_is_reported(self):
+        """ヒット率がメトリクスとして取得できる"""
+        self._user_queries()
+        self._user_queries()
+        UserCommandService.update_user(self.user, is_staff=True)
+        response = self.client.get('/api/v1/metrics/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data['user_resolution_cache']
+        self.assertEqual((stats['l1_hits'], stats['misses']), (1, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+
+    def test_metrics_requires_staff(self):
+        """メトリクスはスタッフ以外には公開しない"""
+        response = self.client.get('/api/v1/metrics/')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,29 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from users.models import CustomUser
+
+
+@override_settings(BACKFILL_BATCH_INTERVAL=0)
+class NormalizeUserEmailsTest(TestCase):
+    """メールアドレスの正規化のバックフィル（users/backfills.py）のテスト"""
+
+    def setUp(self):
+        self.ids = [
+            CustomUser.objects.create_user(email=f'user{i}@example.com', password='testpass123').id for i in range(5)
+        ]
+
+    def test_command_normalizes_emails(self):
+        """normalize_user_emails はメールアドレスのドメイン部分を小文字にそろえる"""
+        CustomUser.objects.filter(id=self.ids[0]).update(email='Mixed.Case@EXAMPLE.COM')
+
+        out = StringIO()
+        call_command('run_backfill', 'normalize_user_emails', batch_size=2, stdout=out)
+
+        self.assertEqual(CustomUser.objects.get(id=self.ids[0]).email, 'Mixed.Case@example.com')
+        self.assertIn('normalize_user_emails@default: 1 rows updated', out.getvalue())
+
+        out = StringIO()
+        call_command('run_backfill', 'normalize_user_emails', status=True, stdout=out)
+        self.assertIn('done, 1 rows', out.getvalue())
@@ -1,7 +1,11 @@
-from django.test import TestCase
-from unittest.mock import patch, MagicMock
-from users.email_service import EmailService
+import json
+
+from django.template.loader import get_template
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from users.email_service import EmailService, EmailTemplateRegistry, get_email_transport
 from users.qstash_service import QStashService
+from users.tests.qstash_stub import QStashStubServer
 
 
 class EmailServiceTest(TestCase):
@@ -21,19 +25,105 @@ class EmailServiceTest(TestCase):
         mock_send.assert_called_once()
 
 
+@override_settings(EMAIL_TRANSPORT='users.email_service.FakeTransport', EMAIL_BATCH_SIZE=2)
+class EmailServiceTemplateTest(TestCase):
+    """テンプレートとバッチ送信のテスト（FakeTransportを使用）"""
+
+    def setUp(self):
+        get_email_transport.cache_clear()
+        self.transport = get_email_transport()
+
+    def tearDown(self):
+        get_email_transport.cache_clear()
+
+    def test_first_name_is_escaped(self):
+        """本文中の first_name はHTMLエスケープされ、件名からは改行が除かれる"""
+        EmailService.send_welcome_email("test@example.com", "<b>Taro</b>\nBcc: x@example.com")
+
+        message = self.transport.sent[0]
+        self.assertIn("Welcome, &lt;b&gt;Taro&lt;/b&gt;", message["html"])
+        self.assertNotIn("<b>Taro</b>", message["html"])
+        self.assertEqual(
+            message["subject"], "Welcome to Django React App, <b>Taro</b> Bcc: x@example.com!"
+        )
+
+    def test_templates_are_compiled_once(self):
+        """テンプレートの読み込みはプロセス内で1回だけ"""
+        registry = EmailTemplateRegistry()
+        with patch('users.email_service.get_template', wraps=get_template) as mock_get:
+            registry.render("welcome", {"first_name": "A"})
+            registry.render("welcome", {"first_name": "B"})
+
+        self.assertEqual(mock_get.call_count, 2)  # 件名と本文
+
+    def test_send_welcome_emails_batches(self):
+        """複数のメールが EMAIL_BATCH_SIZE 件ずつのリクエストで送信される"""
+        results = EmailService.send_welcome_emails([
+            {"email": f"u{i}@example.com", "first_name": f"U{i}"} for i in range(3)
+        ])
+
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(self.transport.requests, 2)
+        self.assertEqual([m["to"] for m in self.transport.sent][2], ["u2@example.com"])
+
+
 class QStashServiceTest(TestCase):
-    
-    @patch('requests.post')
-    def test_send_welcome_email_async_success(self, mock_post):
+
+    def setUp(self):
+        self.stub = QStashStubServer()
+        self.stub.__enter__()
+        self.settings_override = override_settings(QSTASH_URL=self.stub.url, QSTASH_BATCH_SIZE=2)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.stub.__exit__(None, None, None)
+
+    def test_send_welcome_email_async_success(self):
         """QStashへのメッセージ送信が成功する"""
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"messageId": "test-message-id"}
-        mock_post.return_value = mock_response
-        
         result = QStashService.send_welcome_email_async(
             email="test@example.com",
             first_name="Test"
         )
-        
+
         self.assertTrue(result["success"])
-        self.assertEqual(result["message_id"], "test-message-id")
\ No newline at end of file
+        self.assertEqual(result["message_id"], "msg-1")
+        request = self.stub.requests[0]
+        self.assertEqual(
+            request["path"],
+            "/v2/publish/http://localhost:8000/api/v1/webhooks/send-welcome-email"
+        )
+        self.assertEqual(request["body"], {"email": "test@example.com", "first_name": "Test"})
+
+    def test_connection_is_reused(self):
+        """共有セッションで接続が使い回される"""
+        for i in range(5):
+            QStashService.send_welcome_email_async(email=f"u{i}@example.com", first_name="U")
+
+        self.assertEqual(len(self.stub.requests), 5)
+        self.assertEqual(self.stub.connections, 1)
+
+    def test_send_welcome_emails_async_batches(self):
+        """複数のメッセージが QSTASH_BATCH_SIZE 件ずつ /v2/batch で送信される"""
+        results = QStashService.send_welcome_emails_async([
+            {"email": f"u{i}@example.com", "first_name": "U", "deduplication_id": f"outbox-{i}"}
+            for i in range(3)
+        ])
+
+        self.assertTrue(all(r["success"] for r in results))
+        self.assertEqual(len(results), 3)
+        self.assertEqual([r["path"] for r in self.stub.requests], ["/v2/batch", "/v2/batch"])
+        first = self.stub.requests[0]["body"][0]
+        self.assertEqual(first["headers"]["Upstash-Deduplication-Id"], "outbox-0")
+        self.assertEqual(json.loads(first["body"]), {"email": "u0@example.com", "first_name": "U"})
+
+    def test_batch_failure_marks_all_messages_failed(self):
+        """バッチ送信に失敗した場合は、そのバッチの全メッセージが失敗になる"""
+        self.stub.status = 500
+
+        results = QStashService.send_welcome_emails_async([
+            {"email": "u@example.com", "first_name": "U"}
+        ])
+
+        self.assertFalse(results[0]["success"])
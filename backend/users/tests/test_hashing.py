@@ -0,0 +1,121 @@
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from users.hashing import PasswordHashingBusy, PasswordHashingLimiter, get_password_hashing_limiter
+
+User = get_user_model()
+
+
+class PasswordHashingLimiterTest(TestCase):
+    """
+    パスワードのハッシュ計算の同時実行数の制限のテスト
+    """
+
+    def setUp(self):
+        self.limiter = get_password_hashing_limiter()
+        self.limiter.metrics.reset()
+
+    def test_set_and_check_password_go_through_limiter(self):
+        """登録（set_password）とログイン（check_password）が呼び出し元のスレッドのまま制限を通る"""
+        User.objects.create_user(email='test@example.com', password='testpass123')
+
+        threads = []
+        original_run = self.limiter._run
+
+        def run(func, *args):
+            threads.append(threading.current_thread())
+            return original_run(func, *args)
+
+        with patch.object(self.limiter, '_run', run):
+            user = authenticate(email='test@example.com', password='testpass123')
+
+        self.assertIsNotNone(user)
+        self.assertEqual(threads, [threading.current_thread()])
+        snapshot = self.limiter.metrics.snapshot()
+        self.assertEqual(snapshot['queue_ms']['count'], 2)
+        self.assertEqual(snapshot['hash_ms']['count'], 2)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.UnsaltedMD5PasswordHasher',
+    ])
+    def test_login_rehashes_outdated_hash(self):
+        """古いハッシュ形式のパスワードはログイン成功時に現在の設定で保存し直す"""
+        user = User.objects.create_user(email='test@example.com')
+        User.objects.filter(pk=user.pk).update(
+            password=make_password('testpass123', hasher='unsalted_md5')
+        )
+
+        self.assertIsNotNone(authenticate(email='test@example.com', password='testpass123'))
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('md5$'))
+        self.assertEqual(self.limiter.metrics.get('rehashed'), 1)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.UnsaltedMD5PasswordHasher',
+    ])
+    def test_busy_rehash_does_not_fail_login(self):
+        """保存し直しの計算が上限を超えてもログインは成功し、古いハッシュのまま残す"""
+        user = User.objects.create_user(email='test@example.com')
+        encoded = make_password('testpass123', hasher='unsalted_md5')
+        User.objects.filter(pk=user.pk).update(password=encoded)
+
+        with patch.object(self.limiter, 'make_password', side_effect=PasswordHashingBusy()):
+            self.assertIsNotNone(authenticate(email='test@example.com', password='testpass123'))
+
+        user.refresh_from_db()
+        self.assertEqual(user.password, encoded)
+        self.assertEqual(self.limiter.metrics.get('rehash_skipped'), 1)
+        self.assertEqual(self.limiter.metrics.get('rehashed'), 0)
+
+    def test_wrong_password_is_not_rehashed(self):
+        """パスワードが誤っている場合は保存し直さない"""
+        user = User.objects.create_user(email='test@example.com', password='testpass123')
+        encoded = user.password
+
+        self.assertIsNone(authenticate(email='test@example.com', password='wrong'))
+
+        user.refresh_from_db()
+        self.assertEqual(user.password, encoded)
+
+    def test_rejects_when_limit_is_reached(self):
+        """上限を超えた要求は待たせずに PasswordHashingBusy で断る"""
+        limiter = PasswordHashingLimiter(max_workers=1, max_pending=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(1)
+
+        worker = threading.Thread(target=limiter._run, args=(slow_hash,))
+        worker.start()
+        started.wait(1)
+        try:
+            with self.assertRaises(PasswordHashingBusy):
+                limiter.make_password('testpass123')
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertEqual(limiter.metrics.get('rejected'), 1)
+        # 空いた後は再び受け付ける
+        self.assertTrue(limiter.make_password('testpass123'))
+
+    def test_busy_login_returns_503(self):
+        """DRFのビューでは上限超過を503にする"""
+        User.objects.create_user(email='test@example.com', password='testpass123')
+
+        with patch.object(self.limiter, '_run', side_effect=PasswordHashingBusy()):
+            response = APIClient().post(
+                reverse('rest_login'), {'email': 'test@example.com', 'password': 'testpass123'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -87,6 +87,24 @@ class CustomUserModelTest(TestCase):
         with self.assertRaises(IntegrityError):
             User.objects.create_user(email=email, password="pass2")
 
+    def test_email_is_unique_case_insensitive(self):
+        """
+        大文字小文字だけが異なるメールアドレスも重複として扱われることを確認
+        """
+        User.objects.create_user(email="test@example.com", password="pass1")
+
+        with self.assertRaises(IntegrityError):
+            User.objects.create_user(email="TEST@example.com", password="pass2")
+
+    def test_filter_by_email_uses_upper_expression(self):
+        """
+        メールアドレス検索が UPPER(email) の関数インデックスを使う形になっていることを確認
+        """
+        queryset = User.objects.filter_by_email("Test@Example.com")
+
+        self.assertIn('UPPER("custom_user"."email")', str(queryset.query))
+        self.assertIn("custom_user_email_upper_uniq", queryset.explain())
+
     def test_get_by_natural_key_case_insensitive(self):
         """
         メールアドレスの大文字小文字を区別せずにユーザーを取得できることを確認
@@ -0,0 +1,106 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from users.models import OutboxMessage
+from users.outbox import WELCOME_EMAIL, OutboxService
+
+
+class RegistrationOutboxTest(TestCase):
+    """
+    新規登録時のアウトボックス書き込みのテスト
+    """
+
+    @patch('users.qstash_service.get_session')
+    def test_registration_enqueues_welcome_email(self, mock_session):
+        """登録時はQStashを呼ばずに送信待ちを書き込む"""
+        data = {
+            'email': 'newuser@example.com',
+            'password1': 'testpass123',
+            'password2': 'testpass123',
+            'first_name': 'Taro',
+        }
+
+        response = APIClient().post(reverse('rest_register'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_session.assert_not_called()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.topic, WELCOME_EMAIL)
+        self.assertEqual(message.payload, {'email': 'newuser@example.com', 'first_name': 'Taro'})
+
+
+class OutboxServiceTest(TestCase):
+    """
+    アウトボックスの送信のテスト
+    """
+
+    def setUp(self):
+        self.message = OutboxService.enqueue(
+            WELCOME_EMAIL, {'email': 'test@example.com', 'first_name': 'Test'}
+        )
+
+    @patch('users.outbox.QStashService.send_welcome_emails_async')
+    def test_dispatch_sends_and_deletes(self, mock_send):
+        """送信に成功したメッセージは削除される（QStashの重複排除IDを付ける）"""
+        mock_send.return_value = [{'success': True, 'message_id': 'msg-1'}]
+
+        result = OutboxService.dispatch_batch()
+
+        self.assertEqual(result, {'sent': 1, 'failed': 0})
+        mock_send.assert_called_once_with([{
+            'deduplication_id': f'outbox-{self.message.pk}',
+            'email': 'test@example.com',
+            'first_name': 'Test',
+        }])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @patch('users.outbox.QStashService.send_welcome_emails_async')
+    def test_failure_is_retried_with_backoff(self, mock_send):
+        """送信に失敗したメッセージは時間を置いて再送される"""
+        mock_send.return_value = [{'success': False, 'error': 'timeout'}]
+
+        result = OutboxService.dispatch_batch()
+
+        self.assertEqual(result, {'sent': 0, 'failed': 1})
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.attempts, 1)
+        self.assertEqual(self.message.last_error, 'timeout')
+        self.assertGreater(self.message.next_attempt_at, timezone.now())
+        # 再送時刻までは取得されない
+        self.assertEqual(OutboxService.dispatch_batch(), {'sent': 0, 'failed': 0})
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    @patch('users.outbox.QStashService.send_welcome_emails_async')
+    def test_gives_up_after_max_attempts(self, mock_send):
+        """再試行の上限に達したメッセージは送信対象から外れる"""
+        mock_send.return_value = [{'success': False, 'error': 'bad request'}]
+
+        OutboxService.dispatch_batch()
+
+        self.message.refresh_from_db()
+        self.assertIsNone(self.message.next_attempt_at)
+
+    def test_claimed_messages_are_leased(self):
+        """取得したメッセージは送信中、他のワーカーに取得されない"""
+        self.assertEqual(len(OutboxService.claim_batch(10)), 1)
+        self.assertEqual(OutboxService.claim_batch(10), [])
+
+    @patch('users.outbox.QStashService.send_welcome_emails_async')
+    def test_command_drains_outbox(self, mock_send):
+        """dispatch_outbox: 送信待ちがなくなるまでバッチ単位でまとめて送信する"""
+        mock_send.side_effect = lambda recipients: [
+            {'success': True, 'message_id': 'msg'} for _ in recipients
+        ]
+        for i in range(4):
+            OutboxService.enqueue(WELCOME_EMAIL, {'email': f'u{i}@example.com', 'first_name': 'U'})
+
+        call_command('dispatch_outbox', batch_size=2, stdout=StringIO())
+
+        self.assertEqual([len(call.args[0]) for call in mock_send.call_args_list], [2, 2, 1])
+        self.assertFalse(OutboxMessage.objects.exists())
@@ -0,0 +1,171 @@
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from resend.exceptions import ValidationError
+from users.email_service import EmailService
+from users.qstash_service import QStashService
+from users.resilience import (
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    OutboundCallGuard,
+    get_outbound_guard,
+)
+from users.tests.qstash_stub import QStashStubServer
+
+
+def fail():
+    raise ConnectionError("down")
+
+
+class OutboundCallGuardTest(TestCase):
+    """
+    サーキットブレーカー・バルクヘッドのテスト
+    """
+
+    def setUp(self):
+        self.guard = OutboundCallGuard("test", failure_threshold=2, reset_timeout=30, max_concurrent=2)
+        self.guard.metrics.reset()
+
+    def _trip(self):
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                self.guard.call(fail)
+
+    def test_opens_after_consecutive_failures(self):
+        """連続して失敗するとサーキットが開き、呼び出さずに即座に失敗する"""
+        self._trip()
+        calls = []
+
+        with self.assertRaises(CircuitOpenError):
+            self.guard.call(calls.append, 1)
+
+        self.assertEqual(calls, [])
+        self.assertEqual(self.guard.breaker.state, CircuitBreaker.OPEN)
+        snapshot = self.guard.metrics.snapshot()
+        self.assertEqual(snapshot["state"], "open")
+        self.assertEqual(snapshot["opened"], 1)
+        self.assertEqual(snapshot["rejected_open"], 1)
+
+    def test_success_resets_failure_count(self):
+        """成功を挟んだ失敗は連続として数えない"""
+        with self.assertRaises(ConnectionError):
+            self.guard.call(fail)
+        self.guard.call(lambda: None)
+        with self.assertRaises(ConnectionError):
+            self.guard.call(fail)
+
+        self.assertEqual(self.guard.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_success_closes(self):
+        """reset_timeout 経過後は1件だけ試し、成功すれば閉じる"""
+        self._trip()
+        with patch("users.resilience.time.monotonic", return_value=10 ** 9):
+            self.assertEqual(self.guard.breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertEqual(self.guard.call(lambda: "ok"), "ok")
+
+        self.assertEqual(self.guard.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_allows_single_probe(self):
+        """half_open では試行中の呼び出し以外は拒否され、試行が失敗すれば再び開く"""
+        self._trip()
+        started, release = threading.Event(), threading.Event()
+
+        def probe():
+            started.set()
+            release.wait(5)
+            raise ConnectionError("still down")
+
+        def run_probe():
+            with self.assertRaises(ConnectionError):
+                self.guard.call(probe)
+
+        with patch("users.resilience.time.monotonic", return_value=10 ** 9):
+            thread = threading.Thread(target=run_probe)
+            thread.start()
+            started.wait(5)
+            with self.assertRaises(CircuitOpenError):
+                self.guard.call(lambda: None)
+            release.set()
+            thread.join()
+
+            self.assertEqual(self.guard.breaker.state, CircuitBreaker.OPEN)
+
+    def test_bulkhead_rejects_when_full(self):
+        """同時呼び出し数の上限を超えた呼び出しは待たずに失敗する"""
+        guard = OutboundCallGuard("test", failure_threshold=2, reset_timeout=30, max_concurrent=1)
+
+        with self.assertRaises(BulkheadFullError):
+            guard.call(guard.call, lambda: None)
+
+        self.assertEqual(guard.metrics.get("rejected_bulkhead"), 1)
+        # 枠は解放されている
+        self.assertIsNone(guard.call(lambda: None))
+
+    def test_non_outage_errors_do_not_open(self):
+        """障害として数えない例外ではサーキットは開かない"""
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.guard.call(self._raise_value_error, is_failure=lambda e: False)
+
+        self.assertEqual(self.guard.breaker.state, CircuitBreaker.CLOSED)
+
+    @staticmethod
+    def _raise_value_error():
+        raise ValueError("bad request")
+
+
+@override_settings(OUTBOUND_CALL_GUARDS={
+    "qstash": {"failure_threshold": 2, "reset_timeout": 30, "max_concurrent": 2},
+    "resend": {"failure_threshold": 2, "reset_timeout": 30, "max_concurrent": 2},
+})
+class OutboundClientGuardTest(TestCase):
+    """
+    QStash・Resendクライアントのサーキットブレーカーのテスト
+    """
+
+    def setUp(self):
+        get_outbound_guard.cache_clear()
+
+    def tearDown(self):
+        get_outbound_guard.cache_clear()
+
+    def test_qstash_fast_fails_when_open(self):
+        """QStashの障害が続くとリクエストせずに失敗を返す（アウトボックスの再試行に任せる）"""
+        with QStashStubServer(status=503) as stub, override_settings(QSTASH_URL=stub.url):
+            for _ in range(3):
+                result = QStashService.send_welcome_email_async("u@example.com", "U")
+                self.assertFalse(result["success"])
+
+            self.assertEqual(len(stub.requests), 2)
+            self.assertEqual(result["error"], "circuit breaker is open")
+
+    def test_qstash_client_errors_do_not_open(self):
+        """リクエストの誤り（4xx）ではサーキットは開かない"""
+        with QStashStubServer(status=400) as stub, override_settings(QSTASH_URL=stub.url):
+            for _ in range(3):
+                QStashService.send_welcome_email_async("u@example.com", "U")
+
+            self.assertEqual(len(stub.requests), 3)
+
+    @patch('resend.Emails.send')
+    def test_resend_fast_fails_when_open(self, mock_send):
+        """Resendの障害が続くと送信せずに失敗を返す"""
+        mock_send.side_effect = ConnectionError("timeout")
+
+        results = [EmailService.send_welcome_email("u@example.com", "U") for _ in range(3)]
+
+        self.assertFalse(any(r["success"] for r in results))
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertEqual(get_outbound_guard("resend").metrics.get("rejected_open"), 1)
+
+    @patch('resend.Emails.send')
+    def test_resend_validation_errors_do_not_open(self, mock_send):
+        """メッセージの誤りではサーキットは開かない"""
+        mock_send.side_effect = ValidationError("validation_error", "validation_error", "invalid to")
+
+        for _ in range(3):
+            EmailService.send_welcome_email("u@example.com", "U")
+
+        self.assertEqual(mock_send.call_count, 3)
@@ -0,0 +1,147 @@
+from django.test import TestCase, RequestFactory
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from todos.models import ArchivedTodo, Todo
+from users.models import OutboxMessage
+from users.outbox import USER_PURGE, OutboxService
+from users.services import UserCommandService, UserQueryService, UserRegistrationService
+
+User = get_user_model()
+
+
+class UserQueryServiceTest(TestCase):
+    """
+    UserQueryServiceのテスト
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='Test@example.com', password='testpass123')
+
+    def test_get_user_by_email_case_insensitive(self):
+        """大文字小文字を区別せずにユーザーを取得できる"""
+        self.assertEqual(UserQueryService.get_user_by_email('test@EXAMPLE.com'), self.user)
+        self.assertIsNone(UserQueryService.get_user_by_email('other@example.com'))
+
+    def test_email_exists_case_insensitive(self):
+        """大文字小文字を区別せずに登録済みかを判定できる"""
+        self.assertTrue(UserQueryService.email_exists('TEST@example.com'))
+        self.assertFalse(UserQueryService.email_exists('other@example.com'))
+
+
+class UserRegistrationServiceTest(TestCase):
+    """
+    UserRegistrationServiceのテスト
+    """
+
+    def setUp(self):
+        self.request = RequestFactory().post('/api/v1/auth/registration/')
+        self.user_data = {'email': 'new@example.com', 'password': 'testpass123'}
+
+    def test_register_user_does_not_recheck_email(self):
+        """重複チェックはシリアライザで行うため、登録時には再チェックしない"""
+        with CaptureQueriesContext(connection) as ctx:
+            UserRegistrationService().register_user(self.request, self.user_data)
+
+        self.assertFalse(any('UPPER' in q['sql'] for q in ctx.captured_queries))
+        self.assertTrue(User.objects.filter(email='new@example.com').exists())
+
+    def test_register_user_duplicate_raises_integrity_error(self):
+        """チェック後に同じアドレスが登録された場合は一意制約で検出される"""
+        User.objects.create_user(email='NEW@example.com', password='testpass123')
+
+        with self.assertRaises(IntegrityError):
+            UserRegistrationService().register_user(self.request, self.user_data)
+
+
+class UserCommandServiceTest(TestCase):
+    """
+    UserCommandService.update_user / change_password のテスト
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', password='testpass123')
+        # request.user と同じく、キャッシュから復元した古いインスタンス
+        self.stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(email='changed@example.com', is_staff=True)
+
+    def test_change_password_saves_only_password(self):
+        """パスワードの変更は古いインスタンスの他の列を書き戻さない"""
+        UserCommandService.change_password(self.stale, 'newpass456')
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass456'))
+        self.assertEqual((self.user.email, self.user.is_staff), ('changed@example.com', True))
+
+    def test_update_user_saves_only_given_fields(self):
+        """ユーザー情報の更新は指定したフィールドだけを保存する"""
+        UserCommandService.update_user(self.stale, first_name='John')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'John')
+        self.assertEqual((self.user.email, self.user.is_staff), ('changed@example.com', True))
+
+
+class UserDeletionTest(TestCase):
+    """
+    UserCommandService.delete_user / purge_user のテスト
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', password='testpass123')
+        self.todos = Todo.objects.bulk_create([
+            Todo(user=self.user, todo_title=f'タスク{i}') for i in range(5)
+        ])
+        ArchivedTodo.objects.create(
+            id=1000, user=self.user, todo_title='アーカイブ', priority='LOW',
+            created_at=self.todos[0].created_at, completed_at=self.todos[0].created_at,
+        )
+        RefreshToken.for_user(self.user).blacklist()
+        RefreshToken.for_user(self.user)
+
+    def test_delete_user_deactivates_and_enqueues_purge(self):
+        """削除要求ではその場で無効化し、関連データの削除はアウトボックスに積む"""
+        UserCommandService.delete_user(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(Todo.objects.count(), 5)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.topic, message.payload), (USER_PURGE, {'user_id': self.user.pk}))
+
+    def test_deleted_email_can_register_again(self):
+        """削除要求の時点でメールアドレスを解放し、削除の完了前でも同じアドレスで再登録できる"""
+        UserCommandService.delete_user(self.user)
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).email, f'deleted-{self.user.pk}@deleted.invalid')
+        self.assertFalse(UserQueryService.email_exists('test@example.com'))
+        User.objects.create_user(email='TEST@example.com', password='testpass123')
+
+    def test_outbox_purges_related_rows_in_batches(self):
+        """関連データは件数によらず一定件数ずつ削除し、最後にユーザーを削除する"""
+        UserCommandService.delete_user(self.user)
+
+        with self.settings(USER_PURGE_BATCH_SIZE=2), CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(OutboxService.dispatch_batch(), {'sent': 1, 'failed': 0})
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Todo.objects.exists())
+        self.assertFalse(ArchivedTodo.objects.exists())
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+        todo_deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE FROM "todos_todo"')]
+        # 2件ずつ3回（最後の user.delete() は空になった関連への一括DELETEのみ）
+        self.assertEqual(len([sql for sql in todo_deletes if '"todos_todo"."id" IN' in sql]), 3)
+        # Todoの行そのものは読み込まない
+        self.assertFalse(any('"todos_todo"."todo_title"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_purge_skips_reactivated_user(self):
+        """削除要求後に再び有効化されたユーザーは削除しない"""
+        UserCommandService.delete_user(self.user)
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+
+        self.assertFalse(UserCommandService.purge_user(self.user.pk))
+        self.assertEqual(Todo.objects.count(), 5)
+        self.assertFalse(UserCommandService.purge_user(self.user.pk + 100))
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from users.token_blacklist import BloomFilter, InMemoryTokenBlacklist, get_token_blacklist
+from users.tokens import RefreshToken
+
+User = get_user_model()
+
+
+class RefreshTokenBlacklistTest(TestCase):
+    """
+    リフレッシュトークンの失効管理のテスト
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user_data = {
+            'email': 'test@example.com',
+            'password': 'testpass123',
+        }
+        User.objects.create_user(**self.user_data)
+
+    def _login(self):
+        response = self.client.post(reverse('rest_login'), self.user_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.cookies['refresh-token'].value
+
+    def test_rotated_refresh_token_is_rejected(self):
+        """ローテーション前のリフレッシュトークンは再利用できない"""
+        old_refresh = self._login()
+
+        response = self.client.post(reverse('token_refresh'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.cookies['refresh-token'] = old_refresh
+        response = self.client.post(reverse('token_refresh'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_sql_tables_are_not_written(self):
+        """ログイン・リフレッシュ・ログアウトでSQLのテーブルに行を作らない"""
+        self._login()
+        self.client.post(reverse('token_refresh'))
+        self.client.post(reverse('rest_logout'))
+
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    def test_logout_revokes_refresh_token(self):
+        """ログアウトしたリフレッシュトークンは使えない"""
+        refresh = self._login()
+
+        response = self.client.post(reverse('rest_logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertRaises(TokenError):
+            RefreshToken(refresh)
+
+    def test_blacklist_twice_fails(self):
+        """同じトークンの失効は1回だけ成功する（同時リフレッシュ対策）"""
+        token = RefreshToken.for_user(User.objects.get(email=self.user_data['email']))
+        token.blacklist()
+
+        with self.assertRaises(TokenError):
+            token.blacklist()
+
+
+class TokenBlacklistBackendTest(TestCase):
+    """
+    失効管理バックエンドのテスト
+    """
+
+    def test_in_memory_expires_entries(self):
+        """期限切れのJTIは失効扱いにならない"""
+        blacklist = InMemoryTokenBlacklist()
+        now = timezone.now().timestamp()
+
+        self.assertTrue(blacklist.revoke('a', now + 60))
+        self.assertTrue(blacklist.revoke('b', now - 1))
+
+        self.assertTrue(blacklist.is_revoked('a', now + 60))
+        self.assertFalse(blacklist.is_revoked('b', now - 1))
+
+    def test_bloom_filter_uses_redis_bit_order(self):
+        """SETBIT と同じビット順（先頭バイトの最上位ビットが0番）で判定する"""
+        bloom = BloomFilter(size=1024, hashes=5)
+        bits = bytearray(128)
+        for pos in bloom.positions('revoked-jti'):
+            bits[pos >> 3] |= 0x80 >> (pos & 7)
+
+        self.assertTrue(bloom.might_contain(bytes(bits), 'revoked-jti'))
+        self.assertFalse(bloom.might_contain(b'', 'revoked-jti'))
+
+
+class PruneTokenBlacklistCommandTest(TestCase):
+    """
+    prune_token_blacklist コマンドのテスト
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', password='testpass123')
+        now = timezone.now()
+        self.expired = [self._outstanding(f'expired-{i}', now - timedelta(hours=1)) for i in range(5)]
+        self.active = self._outstanding('active', now + timedelta(hours=1))
+        BlacklistedToken.objects.create(token=self.expired[0])
+        BlacklistedToken.objects.create(token=self.active)
+
+    def _outstanding(self, jti, expires_at):
+        return OutstandingToken.objects.create(
+            user=self.user, jti=jti, token='token', expires_at=expires_at
+        )
+
+    def test_deletes_expired_tokens_in_chunks(self):
+        """期限切れの行だけをチャンクごとに削除する"""
+        call_command('prune_token_blacklist', chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['active'])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+    def test_import_active_then_delete_all(self):
+        """期限内の失効済みJTIを移行してから全件削除する"""
+        call_command('prune_token_blacklist', import_active=True, all=True, stdout=StringIO())
+
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertTrue(
+            get_token_blacklist().is_revoked('active', self.active.expires_at.timestamp())
+        )
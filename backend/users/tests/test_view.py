@@ -207,6 +207,28 @@ class AuthenticationAPITest(TestCase):
         self.assertEqual(user.first_name, 'John')
         self.assertEqual(user.last_name, 'Doe')
 
+    def test_change_password_keeps_other_fields(self):
+        """
+        パスワードの変更は、ログイン後に他で変更された列（is_staff 等）を書き戻さない
+        """
+        user = User.objects.create_user(**self.user_data)
+        login_response = self.client.post(self.login_url, self.user_data, format='json')
+        self.assertEqual(login_response.status_code, status.HTTP_200_OK)
+        # 認証時のユーザーのキャッシュを作ってから、DBだけを変更する
+        self.assertEqual(self.client.get(self.user_url).status_code, status.HTTP_200_OK)
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+
+        response = self.client.post(
+            reverse('rest_password_change'),
+            {'new_password1': 'NewPass456!', 'new_password2': 'NewPass456!'},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('NewPass456!'))
+        self.assertTrue(user.is_staff)
+
 
 class TokenRefreshAPITest(TestCase):
     """
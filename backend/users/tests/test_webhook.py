@@ -0,0 +1,94 @@
+import hashlib
+import hmac
+import json
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+
+@override_settings(QSTASH_CURRENT_SIGNING_KEY='current-key', QSTASH_NEXT_SIGNING_KEY='next-key')
+class WelcomeEmailWebhookTest(TestCase):
+    """
+    ウェルカムメール送信Webhookのテスト
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('webhook-welcome-email')
+        self.body = json.dumps({'email': 'test@example.com', 'first_name': 'Test'})
+
+    def tearDown(self):
+        cache.clear()
+
+    def _post(self, key='current-key', message_id='msg-1', signature=None):
+        if signature is None:
+            digest = hmac.new(key.encode(), self.body.encode(), hashlib.sha256).hexdigest()
+            signature = f'v1={digest}'
+        headers = {'HTTP_UPSTASH_SIGNATURE': signature}
+        if message_id:
+            headers['HTTP_UPSTASH_MESSAGE_ID'] = message_id
+        return self.client.post(self.url, self.body, content_type='application/json', **headers)
+
+    @patch('users.views.EmailService.send_welcome_email')
+    def test_redelivery_is_not_processed_twice(self, mock_send):
+        """同じメッセージIDの再配信ではメールを送らずに成功を返す"""
+        mock_send.return_value = {'success': True, 'id': 'email-1'}
+
+        first = self._post()
+        second = self._post()
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['message'], 'Already processed')
+        mock_send.assert_called_once_with('test@example.com', 'Test')
+
+    @patch('users.views.EmailService.send_welcome_email')
+    def test_failed_delivery_can_be_retried(self, mock_send):
+        """送信に失敗した場合は、再配信で再び処理される"""
+        mock_send.side_effect = [
+            {'success': False, 'error': 'timeout'},
+            {'success': True, 'id': 'email-1'},
+        ]
+
+        self.assertEqual(self._post().status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(self._post().status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_send.call_count, 2)
+
+    @patch('users.views.EmailService.send_welcome_email')
+    def test_crashed_delivery_is_sent_after_lease(self, mock_send):
+        """送信中の再配信は409、処理中の印の期限が切れた後（送信中に落ちた場合）は送り直す"""
+        mock_send.return_value = {'success': True, 'id': 'email-1'}
+        # 別の配信が送信中（処理済みの記録はまだない）
+        cache.add('qstash_webhook:msg-1:processing', True, 60)
+
+        self.assertEqual(self._post().status_code, status.HTTP_409_CONFLICT)
+        mock_send.assert_not_called()
+
+        # 送信中のプロセスが落ちて印の期限が切れた
+        cache.delete('qstash_webhook:msg-1:processing')
+        self.assertEqual(self._post().status_code, status.HTTP_200_OK)
+        self.assertEqual(self._post().data['message'], 'Already processed')
+        mock_send.assert_called_once_with('test@example.com', 'Test')
+
+    @patch('users.views.EmailService.send_welcome_email')
+    def test_next_signing_key_is_accepted(self, mock_send):
+        """鍵のローテーション中は次の鍵での署名も受け付ける"""
+        mock_send.return_value = {'success': True, 'id': 'email-1'}
+
+        self.assertEqual(self._post(key='next-key').status_code, status.HTTP_200_OK)
+
+    @patch('users.views.EmailService.send_welcome_email')
+    def test_invalid_signatures_are_rejected(self, mock_send):
+        """署名が不正・形式不正の場合は401"""
+        for signature in ('v1=deadbeef', 'garbage', 'v0=abc,other'):
+            with self.subTest(signature=signature):
+                response = self._post(signature=signature)
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.assertEqual(self._post(key='wrong-key').status_code, status.HTTP_401_UNAUTHORIZED)
+        mock_send.assert_not_called()
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class InMemoryTokenBlacklist:
+    """
+    失効済みリフレッシュトークン（JTI）をプロセス内に保持する（テスト・単一プロセス用）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # jti -> 有効期限（epoch秒）
+        self._revoked = {}
+
+    def revoke(self, jti, exp):
+        """
+        JTIを失効させる
+
+        Returns:
+            新たに失効させた場合 True（既に失効済みなら False）
+        """
+        now = time.time()
+        with self._lock:
+            if self._revoked.get(jti, 0) > now:
+                return False
+            self._revoked[jti] = exp
+            # 期限切れのエントリを掃除
+            for expired in [k for k, v in self._revoked.items() if v <= now]:
+                del self._revoked[expired]
+            return True
+
+    def is_revoked(self, jti, exp):
+        with self._lock:
+            return self._revoked.get(jti, 0) > time.time()
+
+
+class BloomFilter:
+    """
+    Redisのビット列（SETBIT）と同じビット順で扱うBloomフィルタ
+
+    Redis上のビット列をそのままプロセス内へ読み込み、判定に使う。
+    """
+
+    def __init__(self, size, hashes):
+        self.size = size
+        self.hashes = hashes
+
+    def positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def might_contain(self, bits, value):
+        for pos in self.positions(value):
+            byte = pos >> 3
+            if byte >= len(bits) or not (bits[byte] >> (7 - (pos & 7))) & 1:
+                return False
+        return True
+
+
+class RedisTokenBlacklist:
+    """
+    失効済みリフレッシュトークン（JTI）をRedisに保持する（本番用）
+
+    JTIごとのキーにトークンの残り有効期間と同じTTLを付けるため、期限切れの
+    エントリは自動で消え、SQLのテーブルのように増え続けることはない。
+
+    TOKEN_BLACKLIST_BLOOM_BITS を設定すると、失効済みJTIのBloomフィルタを
+    Redis上に持ち、プロセス内の写しで「失効していない」ことを即座に判定する
+    （陽性の場合のみRedisへ問い合わせる）。写しは
+    TOKEN_BLACKLIST_BLOOM_REFRESH_INTERVAL 秒ごとに取り直すため、他プロセスで
+    失効させたトークンがその間だけ受け付けられる可能性がある。
+    """
+
+    KEY = "token_blacklist:{jti}"
+    # トークンの有効期限を REFRESH_TOKEN_LIFETIME 単位で区切った世代ごとにフィルタを持つ
+    BLOOM_KEY = "token_blacklist:bloom:{generation}"
+
+    def __init__(self, url=None):
+        import redis
+
+        url = url or settings.REDIS_URL
+        # UpstashはSSL必須。キャッシュ設定と同様に証明書検証を無効化する
+        kwargs = {"ssl_cert_reqs": None} if url.startswith("rediss://") else {}
+        self._client = redis.Redis.from_url(url, **kwargs)
+
+        bits = settings.TOKEN_BLACKLIST_BLOOM_BITS
+        self._bloom = BloomFilter(bits, settings.TOKEN_BLACKLIST_BLOOM_HASHES) if bits else None
+        self._generation_seconds = int(settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"].total_seconds())
+        self._lock = threading.Lock()
+        # generation -> (取得時刻, ビット列)
+        self._local_bits = {}
+
+    def revoke(self, jti, exp):
+        ttl = max(int(exp - time.time()), 1)
+        if self._bloom is None:
+            return bool(self._client.set(self.KEY.format(jti=jti), 1, ex=ttl, nx=True))
+
+        generation = self._generation(exp)
+        bloom_key = self.BLOOM_KEY.format(generation=generation)
+        pipe = self._client.pipeline(transaction=True)
+        pipe.set(self.KEY.format(jti=jti), 1, ex=ttl, nx=True)
+        for pos in self._bloom.positions(jti):
+            pipe.setbit(bloom_key, pos, 1)
+        # 世代内の最後のトークンが期限切れになったらフィルタごと消す
+        pipe.expireat(bloom_key, (generation + 1) * self._generation_seconds + 60)
+        created = pipe.execute()[0]
+        # 自プロセスの写しは取り直して、直後のチェックに反映する
+        with self._lock:
+            self._local_bits.pop(generation, None)
+        return bool(created)
+
+    def is_revoked(self, jti, exp):
+        if self._bloom is not None and not self._bloom.might_contain(self._bits_for(exp), jti):
+            return False
+        return bool(self._client.exists(self.KEY.format(jti=jti)))
+
+    def _generation(self, exp):
+        return int(exp) // self._generation_seconds
+
+    def _bits_for(self, exp):
+        generation = self._generation(exp)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._local_bits.get(generation)
+            if cached is not None and now - cached[0] < settings.TOKEN_BLACKLIST_BLOOM_REFRESH_INTERVAL:
+                return cached[1]
+        bits = self._client.get(self.BLOOM_KEY.format(generation=generation)) or b""
+        with self._lock:
+            self._local_bits[generation] = (now, bits)
+            # 古い世代の写しは捨てる
+            for old in [g for g in self._local_bits if g < generation - 1]:
+                del self._local_bits[old]
+        return bits
+
+
+@lru_cache(maxsize=None)
+def get_token_blacklist():
+    """settings.TOKEN_BLACKLIST_BACKEND のブラックリストを取得"""
+    return import_string(settings.TOKEN_BLACKLIST_BACKEND)()
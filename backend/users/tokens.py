@@ -0,0 +1,35 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken as BaseRefreshToken, Token
+
+from .token_blacklist import get_token_blacklist
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    失効管理を TOKEN_BLACKLIST_BACKEND（Redis）で行うリフレッシュトークン
+
+    token_blacklist アプリの OutstandingToken / BlacklistedToken には書き込まない。
+    """
+
+    def verify(self, *args, **kwargs):
+        self.check_blacklist()
+        Token.verify(self, *args, **kwargs)
+
+    def check_blacklist(self):
+        if get_token_blacklist().is_revoked(self.payload[api_settings.JTI_CLAIM], self.payload["exp"]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        # 同じトークンでの同時リフレッシュは、先に失効させた方だけを成功させる
+        if not get_token_blacklist().revoke(self.payload[api_settings.JTI_CLAIM], self.payload["exp"]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def outstand(self):
+        return None
+
+    @classmethod
+    def for_user(cls, user):
+        # BlacklistMixin.for_user（OutstandingToken の作成）を飛ばす
+        return super(BlacklistMixin, cls).for_user(user)
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+
+from config.async_cache import get_async_cache
+from config.metrics import get_metrics
+
+from .models import CustomUser
+
+
+class UserResolutionCache:
+    """
+    JWT認証で request.user を組み立てるための2段キャッシュ
+
+    - L1: プロセス内（数秒の短いTTL、件数上限つきLRU）
+    - L2: Djangoキャッシュ（Redis）
+
+    保持するのは認証・認可に必要な最小限の項目のみ。それ以外の項目は
+    遅延読み込み（deferred）になり、参照された時点でDBから取得される。
+    """
+
+    # from_db() はモデルのフィールド定義順で値を受け取るため、その順に並べる
+    FIELDS = tuple(
+        f.attname for f in CustomUser._meta.concrete_fields
+        if f.attname in ('id', 'email', 'is_active', 'is_staff')
+    )
+    CACHE_KEY = "auth_user:{user_id}"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self.metrics = get_metrics("user_resolution_cache")
+
+    def _cache_key(self, user_id):
+        return self.CACHE_KEY.format(user_id=user_id)
+
+    def resolve(self, user_id):
+        """
+        ユーザーIDから CustomUser を取得
+
+        Raises:
+            CustomUser.DoesNotExist: ユーザーが存在しない場合
+        """
+        user_id = CustomUser._meta.pk.to_python(user_id)
+
+        record = self._get_local(user_id)
+        if record is not None:
+            self.metrics.incr("l1_hits")
+        else:
+            record = cache.get(self._cache_key(user_id))
+            if record is not None:
+                self.metrics.incr("l2_hits")
+            else:
+                self.metrics.incr("misses")
+                record = (
+                    CustomUser.objects.filter(id=user_id)
+                    .values_list(*self.FIELDS)
+                    .get()
+                )
+                cache.set(self._cache_key(user_id), record, settings.AUTH_USER_CACHE_TTL)
+            self._set_local(user_id, record)
+
+        self._update_hit_rate()
+        return CustomUser.from_db(router.db_for_read(CustomUser), self.FIELDS, record)
+
+    async def aresolve(self, user_id):
+        """
+        resolve の非同期版（非同期ビュー用）
+
+        L2・DBへの問い合わせ中もイベントループを止めない。
+
+        Raises:
+            CustomUser.DoesNotExist: ユーザーが存在しない場合
+        """
+        user_id = CustomUser._meta.pk.to_python(user_id)
+
+        record = self._get_local(user_id)
+        if record is not None:
+            self.metrics.incr("l1_hits")
+        else:
+            async_cache = get_async_cache()
+            record = await async_cache.get(self._cache_key(user_id))
+            if record is not None:
+                self.metrics.incr("l2_hits")
+            else:
+                self.metrics.incr("misses")
+                record = await (
+                    CustomUser.objects.filter(id=user_id)
+                    .values_list(*self.FIELDS)
+                    .aget()
+                )
+                await async_cache.set(self._cache_key(user_id), record, settings.AUTH_USER_CACHE_TTL)
+            self._set_local(user_id, record)
+
+        self._update_hit_rate()
+        return CustomUser.from_db(router.db_for_read(CustomUser), self.FIELDS, record)
+
+    def invalidate(self, user_id):
+        """ユーザー情報の変更時に呼び出す（他プロセスのL1はTTLで失効）"""
+        with self._lock:
+            self._local.pop(user_id, None)
+        cache.delete(self._cache_key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            expires_at, record = entry
+            if expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return record
+
+    def _set_local(self, user_id, record):
+        with self._lock:
+            self._local[user_id] = (time.monotonic() + settings.AUTH_USER_LOCAL_CACHE_TTL, record)
+            self._local.move_to_end(user_id)
+            while len(self._local) > settings.AUTH_USER_LOCAL_CACHE_MAX_SIZE:
+                self._local.popitem(last=False)
+
+    def _update_hit_rate(self):
+        l1_hits = self.metrics.get("l1_hits")
+        l2_hits = self.metrics.get("l2_hits")
+        total = l1_hits + l2_hits + self.metrics.get("misses")
+        self.metrics.set_gauge("hit_rate", (l1_hits + l2_hits) / total)
+
+
+user_resolution_cache = UserResolutionCache()
@@ -1,15 +1,22 @@
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
 from dj_rest_auth.registration.views import RegisterView
-from dj_rest_auth.views import LoginView
-from rest_framework_simplejwt.tokens import RefreshToken
+from dj_rest_auth.app_settings import api_settings as rest_auth_settings
+from dj_rest_auth.jwt_auth import get_refresh_view, unset_jwt_cookies
+from dj_rest_auth.views import LoginView, LogoutView
+from rest_framework_simplejwt.exceptions import TokenError
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from .email_service import EmailService
-from .qstash_service import QStashService
+from .outbox import WELCOME_EMAIL, OutboxService
+from .serializers import CustomTokenRefreshSerializer
+from .tokens import RefreshToken
+from functools import lru_cache
 import hmac
 import hashlib
 
@@ -41,24 +48,24 @@ class CustomRegisterView(RegisterView):
     """
     新規登録時にJWT CookieをSet-Cookieヘッダーに設定
     レート制限: 1時間に3回まで
-    ウェルカムメール送信（QStash経由）
+    ウェルカムメール送信（アウトボックス経由でQStashへ）
     """
     
     def perform_create(self, serializer):
-        user = serializer.save(self.request)
+        # ユーザーとウェルカムメールの送信待ちを同じトランザクションで書き込む。
+        # QStashへの送信は dispatch_outbox が行うため、登録の応答時間はQStashに左右されない
+        with transaction.atomic():
+            user = serializer.save(self.request)
+            OutboxService.enqueue(WELCOME_EMAIL, {
+                "email": user.email,
+                "first_name": user.first_name or "User",
+            })
         self.user = user
 
         refresh = RefreshToken.for_user(user)
         self.access_token = str(refresh.access_token)
         self.refresh_token = str(refresh)
 
-        # テスト環境ではメール送信をスキップ
-        if not is_testing():
-            QStashService.send_welcome_email_async(
-                email=user.email,
-                first_name=user.first_name or "User"
-            )
-
         return user
     
     def create(self, request, *args, **kwargs):
@@ -93,12 +100,53 @@ class CustomRegisterView(RegisterView):
         )
 
 
+class CustomTokenRefreshView(get_refresh_view()):
+    """
+    トークンリフレッシュ
+    ローテーションで無効になったリフレッシュトークンはRedisで失効管理する
+    """
+    serializer_class = CustomTokenRefreshSerializer
+
+
+class CustomLogoutView(LogoutView):
+    """
+    ログアウト時にJWT Cookieを削除し、リフレッシュトークンを失効させる
+    （失効はSQLのtoken_blacklistではなくRedisに記録する）
+    """
+
+    def logout(self, request):
+        response = Response({'detail': 'Successfully logged out.'}, status=status.HTTP_200_OK)
+        unset_jwt_cookies(response)
+
+        if rest_auth_settings.JWT_AUTH_HTTPONLY:
+            raw_token = request.COOKIES.get(rest_auth_settings.JWT_AUTH_REFRESH_COOKIE)
+        else:
+            raw_token = request.data.get('refresh')
+        if not raw_token:
+            response.data = {'detail': 'Refresh token was not included in request.'}
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+            return response
+
+        try:
+            RefreshToken(raw_token).blacklist()
+        except TokenError as e:
+            response.data = {'detail': str(e)}
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+        return response
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def send_welcome_email_webhook(request):
     """
     QStashから呼び出されるWebhook
     ウェルカムメールを実際に送信する
+
+    QStashは応答が遅れると同じメッセージを再配信するため、Upstash-Message-Id で
+    処理済みかを記録し、2回目以降は送信せずに成功を返す。
+    送信前には短い期限の「処理中」の印だけを付け、「処理済み」は送信の成功後に記録する
+    （送信中にプロセスが落ちても、印の期限が切れた後の再配信で送り直す）。
+    処理中の再配信には 409 を返し、QStashに後で再試行させる。
     """
     
     if not _verify_qstash_signature(request):
@@ -115,47 +163,77 @@ def send_welcome_email_webhook(request):
             {"error": "Missing required fields"},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    message_id = request.headers.get("Upstash-Message-Id")
+    idempotency_key = f"qstash_webhook:{message_id}" if message_id else None
+    processing_key = f"{idempotency_key}:processing" if message_id else None
+    if idempotency_key:
+        if cache.get(idempotency_key):
+            return Response(
+                {"message": "Already processed"},
+                status=status.HTTP_200_OK
+            )
+        # SET NX（キャッシュの add）で処理中の印を付ける。既にあれば別の配信が送信中
+        if not cache.add(processing_key, True, settings.QSTASH_WEBHOOK_PROCESSING_TTL):
+            return Response(
+                {"error": "Already processing"},
+                status=status.HTTP_409_CONFLICT
+            )
     
     result = EmailService.send_welcome_email(email, first_name)
     
     if result["success"]:
+        if idempotency_key:
+            cache.set(idempotency_key, True, settings.QSTASH_WEBHOOK_IDEMPOTENCY_TTL)
+            cache.delete(processing_key)
         return Response(
             {"message": "Email sent successfully", "id": result["id"]},
             status=status.HTTP_200_OK
         )
     else:
+        # 失敗時は処理中の印を外し、QStashの再配信で再び処理されるようにする
+        if idempotency_key:
+            cache.delete(processing_key)
         return Response(
             {"error": result["error"]},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 
+@lru_cache(maxsize=4)
+def _qstash_signers(current_key, next_key):
+    """
+    署名鍵ごとの HMAC オブジェクト（鍵の前処理済み）。リクエストごとに copy() して使う
+    current と next が同じ場合は1つだけ
+    """
+    keys = [current_key] if current_key == next_key else [current_key, next_key]
+    return tuple(hmac.new(key.encode(), digestmod=hashlib.sha256) for key in keys)
+
+
 def _verify_qstash_signature(request):
     """QStashからのリクエストを署名検証"""
     signature = request.headers.get("Upstash-Signature")
     
     if not signature:
         return False
-    
-    parts = signature.split(",")
-    signatures = {}
-    for part in parts:
-        key, value = part.split("=")
-        signatures[key] = value
+
+    # "v1=<hex>" の部分だけを取り出す（形式が不正なら検証失敗）
+    provided = next(
+        (part[3:] for part in signature.split(",") if part.startswith("v1=")),
+        None
+    )
+    if not provided:
+        return False
+    provided = provided.encode()
     
     body = request.body
     
-    current_signature = hmac.new(
-        settings.QSTASH_CURRENT_SIGNING_KEY.encode(),
-        body,
-        hashlib.sha256
-    ).hexdigest()
-    
-    next_signature = hmac.new(
-        settings.QSTASH_NEXT_SIGNING_KEY.encode(),
-        body,
-        hashlib.sha256
-    ).hexdigest()
-    
-    return (signatures.get("v1") == current_signature or 
-            signatures.get("v1") == next_signature)
\ No newline at end of file
+    # 現在の鍵で一致しない場合のみ、次の鍵（鍵のローテーション中）で計算する
+    for signer in _qstash_signers(
+        settings.QSTASH_CURRENT_SIGNING_KEY, settings.QSTASH_NEXT_SIGNING_KEY
+    ):
+        mac = signer.copy()
+        mac.update(body)
+        if hmac.compare_digest(mac.hexdigest().encode(), provided):
+            return True
+    return False
@@ -64,6 +64,11 @@ resource "render_web_service" "backend" {
       "PYTHONUNBUFFERED" = {
         value = "1"
       }
+      # アウトボックスの送信ワーカー（ウェルカムメール・退会ユーザーの削除）をWebと同じコンテナで起動する
+      # （backend/docker-entrypoint.sh。無料プランはバックグラウンドワーカーを作れないため）
+      "RUN_OUTBOX_WORKER" = {
+        value = "1"
+      }
     },
     # 動的な変数（var.env_vars）も、値（string）をオブジェクト形式に変換してマージします
     { for k, v in var.env_vars : k => { value = v } }